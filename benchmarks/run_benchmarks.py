@@ -0,0 +1,196 @@
+"""
+Times and memory-profiles every stage of the labeling pipeline on synthetic candles.
+
+Usage:
+    python -m benchmarks.run_benchmarks --sizes 10000 100000 1000000
+    python -m benchmarks.run_benchmarks --update-baseline
+
+The results are written as JSON. When a baseline file exists, the run fails (exit code 1) if any stage is slower
+than its baseline time by more than the tolerance.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from benchmarks.synthetic_candles import generate_candles
+from preprocessing.labeling import Labeling
+
+
+def get_stages_(std_span, tp, sl, tl, initial_amount_usd, leverage, trade_cost):
+    """
+    Returns the pipeline stages in order, as Labeling.label_trades and the app run them. Each stage takes the state
+    dict and updates it.
+    """
+    lb = Labeling()
+    portfolio_initial_value = 10 * initial_amount_usd
+
+    def strategy(state):
+        from strategies.demo_strategy import strategy as demo_strategy
+        demo_strategy(state['candles'])
+
+    def get_trade_barriers(state):
+        state['trades'] = lb.get_trade_barriers(state['candles'], std_span=std_span, tp=tp, sl=sl, tl=tl)
+
+    def get_trade_returns(state):
+        lb.get_trade_returns(state['trades'], trade_cost)
+
+    def calculate_pnl(state):
+        lb.calculate_pnl(state['trades'], initial_amount_usd, leverage)
+
+    def simulate_portfolio(state):
+        from preprocessing.portfolio import simulate_portfolio as simulate
+        simulate(state['trades'],
+                 portfolio_initial_value=portfolio_initial_value,
+                 initial_amount_usd=initial_amount_usd,
+                 leverage=leverage)
+
+    def charts(state):
+        from charts.backtesting_charts import BacktestingCharts
+        bt = BacktestingCharts(state['candles'],
+                               std_span=std_span,
+                               tp_std_pct=tp,
+                               sl_std_pct=sl,
+                               tl=tl,
+                               initial_amount_usd=initial_amount_usd,
+                               leverage=leverage,
+                               trade_cost=trade_cost,
+                               portfolio_initial_value=portfolio_initial_value,
+                               trades=state['trades'])
+        bt.get_candlestick_chart()
+        bt.plot_pnl()
+        bt.plot_exit_events(all=True)
+
+    return [strategy, get_trade_barriers, get_trade_returns, calculate_pnl, simulate_portfolio, charts]
+
+
+def run_stage_(stage, state, profile_memory):
+    if profile_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    stage(state)
+    seconds = time.perf_counter() - start
+    peak = None
+    if profile_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def run_benchmarks(sizes, volatility, signal_density, params, repeat=1, profile_memory=True, seed=0):
+    """
+    Runs every stage on synthetic candles of each size.
+
+    Returns:
+        List[dict]: One record per size and stage with seconds (best of `repeat`), peak traced memory in bytes and
+            row count (signals once the trade table exists). Stages that cannot run here (e.g. the demo strategy
+            without pandas_ta) are recorded as skipped.
+    """
+    stages = get_stages_(**params)
+    records = []
+    for size in sizes:
+        size_records = {stage.__name__: {'size': size, 'stage': stage.__name__, 'rows': size, 'seconds': None,
+                                         'peak_memory_bytes': None, 'skipped': None}
+                        for stage in stages}
+        for run in range(repeat + profile_memory):
+            # The last run only measures memory, since tracing allocations slows everything down
+            measure_memory = profile_memory and run == repeat
+            state = {'candles': generate_candles(size, volatility=volatility, signal_density=signal_density,
+                                                 seed=seed)}
+            for stage in stages:
+                record = size_records[stage.__name__]
+                if record['skipped']:
+                    continue
+                try:
+                    seconds, peak = run_stage_(stage, state, measure_memory)
+                except ImportError as error:
+                    tracemalloc.stop()
+                    record['skipped'] = str(error)
+                    continue
+                if measure_memory:
+                    record['peak_memory_bytes'] = peak
+                else:
+                    record['seconds'] = seconds if record['seconds'] is None else min(record['seconds'], seconds)
+                if 'trades' in state:
+                    record['rows'] = len(state['trades'])
+            print(f'size={size} run={run + 1} done', file=sys.stderr)
+        records.extend(size_records.values())
+    return records
+
+
+def find_regressions(records, baseline, tolerance, min_seconds):
+    """
+    Compares stage times with a baseline.
+
+    Args:
+        records (List[dict]): Current benchmark records.
+        baseline (List[dict]): Baseline benchmark records.
+        tolerance (float): Allowed relative slowdown, e.g. 0.25 for 25 %.
+        min_seconds (float): Slowdowns smaller than this are treated as noise.
+
+    Returns:
+        List[str]: Description of every regression.
+    """
+    baseline_seconds = {(record['size'], record['stage']): record['seconds'] for record in baseline}
+    regressions = []
+    for record in records:
+        reference = baseline_seconds.get((record['size'], record['stage']))
+        if record['seconds'] is None or reference is None:
+            continue
+        if record['seconds'] > reference * (1 + tolerance) and record['seconds'] - reference > min_seconds:
+            regressions.append(f"{record['stage']} at {record['size']} candles: {record['seconds']:.3f}s "
+                               f"(baseline {reference:.3f}s)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the labeling pipeline on synthetic candles.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--volatility', type=float, default=0.001)
+    parser.add_argument('--signal-density', type=float, default=0.05)
+    parser.add_argument('--std-span', type=int, default=100)
+    parser.add_argument('--tp', type=float, default=1.5)
+    parser.add_argument('--sl', type=float, default=0.75)
+    parser.add_argument('--tl', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-memory', action='store_true', help='Skip the memory profiling run.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmarks/results.json')
+    parser.add_argument('--baseline', default='benchmarks/baseline.json')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--min-seconds', type=float, default=0.05)
+    parser.add_argument('--update-baseline', action='store_true', help='Write the results as the new baseline.')
+    args = parser.parse_args(argv)
+
+    params = {'std_span': args.std_span, 'tp': args.tp, 'sl': args.sl, 'tl': args.tl,
+              'initial_amount_usd': 15.0, 'leverage': 20.0, 'trade_cost': 0.0006}
+    records = run_benchmarks(args.sizes, args.volatility, args.signal_density, params,
+                             repeat=args.repeat, profile_memory=not args.no_memory, seed=args.seed)
+    report = {'python': platform.python_version(),
+              'machine': platform.machine(),
+              'params': {**params, 'volatility': args.volatility, 'signal_density': args.signal_density,
+                         'seed': args.seed},
+              'records': records}
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(report, file, indent=2)
+        return 0
+
+    try:
+        with open(args.baseline) as file:
+            baseline = json.load(file)['records']
+    except FileNotFoundError:
+        print(f'No baseline at {args.baseline}, nothing to compare.', file=sys.stderr)
+        return 0
+    regressions = find_regressions(records, baseline, args.tolerance, args.min_seconds)
+    for regression in regressions:
+        print(f'REGRESSION {regression}', file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
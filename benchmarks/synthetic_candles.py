@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+
+def generate_candles(n,
+                     volatility=0.001,
+                     signal_density=0.05,
+                     interval_ms=60 * 10 ** 3,
+                     start_price=20000.0,
+                     start_time=1678158000000,
+                     seed=0):
+    """
+    Generates seeded synthetic candles from a geometric random walk, with random strategy signals and the indicator
+    columns that BacktestingCharts draws.
+
+    Args:
+        n (int): Number of candles.
+        volatility (float): Standard deviation of the log return of each candle (default is 0.001).
+        signal_density (float): Share of candles with a non-zero strat_signal (default is 0.05).
+        interval_ms (int): Candle interval in milliseconds (default is 1 minute).
+        start_price (float): First open price (default is 20000).
+        start_time (int): First open_time in milliseconds.
+        seed (int): Random seed (default is 0).
+
+    Returns:
+        pandas.DataFrame: open_time, datetime, OHLCV, indicator and strat_signal columns.
+    """
+    rng = np.random.default_rng(seed)
+    # Each candle walks through a few intra-candle steps, so high and low enclose open and close
+    steps = start_price * np.exp(np.cumsum(rng.normal(0, volatility / 2, (n, 4)).ravel())).reshape(n, 4)
+    open_time = start_time + np.arange(n, dtype='int64') * interval_ms
+    df = pd.DataFrame({'open_time': open_time,
+                       'datetime': pd.to_datetime(open_time, unit='ms'),
+                       'open': steps[:, 0],
+                       'high': steps.max(axis=1),
+                       'low': steps.min(axis=1),
+                       'close': steps[:, -1],
+                       'volume': rng.gamma(2.0, 50.0, n)})
+
+    close = df['close']
+    df['bbm'] = close.rolling(100).mean()
+    df['bbl'] = df['bbm'] - 2 * close.rolling(100).std(ddof=0)
+    df['bbu'] = df['bbm'] + 2 * close.rolling(100).std(ddof=0)
+    df['bbp'] = (close - df['bbl']) / (df['bbu'] - df['bbl'])
+    df['macd'] = close.ewm(span=45, adjust=False).mean() - close.ewm(span=90, adjust=False).mean()
+    df['macd_signal'] = df['macd'].ewm(span=9, adjust=False).mean()
+    df['macd_hist'] = df['macd'] - df['macd_signal']
+    df['strat_signal'] = np.where(rng.random(n) < signal_density, rng.choice([1, -1], n), 0)
+    return df
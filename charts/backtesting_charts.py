@@ -1,7 +1,15 @@
+import hashlib
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import plotly.express as px
 from preprocessing.labeling import Labeling
+from preprocessing.stage_cache import StageCache, get_fingerprint
+from charts.downsampling import downsample_ohlc, downsample_minmax
+from preprocessing.profiling import profiled
+from preprocessing.portfolio import simulate_portfolio, summarize_portfolio
+from preprocessing.monte_carlo import bootstrap_pnl, measure_pnl
+from preprocessing.intrabar import IntrabarResolver
+from optimization.parameter_sweep import summarize_labeling
 import pandas as pd
 from datetime import timedelta
 import numpy as np
@@ -17,7 +25,12 @@ class BacktestingCharts:
                  initial_amount_usd: float,
                  leverage: float,
                  trade_cost: float,
-                 portfolio_initial_value: float):
+                 portfolio_initial_value: float,
+                 cache: StageCache = None,
+                 max_positions: int = 1,
+                 resize_orders: bool = False,
+                 trades: pd.DataFrame = None,
+                 intrabar: IntrabarResolver = None):
 
         self.std_span = std_span
         self.tp_std_pct = tp_std_pct
@@ -27,60 +40,149 @@ class BacktestingCharts:
         self.leverage = leverage
         self.trade_cost = trade_cost
         self.portfolio_initial_value = portfolio_initial_value
+        self.cache = cache
+        self.max_positions = max_positions
+        self.resize_orders = resize_orders
+        self.intrabar = intrabar
 
-        self.candles = self.apply_labeling(candles)
+        # Candles are kept as they are, the labeling results live in a trade table with one row per signal.
+        # A stored run passes its trade table and skips the labeling.
+        self.candles = candles
+        self.trades = self.apply_labeling(candles) if trades is None else trades
+        self.orders, self.equity = self.apply_portfolio()
 
+    @profiled('apply_labeling')
     def apply_labeling(self, candles):
         lb = Labeling()
-        return lb.triple_barrier_analyzer(candles,
-                                          std_span=self.std_span,
-                                          tp=self.tp_std_pct,
-                                          sl=self.sl_std_pct,
-                                          tl=self.tl,
-                                          initial_amount_usd=self.initial_amount_usd,
-                                          leverage=self.leverage,
-                                          trade_cost=self.trade_cost)
+        if self.cache is None:
+            return lb.label_trades(candles,
+                                   std_span=self.std_span,
+                                   tp=self.tp_std_pct,
+                                   sl=self.sl_std_pct,
+                                   tl=self.tl,
+                                   initial_amount_usd=self.initial_amount_usd,
+                                   leverage=self.leverage,
+                                   trade_cost=self.trade_cost,
+                                   intrabar=self.intrabar)
+
+        # Each stage key holds only the inputs of that stage and the ones before it
+        barriers_key = (get_fingerprint(candles), self.std_span, self.tp_std_pct, self.sl_std_pct, self.tl,
+                        None if self.intrabar is None else ('intrabar', self.intrabar.get_key()))
+        returns_key = barriers_key + (self.trade_cost,)
+        pnl_key = returns_key + (self.initial_amount_usd, self.leverage)
+        barriers = self.cache.run('barriers', barriers_key,
+                                  lambda: lb.get_trade_barriers(candles,
+                                                                std_span=self.std_span,
+                                                                tp=self.tp_std_pct,
+                                                                sl=self.sl_std_pct,
+                                                                tl=self.tl,
+                                                                intrabar=self.intrabar))
+        returns = self.cache.run('returns', returns_key,
+                                 lambda: lb.get_trade_returns(barriers.copy(), trade_cost=self.trade_cost))
+        return self.cache.run('pnl', pnl_key,
+                              lambda: lb.calculate_pnl(returns.copy(),
+                                                       initial_amount_usd=self.initial_amount_usd,
+                                                       leverage=self.leverage))
+
+    @profiled('apply_portfolio')
+    def apply_portfolio(self):
+        return simulate_portfolio(self.trades,
+                                  portfolio_initial_value=self.portfolio_initial_value,
+                                  initial_amount_usd=self.initial_amount_usd,
+                                  leverage=self.leverage,
+                                  max_positions=self.max_positions,
+                                  resize_orders=self.resize_orders)
+
+    def get_portfolio_summary(self):
+        return summarize_portfolio(self.orders, self.equity, self.portfolio_initial_value)
+
+    def get_metrics(self):
+        return {**summarize_labeling(self.trades),
+                **{f'portfolio_{key}': value for key, value in self.get_portfolio_summary().items()}}
+
+    def get_trade_table(self):
+        """
+        Returns:
+            pandas.DataFrame: Trade table, with the order status and amount of the portfolio.
+        """
+        # Both tables hold the signals in the same order
+        return self.trades.assign(status=self.orders['status'].values, amount=self.orders['amount'].to_numpy())
+
+    def get_executed_trades(self):
+        return self.trades[self.trades['lab_active_order']]
 
     def get_total_candles(self):
         return len(self.candles)
 
     def get_total_signals(self):
-        return len(self.candles[self.candles['strat_signal'] != 0])
+        return len(self.trades)
 
     def get_profitable_signals(self):
-        return len(self.candles[((self.candles['lab_ret_sign'] > 0) & (self.candles['strat_signal'] != 0))])
+        return int((self.trades['lab_ret_sign'] > 0).sum())
 
     def get_executed_signals(self):
-        return len(self.candles[self.candles['lab_active_order']])
+        return int(self.trades['lab_active_order'].sum())
 
     def get_executed_profitable_signals(self):
-        return len(self.candles[(self.candles['lab_active_order']) & (self.candles['lab_ret_sign'] > 0)])
+        return int((self.get_executed_trades()['lab_ret_sign'] > 0).sum())
 
     def get_global_pnl(self):
-        return self.candles.loc[self.candles['lab_active_order'], 'lab_cum_pnl'][-1]
+        return self.get_executed_trades()['lab_cum_pnl'].iloc[-1]
 
     def get_maximum_amount(self):
-        return self.candles.loc[self.candles['lab_active_order'], 'lab_amount'].max()
+        return self.get_executed_trades()['lab_amount'].max()
 
     def get_maximum_margin(self):
-        return self.candles.loc[self.candles['lab_active_order'], 'lab_margin'].max()
+        return self.get_executed_trades()['lab_margin'].max()
 
+    def get_executed_returns(self):
+        return self.get_executed_trades()['lab_ret'].to_numpy(dtype=float)
+
+    @profiled('run_monte_carlo')
+    def run_monte_carlo(self, n_paths=10000, block_size=1, seed=0):
+        """
+        Bootstraps the returns of the executed trades, see preprocessing.monte_carlo.bootstrap_pnl.
+
+        Returns:
+            Dict[str, numpy.ndarray]: Final PnL, max drawdown and required margin of every path.
+        """
+        returns = self.get_executed_returns()
+
+        def compute():
+            return bootstrap_pnl(returns, self.initial_amount_usd, self.leverage,
+                                 n_paths=n_paths, block_size=block_size, seed=seed)
+
+        if self.cache is None:
+            return compute()
+        key = (hashlib.sha1(returns.tobytes()).hexdigest(), self.initial_amount_usd, self.leverage, n_paths,
+               block_size, seed)
+        return self.cache.run('monte_carlo', key, compute)
+
+    @profiled('plot_pnl_distribution')
+    def plot_pnl_distribution(self, results):
+        titles = {'final_pnl': 'Final PnL', 'max_drawdown': 'Max drawdown', 'required_margin': 'Required margin'}
+        realized = measure_pnl(self.get_executed_returns(), self.initial_amount_usd, self.leverage)
+        fig = make_subplots(rows=1, cols=3, subplot_titles=list(titles.values()))
+        for col, (key, title) in enumerate(titles.items(), start=1):
+            fig.add_trace(go.Histogram(x=results[key], nbinsx=60, marker={'color': 'lightblue'}, name=title,
+                                       showlegend=False),
+                          row=1, col=col)
+            fig.add_vline(x=realized[key], line_dash='dash', line_color='blue', row=1, col=col)
+            for percentile in (5, 95):
+                fig.add_vline(x=np.percentile(results[key], percentile), line_dash='dot', line_color='gray',
+                              row=1, col=col)
+        fig.update_xaxes(title_text='USD')
+        fig.update_layout(title='Bootstrap distributions (realized dashed, 5th and 95th percentiles dotted)')
+        return fig
+
+    @profiled('plot_exit_events')
     def plot_exit_events(self, all=True):
-        # Filter the candles based on the condition
-        if all:
-            df = self.candles.loc[self.candles['strat_signal'] != 0, ['lab_exit', 'strat_signal']]
-        else:
-            df = self.candles.loc[self.candles['lab_active_order'], ['lab_exit', 'strat_signal']]
-        df.replace({'sl': 'SL',
-                    'tp': 'TP',
-                    'tl': 'TL',
-                    1: 'LONG',
-                    -1: 'SHORT'},
-                   inplace=True)
+        trades = self.trades if all else self.get_executed_trades()
+        df = pd.DataFrame({'lab_exit': trades['lab_exit'].cat.rename_categories(str.upper),
+                           'strat_signal': np.where(trades['strat_signal'] > 0, 'LONG', 'SHORT')})
 
         # Compute the count of each category
-        df['count'] = 1
-        df = df.groupby(['lab_exit', 'strat_signal']).count().reset_index()
+        df = df.groupby(['lab_exit', 'strat_signal'], observed=True).size().reset_index(name='count')
 
         # Define the color map
         color_map = {
@@ -99,186 +201,142 @@ class BacktestingCharts:
         fig.update_layout(title={'text': f"Total {'signals' if all else 'executions'}"})
         return fig
 
-    def get_candlestick_chart(self):
+    @profiled('get_candlestick_chart')
+    def get_candlestick_chart(self, max_points=5000):
+        """
+        Builds the candlestick chart with indicators, signals and positions. Candles and indicators are downsampled to
+        at most `max_points` points each, and the line traces use WebGL.
+        """
         candlestick = make_subplots(rows=2,
                                     cols=1,
                                     shared_xaxes=True,
                                     vertical_spacing=0.1,
                                     row_heights=[2400, 1200])
 
-        # Add bbands
-        candlestick.add_trace(go.Scatter(x=self.candles['datetime'],
-                                         y=self.candles['bbl'],
-                                         marker={'color': 'purple'},
-                                         name='Bollinger Band (Lower)'),
-                              col=1,
-                              row=1)
+        # Add bbands and ma 21 to upper subplot, MACD with signal to lower subplot
+        for column, name, marker, row in [('bbl', 'Bollinger Band (Lower)', {'color': 'purple'}, 1),
+                                          ('bbu', 'Bollinger Band (Upper)', {'color': 'purple'}, 1),
+                                          ('bbm', 'MA 21', {'color': 'black'}, 1),
+                                          ('macd', 'MACD', None, 2),
+                                          ('macd_signal', 'Signal', None, 2)]:
+            x, y = downsample_minmax(self.candles['datetime'], self.candles[column], max_points)
+            candlestick.add_trace(go.Scattergl(x=x,
+                                               y=y,
+                                               marker=marker,
+                                               name=name),
+                                  col=1,
+                                  row=row)
 
-        candlestick.add_trace(go.Scatter(x=self.candles['datetime'],
-                                         y=self.candles['bbu'],
-                                         marker={'color': 'purple'},
-                                         name='Bollinger Band (Upper)'),
-                              col=1,
-                              row=1)
-
-        # Add ma 21
-        candlestick.add_trace(go.Scatter(x=self.candles['datetime'],
-                                         y=self.candles['bbm'],
-                                         marker={'color': 'black'},
-                                         name='MA 21'),
-                              col=1,
-                              row=1)
-
-        # Add MACD with signal to lower subplot
-        candlestick.add_trace(go.Scatter(x=self.candles['datetime'],
-                                         y=self.candles['macd'],
-                                         name="MACD"),
-                              row=2,
-                              col=1)
-
-        candlestick.add_trace(go.Scatter(x=self.candles['datetime'],
-                                         y=self.candles['macd_signal'],
-                                         name="Signal"),
-                              row=2,
-                              col=1)
-
-        # Add the MACD histogram to the lower subplot
-        candlestick.add_trace(go.Bar(x=self.candles['datetime'],
-                                     y=self.candles['macd_hist'],
-                                     marker=dict(
-                                         color=self.candles['macd_hist']
-                                         .apply(lambda x: 'lightgreen' if x >= 0 else 'red')),
-                                     name="MACD Hist"),
-                              row=2,
-                              col=1)
+        # Add the MACD histogram to the lower subplot, one trace per colour
+        x, y = downsample_minmax(self.candles['datetime'], self.candles['macd_hist'], max_points)
+        for mask, color, showlegend in [(y >= 0, 'lightgreen', True), (y < 0, 'red', False)]:
+            candlestick.add_trace(go.Bar(x=x[mask],
+                                         y=y[mask],
+                                         marker=dict(color=color),
+                                         name="MACD Hist",
+                                         legendgroup="MACD Hist",
+                                         showlegend=showlegend),
+                                  row=2,
+                                  col=1)
 
         candlestick = self.plot_signals(candlestick)
         candlestick = self.plot_positions(candlestick)
         candlestick.update_layout(xaxis_rangeslider_visible=False, hovermode='x unified')
         # Add candles
-        candlestick.add_trace(go.Candlestick(x=self.candles['datetime'],
-                                             open=self.candles['open'],
-                                             high=self.candles['high'],
-                                             low=self.candles['low'],
-                                             close=self.candles['close'],
+        candles = downsample_ohlc(self.candles, max_points)
+        candlestick.add_trace(go.Candlestick(x=candles['datetime'],
+                                             open=candles['open'],
+                                             high=candles['high'],
+                                             low=candles['low'],
+                                             close=candles['close'],
                                              name='Binance Candles'),
                               col=1,
                               row=1)
         return candlestick
 
     def get_bad_memory_hist(self):
-        active_positions = self.candles[self.candles['lab_active_order']]
+        active_positions = self.get_executed_trades()
         fig = go.Figure(data=[go.Histogram(x=active_positions['lab_ball'])])
         return fig
 
     def plot_signals(self, fig):
-        active_positions = self.candles[self.candles['lab_active_order']]
-        # Add wrong short signals
-        fig.add_trace(go.Scatter(x=active_positions.loc[(active_positions['strat_signal'] < 0) &
-                                                        (active_positions['lab_ret_sign'] <= 0), 'datetime'],
-                                 y=active_positions.loc[(active_positions['strat_signal'] < 0) &
-                                                        (active_positions['lab_ret_sign'] <= 0), 'close'],
-                                 mode='markers',
-                                 name='Incorrect short signal',
-                                 marker={'color': 'red',
-                                         'symbol': 'triangle-down',
-                                         'size': 10,
-                                         'line': {'color': 'black', 'width': 0.7}}))
-        # Add correct short signals
-        fig.add_trace(go.Scatter(x=active_positions.loc[(active_positions['strat_signal'] < 0) &
-                                                        (active_positions['lab_ret_sign'] > 0), 'datetime'],
-                                 y=active_positions.loc[(active_positions['strat_signal'] < 0) &
-                                                        (active_positions['lab_ret_sign'] > 0), 'close'],
-                                 mode='markers',
-                                 name='Correct short signal',
-                                 marker={'color': 'lightgreen',
-                                         'symbol': 'triangle-down',
-                                         'size': 10,
-                                         'line': {'color': 'black', 'width': 0.7}}))
-
-        # Add wrong long signals
-        fig.add_trace(go.Scatter(x=active_positions.loc[(active_positions['strat_signal'] > 0) &
-                                                        (active_positions['lab_ret_sign'] <= 0), 'datetime'],
-                                 y=active_positions.loc[(active_positions['strat_signal'] > 0) &
-                                                        (active_positions['lab_ret_sign'] <= 0), 'close'],
-                                 mode='markers',
-                                 name='Incorrect long signal',
-                                 marker={'color': 'red',
-                                         'symbol': 'triangle-up',
-                                         'size': 10,
-                                         'line': {'color': 'black', 'width': 0.7}}))
-        # Add correct long signals
-        fig.add_trace(go.Scatter(x=active_positions.loc[(active_positions['strat_signal'] > 0) &
-                                                        (active_positions['lab_ret_sign'] > 0), 'datetime'],
-                                 y=active_positions.loc[(active_positions['strat_signal'] > 0) &
-                                                        (active_positions['lab_ret_sign'] > 0), 'close'],
-                                 mode='markers',
-                                 name='Correct long signal',
-                                 marker={'color': 'lightgreen',
-                                         'symbol': 'triangle-up',
-                                         'size': 10,
-                                         'line': {'color': 'black', 'width': 0.7}}))
+        active_positions = self.get_executed_trades()
+        short = active_positions['strat_signal'] < 0
+        long = active_positions['strat_signal'] > 0
+        correct = active_positions['lab_ret_sign'] > 0
+        for mask, name, color, symbol in [(short & ~correct, 'Incorrect short signal', 'red', 'triangle-down'),
+                                          (short & correct, 'Correct short signal', 'lightgreen', 'triangle-down'),
+                                          (long & ~correct, 'Incorrect long signal', 'red', 'triangle-up'),
+                                          (long & correct, 'Correct long signal', 'lightgreen', 'triangle-up')]:
+            fig.add_trace(go.Scattergl(x=active_positions.loc[mask, 'datetime'],
+                                       y=active_positions.loc[mask, 'close'],
+                                       mode='markers',
+                                       name=name,
+                                       marker={'color': color,
+                                               'symbol': symbol,
+                                               'size': 10,
+                                               'line': {'color': 'black', 'width': 0.7}}))
         return fig
 
     def plot_positions(self, fig):
-        active_positions = self.candles[self.candles['lab_active_order']]
-        # Add long and short positions
-        for index, row in active_positions.iterrows():
-            # Add TP
-            if row['strat_signal'] > 0:
-                fig.add_shape(type="rect",
-                              fillcolor="green",
-                              opacity=0.5,
-                              x0=row.datetime,
-                              y0=row.close,
-                              x1=row.close_datetime - timedelta(hours=3),
-                              y1=row.lab_tp_order,
-                              line=dict(color="green"))
-                # Add SL
-                fig.add_shape(type="rect",
-                              fillcolor="red",
-                              opacity=0.5,
-                              x0=row.datetime,
-                              y0=row.close,
-                              x1=row.close_datetime - timedelta(hours=3),
-                              y1=row.lab_sl_order,
-                              line=dict(color="red"))
-            # Add TP
-            if row['strat_signal'] < 0:
-                fig.add_shape(type="rect",
-                              fillcolor="green",
-                              opacity=0.5,
-                              x0=row.datetime,
-                              y0=row.close,
-                              x1=row.close_datetime - timedelta(hours=3),
-                              y1=row.lab_tp_order,
-                              line=dict(color="green"))
-                # Add SL
-                fig.add_shape(type="rect",
-                              fillcolor="red",
-                              opacity=0.5,
-                              x0=row.datetime,
-                              y0=row.close,
-                              x1=row.close_datetime - timedelta(hours=3),
-                              y1=row.lab_sl_order,
-                              line=dict(color="red"))
+        active_positions = self.get_executed_trades()
+        x0 = pd.to_datetime(active_positions['datetime']).to_numpy(dtype='datetime64[ns]')
+        x1 = (active_positions['close_datetime'] - timedelta(hours=3)).to_numpy(dtype='datetime64[ns]')
+        x_gap = np.full(len(active_positions), np.datetime64('NaT'), dtype='datetime64[ns]')
+        y_gap = np.full(len(active_positions), np.nan)
+        # Add TP and SL boxes of long and short positions, one trace each with the rectangles split by gaps
+        for column, name, color in [('lab_tp_order', 'Take profit', 'green'),
+                                    ('lab_sl_order', 'Stop loss', 'red')]:
+            y0 = active_positions['close'].to_numpy(dtype=float)
+            y1 = active_positions[column].to_numpy(dtype=float)
+            fig.add_trace(go.Scatter(x=np.column_stack([x0, x1, x1, x0, x0, x_gap]).ravel(),
+                                     y=np.column_stack([y0, y0, y1, y1, y0, y_gap]).ravel(),
+                                     mode='lines',
+                                     fill='toself',
+                                     fillcolor=color,
+                                     opacity=0.5,
+                                     line=dict(color=color),
+                                     hoverinfo='skip',
+                                     name=name),
+                          col=1,
+                          row=1)
         return fig
 
+    @profiled('plot_pnl')
     def plot_pnl(self):
         fig = go.Figure()
         fig.add_trace(
-            go.Bar(x=self.candles.loc[self.candles['lab_ret'] > 0, 'datetime'],
-                   y=self.candles.loc[self.candles['lab_ret'] > 0, 'lab_ret_usd'],
+            go.Bar(x=self.trades.loc[self.trades['lab_ret'] > 0, 'datetime'],
+                   y=self.trades.loc[self.trades['lab_ret'] > 0, 'lab_ret_usd'],
                    marker={'color': '#00E805'},
                    name='Profit'))
         fig.add_trace(
-            go.Bar(x=self.candles.loc[self.candles['lab_ret'] < 0, 'datetime'],
-                   y=self.candles.loc[self.candles['lab_ret'] < 0, 'lab_ret_usd'],
+            go.Bar(x=self.trades.loc[self.trades['lab_ret'] < 0, 'datetime'],
+                   y=self.trades.loc[self.trades['lab_ret'] < 0, 'lab_ret_usd'],
                    marker={'color': 'violet'},
                    name='Loss'))
-        fig.add_trace(go.Scatter(x=self.candles.loc[self.candles['lab_active_order'], 'datetime'],
-                                 y=self.candles.loc[self.candles['lab_active_order'], 'lab_cum_pnl'],
+        executed = self.get_executed_trades()
+        fig.add_trace(go.Scatter(x=executed['datetime'],
+                                 y=executed['lab_cum_pnl'],
                                  marker={'color': 'blue'},
                                  name='Cumulative PnL'))
         fig.update_layout(title='PnL Over Time')
         return fig
+
+    @profiled('plot_portfolio')
+    def plot_portfolio(self):
+        fig = make_subplots(specs=[[{'secondary_y': True}]])
+        fig.add_trace(go.Scatter(x=self.equity.index,
+                                 y=self.equity['equity'],
+                                 line={'shape': 'hv', 'color': 'blue'},
+                                 name='Equity'),
+                      secondary_y=False)
+        fig.add_trace(go.Scatter(x=self.equity.index,
+                                 y=self.equity['margin_used'],
+                                 line={'shape': 'hv', 'color': 'orange'},
+                                 name='Margin used'),
+                      secondary_y=True)
+        fig.update_yaxes(title_text='Equity [USD]', secondary_y=False)
+        fig.update_yaxes(title_text='Margin [USD]', secondary_y=True)
+        fig.update_layout(title='Portfolio equity and margin')
+        return fig
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+
+def get_bucket_starts(n, max_buckets):
+    """
+    Splits n consecutive points into at most `max_buckets` buckets of about the same size.
+
+    Args:
+        n (int): Number of points.
+        max_buckets (int): Maximum number of buckets.
+
+    Returns:
+        numpy.ndarray: Position of the first point of every bucket.
+    """
+    return np.unique(np.linspace(0, n, min(n, max_buckets) + 1, dtype=int)[:-1])
+
+
+def downsample_ohlc(df: pd.DataFrame, max_points: int):
+    """
+    Aggregates candles into at most `max_points` buckets with first open, highest high, lowest low and last close, so
+    the wicks of the visible candles keep the full price range.
+
+    Args:
+        df (pandas.DataFrame): Candles with datetime, open, high, low and close columns.
+        max_points (int): Maximum number of candles to draw.
+
+    Returns:
+        pandas.DataFrame: Downsampled candles (df itself when it already fits).
+    """
+    if len(df) <= max_points:
+        return df
+    starts = get_bucket_starts(len(df), max_points)
+    ends = np.append(starts[1:], len(df)) - 1
+    return pd.DataFrame({'datetime': df['datetime'].to_numpy()[starts],
+                         'open': df['open'].to_numpy()[starts],
+                         'high': np.fmax.reduceat(df['high'].to_numpy(dtype=float), starts),
+                         'low': np.fmin.reduceat(df['low'].to_numpy(dtype=float), starts),
+                         'close': df['close'].to_numpy()[ends]})
+
+
+def downsample_minmax(x, y, max_points: int):
+    """
+    Keeps the lowest and the highest point of each bucket (min-max bucketing), so peaks survive downsampling. NaN
+    points are dropped.
+
+    Args:
+        x (array-like): X values, in order.
+        y (array-like): Y values.
+        max_points (int): Maximum number of points to draw.
+
+    Returns:
+        Tuple[numpy.ndarray, numpy.ndarray]: Downsampled x and y.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    valid = ~np.isnan(y)
+    x, y = x[valid], y[valid]
+    if len(y) <= max_points:
+        return x, y
+    bucket = np.zeros(len(y), dtype=int)
+    bucket[get_bucket_starts(len(y), max_points // 2)[1:]] = 1
+    bucket = np.cumsum(bucket)
+    # Sorted by bucket and value, the first and last point of each bucket are its min and max
+    order = np.lexsort((y, bucket))
+    first = np.flatnonzero(np.diff(bucket[order], prepend=-1))
+    last = np.append(first[1:], len(order)) - 1
+    keep = np.unique(np.concatenate([order[first], order[last]]))
+    return x[keep], y[keep]
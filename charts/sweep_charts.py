@@ -0,0 +1,72 @@
+import plotly.graph_objects as go
+import pandas as pd
+
+
+def plot_sweep_heatmap(results: pd.DataFrame, x: str, y: str, metric: str = 'global_pnl'):
+    """
+    Plots a metric of a parameter sweep as a heatmap over two of its parameters. When the sweep varies other
+    parameters too, each cell shows the best value reached among them.
+
+    Args:
+        results (pandas.DataFrame): Output of run_parameter_sweep.
+        x (str): Parameter shown on the x axis.
+        y (str): Parameter shown on the y axis.
+        metric (str): Metric used as the cell value (default is 'global_pnl').
+
+    Returns:
+        plotly.graph_objects.Figure: Heatmap figure.
+    """
+    table = results.pivot_table(index=y, columns=x, values=metric, aggfunc='max')
+    fig = go.Figure(data=go.Heatmap(x=table.columns.astype(str),
+                                    y=table.index.astype(str),
+                                    z=table.values,
+                                    colorscale='RdYlGn',
+                                    colorbar={'title': metric}))
+    fig.update_layout(title=f'{metric} by {x} and {y}',
+                      xaxis_title=x,
+                      yaxis_title=y)
+    return fig
+
+
+def plot_walk_forward_pnl(oos_pnl: pd.DataFrame, stats: pd.DataFrame):
+    """
+    Plots the stitched out-of-sample PnL of a walk-forward run, with a line at the start of every test window.
+
+    Args:
+        oos_pnl (pandas.DataFrame): Out-of-sample PnL returned by run_walk_forward.
+        stats (pandas.DataFrame): Fold statistics returned by run_walk_forward.
+
+    Returns:
+        plotly.graph_objects.Figure: Line figure.
+    """
+    fig = go.Figure(data=go.Scattergl(x=oos_pnl.index, y=oos_pnl['oos_cum_pnl'], mode='lines', name='OOS PnL'))
+    for test_start in stats['test_start']:
+        fig.add_vline(x=test_start, line_width=1, line_dash='dot', line_color='gray')
+    fig.update_layout(title='Walk-forward out-of-sample PnL',
+                      xaxis_title='Datetime',
+                      yaxis_title='Cumulative PnL [USD]')
+    return fig
+
+
+def plot_successive_halving(history: pd.DataFrame, metric: str = 'global_pnl'):
+    """
+    Plots the score of every candidate of a successive halving search against the candles of each rung, with the
+    candidates promoted to the next rung highlighted.
+
+    Args:
+        history (pandas.DataFrame): Rung results returned by run_successive_halving.
+        metric (str): Searched metric (default is 'global_pnl').
+
+    Returns:
+        plotly.graph_objects.Figure: Scatter figure.
+    """
+    fig = go.Figure()
+    for promoted, name, color in [(False, 'Dropped', 'lightgray'), (True, 'Promoted', 'green')]:
+        rungs = history[history['promoted'] == promoted]
+        fig.add_trace(go.Scattergl(x=rungs['candles'], y=rungs[metric], mode='markers', name=name,
+                                   marker={'color': color}))
+    fig.update_layout(title=f'{metric} by rung',
+                      xaxis_title='Candles',
+                      xaxis_type='log',
+                      yaxis_title=metric)
+    return fig
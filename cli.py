@@ -0,0 +1,178 @@
+"""
+Runs a backtest without the Streamlit app and writes its metrics and trades.
+
+Usage:
+    python cli.py --candles candles/BTCUSDT_1m.csv --strategy demo_strategy --trades trades.parquet
+    python cli.py --stored BTCUSDT 1m --tp 2 --sl 1 --metrics metrics.json --chart report.html
+    python cli.py --stored BTCUSDT 1m --stream --chunk-size 500000 --trades trades.parquet
+
+Charting and exchange clients are only imported when an option needs them, so jobs that just need numbers start
+fast.
+"""
+import argparse
+import importlib
+import json
+import sys
+
+import pandas as pd
+
+from preprocessing.labeling import Labeling
+from preprocessing.portfolio import simulate_portfolio, summarize_portfolio
+from optimization.parameter_sweep import summarize_labeling
+
+TRADE_COLUMNS = ['strat_signal', 'close', 'close_datetime', 'lab_exit', 'lab_ret', 'lab_active_order', 'lab_ret_usd',
+                 'lab_cum_pnl']
+
+
+def load_candles_(args):
+    if args.stored:
+        from connector.binance_candles import get_stored_candles
+        return get_stored_candles(*args.stored)
+    from connector.candle_loader import load_candles
+    return load_candles(args.candles)
+
+
+def label_stream_(args, module, params):
+    # Chunks are read from the candle store, so only the signal rows are kept in memory
+    from connector.binance_candles import get_binance_candle_store
+    from preprocessing.streaming_labeling import StreamingLabeling, iter_strategy_chunks
+    chunks = get_binance_candle_store().iter_chunks(*args.stored, chunk_size=args.chunk_size)
+    n_candles = 0
+
+    def count_(chunks):
+        nonlocal n_candles
+        for chunk in chunks:
+            n_candles += len(chunk)
+            yield chunk
+
+    strategy_chunks = iter_strategy_chunks(count_(chunks), module.strategy, args.lookback)
+    labeled = [df[df['strat_signal'] != 0] for df in StreamingLabeling(**params).iter_labeled_chunks(strategy_chunks)]
+    if not labeled:
+        raise ValueError(f'No stored {args.stored[1]} candles for {args.stored[0]}')
+    return n_candles, pd.concat(labeled)
+
+
+def get_intrabar_resolver_(args):
+    from preprocessing.intrabar import IntrabarResolver
+    if args.stored:
+        from connector.binance_candles import get_binance_candle_store
+        return IntrabarResolver(get_binance_candle_store(), *args.stored)
+    return IntrabarResolver()
+
+
+def to_json_value_(value):
+    return value.item() if hasattr(value, 'item') else str(value)
+
+
+def write_trades_(trades, path):
+    trades = trades.rename_axis('datetime').reset_index()
+    if path.endswith('.parquet'):
+        trades.to_parquet(path, index=False)
+    else:
+        trades.to_json(path, orient='records', date_format='iso', indent=2)
+
+
+def write_chart_(bt, path):
+    figures = [bt.plot_pnl(), bt.plot_portfolio(), bt.get_candlestick_chart()]
+    with open(path, 'w') as file:
+        file.write('<html><head><meta charset="utf-8"/></head><body>')
+        for position, fig in enumerate(figures):
+            file.write(fig.to_html(full_html=False, include_plotlyjs='cdn' if position == 0 else False))
+        file.write('</body></html>')
+
+
+def run_backtest(args):
+    """
+    Loads the candles, applies the strategy and the labeling pipeline, and writes the requested outputs.
+
+    Returns:
+        dict: Labeling and portfolio metrics.
+    """
+    module = importlib.import_module(f'strategies.{args.strategy}')
+    params = {'std_span': args.std_span, 'tp': args.tp, 'sl': args.sl, 'tl': args.tl,
+              'initial_amount_usd': args.initial_amount_usd, 'leverage': args.leverage, 'trade_cost': args.trade_cost}
+    if args.stream:
+        n_candles, trades = label_stream_(args, module, params)
+    else:
+        candles = load_candles_(args)
+        n_candles = len(candles)
+        strategy_candles = module.strategy(candles)
+        intrabar = get_intrabar_resolver_(args) if args.intrabar else None
+        trades = Labeling().label_trades(strategy_candles, **params, intrabar=intrabar)
+    if args.chart:
+        from charts.backtesting_charts import BacktestingCharts
+        bt = BacktestingCharts(strategy_candles,
+                               std_span=args.std_span,
+                               tp_std_pct=args.tp,
+                               sl_std_pct=args.sl,
+                               tl=args.tl,
+                               initial_amount_usd=args.initial_amount_usd,
+                               leverage=args.leverage,
+                               trade_cost=args.trade_cost,
+                               portfolio_initial_value=args.portfolio_initial_value,
+                               max_positions=args.max_positions,
+                               trades=trades)
+        write_chart_(bt, args.chart)
+
+    orders, equity = simulate_portfolio(trades,
+                                        portfolio_initial_value=args.portfolio_initial_value,
+                                        initial_amount_usd=args.initial_amount_usd,
+                                        leverage=args.leverage,
+                                        max_positions=args.max_positions)
+    metrics = {'candles': n_candles,
+               **params,
+               'intrabar': args.intrabar,
+               **summarize_labeling(trades),
+               'portfolio': summarize_portfolio(orders, equity, args.portfolio_initial_value)}
+
+    if args.trades:
+        written = trades if args.all_signals else trades[trades['lab_active_order']]
+        write_trades_(written[TRADE_COLUMNS], args.trades)
+    if args.metrics == '-':
+        json.dump(metrics, sys.stdout, indent=2, default=to_json_value_)
+        sys.stdout.write('\n')
+    else:
+        with open(args.metrics, 'w') as file:
+            json.dump(metrics, file, indent=2, default=to_json_value_)
+    return metrics
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Backtest a strategy on stored candles without the Streamlit app.')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--candles', help='Candles CSV file.')
+    source.add_argument('--stored', nargs=2, metavar=('TICKER', 'INTERVAL'), help='Dataset of the local candle store.')
+    parser.add_argument('--strategy', default='demo_strategy', help='Module name in strategies/.')
+    parser.add_argument('--std-span', type=int, default=100)
+    parser.add_argument('--tp', type=float, default=1.5)
+    parser.add_argument('--sl', type=float, default=0.75)
+    parser.add_argument('--tl', type=int, default=500)
+    parser.add_argument('--initial-amount-usd', type=float, default=15.0)
+    parser.add_argument('--leverage', type=float, default=20.0)
+    parser.add_argument('--trade-cost', type=float, default=0.0006, help='Proportional cost, e.g. 0.0006 for 0.06 %%.')
+    parser.add_argument('--portfolio-initial-value', type=float, default=150.0)
+    parser.add_argument('--max-positions', type=int, default=1)
+    parser.add_argument('--intrabar', action='store_true',
+                        help='Touch barriers with high/low prices, settling candles that cross both with the stored 1m '
+                             'candles (stop loss first without them).')
+    parser.add_argument('--stream', action='store_true',
+                        help='Read the stored candles in chunks and label them as they come, for histories larger than '
+                             'memory (requires --stored).')
+    parser.add_argument('--chunk-size', type=int, default=100000, help='Candles per chunk with --stream.')
+    parser.add_argument('--lookback', type=int, default=1000,
+                        help='Candles of the previous chunk the strategy is run with, to warm up its indicators.')
+    parser.add_argument('--metrics', default='-', help='Metrics JSON file (default is stdout).')
+    parser.add_argument('--trades', help='Trades file, .parquet or .json.')
+    parser.add_argument('--all-signals', action='store_true', help='Write every signal, not only executed trades.')
+    parser.add_argument('--chart', help='HTML report with the PnL, portfolio and candlestick charts.')
+    args = parser.parse_args(argv)
+    if args.stream and not args.stored:
+        parser.error('--stream requires --stored')
+    if args.stream and (args.intrabar or args.chart):
+        parser.error('--stream does not support --intrabar or --chart')
+    run_backtest(args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
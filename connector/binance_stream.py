@@ -0,0 +1,65 @@
+import asyncio
+import json
+from datetime import datetime
+
+import websockets
+
+BINANCE_STREAM_URL = 'wss://stream.binance.com:9443'
+
+
+def kline_to_candle_(kline):
+    return {'open_time': int(kline['t']),
+            'datetime': datetime.fromtimestamp(kline['t'] // 1000),
+            'open': float(kline['o']),
+            'high': float(kline['h']),
+            'low': float(kline['l']),
+            'close': float(kline['c']),
+            'volume': float(kline['v'])}
+
+
+async def iter_closed_klines(ticker, interval, after=None, base_url=BINANCE_STREAM_URL, max_retries=5, backoff=0.5,
+                             max_backoff=30.0):
+    """
+    Yields the klines of a symbol as they close, from the Binance kline websocket stream. The connection is reopened
+    with exponential backoff when it drops or is closed, and candles already yielded are not repeated.
+
+    Args:
+        ticker (str): Symbol, e.g. 'BTCUSDT'.
+        interval (str): Candle interval, e.g. '1m'.
+        after (int): Open time in milliseconds of the last candle already processed, if any. Older ones are skipped.
+        base_url (str): Websocket endpoint (default is the Binance spot stream).
+        max_retries (int): Consecutive reconnections without receiving a message before giving up (default is 5).
+        backoff (float): Seconds to wait before the first reconnection, doubled on every retry (default is 0.5).
+        max_backoff (float): Longest wait between reconnections in seconds (default is 30).
+
+    Yields:
+        dict: Closed candle with the columns of get_binance_candles.
+
+    Raises:
+        ConnectionError: The stream kept closing without error for `max_retries` reconnections. Connection errors
+            are raised as they are.
+    """
+    url = f"{base_url}/ws/{ticker.replace('-', '').lower()}@kline_{interval}"
+    last_open_time = after
+    attempt = 0
+    while True:
+        try:
+            async with websockets.connect(url) as websocket:
+                async for message in websocket:
+                    # The connection works, the next drop starts the backoff over
+                    attempt = 0
+                    kline = json.loads(message).get('k')
+                    # Open klines are pushed on every trade, only closed ones are final
+                    if kline is None or not kline['x']:
+                        continue
+                    if last_open_time is not None and kline['t'] <= last_open_time:
+                        continue
+                    last_open_time = kline['t']
+                    yield kline_to_candle_(kline)
+            error = ConnectionError(f'{url} closed the stream')
+        except (websockets.ConnectionClosed, OSError, asyncio.TimeoutError) as exc:
+            error = exc
+        if attempt == max_retries:
+            raise error
+        await asyncio.sleep(min(backoff * 2 ** attempt, max_backoff))
+        attempt += 1
@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Columns kept by the compact layout and their dtypes. `datetime` is stored as datetime64[ns].
+CANDLE_DTYPES = {
+    'open_time': 'int64',
+    'open': 'float64',
+    'high': 'float64',
+    'low': 'float64',
+    'close': 'float64',
+    'volume': 'float32',
+}
+LAYOUT_VERSION = 1
+# File in the layout directory naming the version directory in use
+CURRENT_FILE = 'current'
+
+
+def get_layout_dir(path, cache_dir):
+    path = os.path.abspath(path)
+    digest = hashlib.sha1(path.encode()).hexdigest()[:12]
+    return os.path.join(cache_dir, f'{os.path.splitext(os.path.basename(path))[0]}-{digest}')
+
+
+def get_current_dir_(layout_dir):
+    try:
+        with open(os.path.join(layout_dir, CURRENT_FILE)) as file:
+            return os.path.join(layout_dir, file.read().strip())
+    except OSError:
+        return None
+
+
+def get_source_info_(path):
+    stat = os.stat(path)
+    return {'version': LAYOUT_VERSION, 'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def convert_csv(path, layout_dir):
+    """
+    Parses a candles CSV once and writes the used columns as one .npy file per column, in a new version directory
+    of the layout that replaces the current one atomically.
+
+    Files of a previous version are never rewritten, since frames from earlier loads may still memory-map them:
+    truncating a mapped file makes reading its pages crash the process with a bus error.
+
+    Args:
+        path (str): Candles CSV with at least open_time and OHLCV columns.
+        layout_dir (str): Directory of the compact layout.
+
+    Returns:
+        str: Version directory with the column files.
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    usecols = list(CANDLE_DTYPES) + (['datetime'] if 'datetime' in header else [])
+    # Timestamps may be written as floats (e.g. 1678158000000.0), so they are cast after parsing
+    candles = pd.read_csv(path,
+                          usecols=usecols,
+                          dtype={column: 'float64' for column in CANDLE_DTYPES},
+                          parse_dates=['datetime'] if 'datetime' in header else False)
+    if 'datetime' not in header:
+        candles['datetime'] = candles['open_time'].apply(lambda x: datetime.fromtimestamp(x // 1000))
+
+    os.makedirs(layout_dir, exist_ok=True)
+    version_dir = tempfile.mkdtemp(prefix='v', dir=layout_dir)
+    for column, dtype in CANDLE_DTYPES.items():
+        np.save(os.path.join(version_dir, f'{column}.npy'), candles[column].to_numpy(dtype=dtype))
+    np.save(os.path.join(version_dir, 'datetime.npy'), candles['datetime'].to_numpy(dtype='datetime64[ns]'))
+    with open(os.path.join(version_dir, 'source.json'), 'w') as file:
+        json.dump(get_source_info_(path), file)
+
+    with tempfile.NamedTemporaryFile('w', dir=layout_dir, suffix='.tmp', delete=False) as file:
+        file.write(os.path.basename(version_dir))
+    os.replace(file.name, os.path.join(layout_dir, CURRENT_FILE))
+
+    # Older complete versions are unlinked, not truncated: frames that map them keep their pages until they are
+    # released (where mapped files cannot be removed, they are left for a later conversion)
+    for name in os.listdir(layout_dir):
+        old_dir = os.path.join(layout_dir, name)
+        if old_dir != version_dir and os.path.exists(os.path.join(old_dir, 'source.json')):
+            shutil.rmtree(old_dir, ignore_errors=True)
+    return version_dir
+
+
+def is_layout_current_(path, version_dir):
+    if version_dir is None:
+        return False
+    try:
+        with open(os.path.join(version_dir, 'source.json')) as file:
+            return json.load(file) == get_source_info_(path)
+    except (OSError, ValueError):
+        return False
+
+
+def load_candles(path, cache_dir='candles/.cache'):
+    """
+    Loads a candles CSV through its compact binary layout. The CSV is converted on first use (or when it changes) and
+    later loads memory-map the column files, so nothing is parsed or copied until a column is used.
+
+    The arrays are mapped copy-on-write: code that modifies the frame in place gets private pages and never writes
+    back to disk.
+
+    Args:
+        path (str): Candles CSV.
+        cache_dir (str): Directory holding the compact layouts (default is 'candles/.cache').
+
+    Returns:
+        pandas.DataFrame: open_time (int64 ms), datetime, open, high, low, close and volume columns.
+    """
+    layout_dir = get_layout_dir(path, cache_dir)
+    version_dir = get_current_dir_(layout_dir)
+    if not is_layout_current_(path, version_dir):
+        version_dir = convert_csv(path, layout_dir)
+    columns = {column: np.load(os.path.join(version_dir, f'{column}.npy'), mmap_mode='c')
+               for column in ['open_time', 'datetime', 'open', 'high', 'low', 'close', 'volume']}
+    return pd.DataFrame(columns, copy=False)
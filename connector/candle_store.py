@@ -0,0 +1,237 @@
+import bisect
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Interval duration in milliseconds
+INTERVAL_DURATION = {
+    '1m': 60 * 10 ** 3,
+    '3m': 180 * 10 ** 3,
+    '5m': 300 * 10 ** 3,
+    '15m': 900 * 10 ** 3,
+    '30m': 1800 * 10 ** 3,
+    '1h': 3600 * 10 ** 3,
+    '2h': 7200 * 10 ** 3,
+    '4h': 14400 * 10 ** 3,
+    '6h': 21600 * 10 ** 3,
+    '8h': 28800 * 10 ** 3,
+    '12h': 43200 * 10 ** 3,
+    '1d': 86400 * 10 ** 3,
+    '3d': 259200 * 10 ** 3,
+    '1w': 604800 * 10 ** 3,
+    '1M': 2592000 * 10 ** 3
+}
+
+STORE_COLUMNS = ['open_time', 'open', 'high', 'low', 'close', 'volume', 'close_time', 'qav', 'num_trades',
+                 'taker_base_vol', 'taker_quote_vol']
+TIME_COLUMNS = ['open_time', 'close_time']
+# Small row groups let time-filtered reads decode only the part of a file they need
+ROW_GROUP_SIZE = 2 ** 16
+
+
+def merge_ranges(ranges):
+    """
+    Merges overlapping or contiguous [start, end) ranges.
+
+    Args:
+        ranges (List[List[int]]): Ranges in milliseconds.
+
+    Returns:
+        List[List[int]]: Sorted, non-overlapping ranges.
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def get_missing_ranges(ranges, start, end):
+    """
+    Finds the parts of [start, end) that are not covered by the given ranges.
+
+    Args:
+        ranges (List[List[int]]): Sorted, non-overlapping ranges already held.
+        start (int): Start of the requested range in milliseconds.
+        end (int): End of the requested range in milliseconds (excluded).
+
+    Returns:
+        List[List[int]]: Gaps to fetch.
+    """
+    gaps = []
+    for held_start, held_end in ranges:
+        if held_end <= start:
+            continue
+        if held_start >= end:
+            break
+        if held_start > start:
+            gaps.append([start, held_start])
+        start = max(start, held_end)
+    if start < end:
+        gaps.append([start, end])
+    return gaps
+
+
+class CandleStore:
+    """
+    Persistent Parquet store with one file per symbol and interval. The time ranges already downloaded are kept in
+    the file metadata, so only the missing gaps of a request are fetched.
+    """
+    def __init__(self, fetch, root='candles/store'):
+        """
+        Args:
+            fetch (Callable[[str, str, int, int], pandas.DataFrame]): Downloads the candles of a ticker and interval
+                with open_time in [start, end).
+            root (str): Directory of the store.
+        """
+        self.fetch = fetch
+        self.root = root
+
+    def get_path(self, ticker, interval):
+        return os.path.join(self.root, ticker, f'{interval}.parquet')
+
+    def list_datasets(self):
+        """
+        Returns:
+            List[Tuple[str, str]]: (ticker, interval) of every dataset in the store.
+        """
+        if not os.path.isdir(self.root):
+            return []
+        return [(ticker, file[:-len('.parquet')])
+                for ticker in sorted(os.listdir(self.root))
+                for file in sorted(os.listdir(os.path.join(self.root, ticker)))
+                if file.endswith('.parquet')]
+
+    def get_ranges(self, ticker, interval):
+        path = self.get_path(ticker, interval)
+        if not os.path.exists(path):
+            return []
+        metadata = pq.read_schema(path).metadata or {}
+        return json.loads(metadata.get(b'ranges', b'[]'))
+
+    def read(self, ticker, interval, start=None, end=None):
+        """
+        Reads the stored candles with open_time in [start, end) straight from disk.
+
+        Args:
+            ticker (str): Symbol, e.g. 'BTCUSDT'.
+            interval (str): Candle interval, e.g. '1m'.
+            start (int): Start in milliseconds (default is the first stored candle).
+            end (int): End in milliseconds, excluded (default is the last stored candle).
+
+        Returns:
+            pandas.DataFrame: Candles sorted by open_time.
+        """
+        path = self.get_path(ticker, interval)
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=STORE_COLUMNS)
+        filters = []
+        if start is not None:
+            filters.append(('open_time', '>=', int(start)))
+        if end is not None:
+            filters.append(('open_time', '<', int(end)))
+        return pq.read_table(path, filters=filters or None).to_pandas()
+
+    def read_ranges(self, ticker, interval, ranges):
+        """
+        Reads the stored candles with open_time inside any of the given ranges, decoding only the row groups that
+        overlap them, so scattered short ranges cost about one row group each whatever the size of the file.
+
+        Args:
+            ticker (str): Symbol, e.g. 'BTCUSDT'.
+            interval (str): Candle interval, e.g. '1m'.
+            ranges (List[List[int]]): Sorted, non-overlapping [start, end) ranges in milliseconds.
+
+        Returns:
+            pandas.DataFrame: Candles sorted by open_time.
+        """
+        path = self.get_path(ticker, interval)
+        if not os.path.exists(path) or len(ranges) == 0:
+            return pd.DataFrame(columns=STORE_COLUMNS)
+        parquet_file = pq.ParquetFile(path)
+        column = parquet_file.schema_arrow.get_field_index('open_time')
+        starts = [start for start, _ in ranges]
+        row_groups = []
+        for row_group in range(parquet_file.num_row_groups):
+            statistics = parquet_file.metadata.row_group(row_group).column(column).statistics
+            # Last range starting at or before the end of the row group, the only one that can overlap it
+            position = bisect.bisect_right(starts, statistics.max) - 1
+            if position >= 0 and ranges[position][1] > statistics.min:
+                row_groups.append(row_group)
+        candles = parquet_file.read_row_groups(row_groups).to_pandas()
+        open_time = candles['open_time'].to_numpy()
+        position = np.searchsorted(starts, open_time, side='right') - 1
+        ends = np.asarray([end for _, end in ranges])
+        return candles[(position >= 0) & (open_time < ends[np.maximum(position, 0)])].reset_index(drop=True)
+
+    def iter_chunks(self, ticker, interval, chunk_size=100000):
+        """
+        Reads the stored candles in time-ordered chunks, without loading the whole file.
+
+        Args:
+            ticker (str): Symbol, e.g. 'BTCUSDT'.
+            interval (str): Candle interval, e.g. '1m'.
+            chunk_size (int): Candles per chunk (default is 100000).
+
+        Yields:
+            pandas.DataFrame: Candles sorted by open_time.
+        """
+        path = self.get_path(ticker, interval)
+        if not os.path.exists(path):
+            return
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+
+    def write(self, ticker, interval, candles, ranges):
+        path = self.get_path(ticker, interval)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table = pa.Table.from_pandas(candles[STORE_COLUMNS], preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), b'ranges': json.dumps(ranges)})
+        pq.write_table(table, path + '.tmp', row_group_size=ROW_GROUP_SIZE)
+        os.replace(path + '.tmp', path)
+
+    def update(self, ticker, interval, start, end):
+        """
+        Fetches the parts of [start, end) that are not stored yet and merges them into the store. The still open
+        candle is never marked as held, so it is fetched again next time.
+
+        Args:
+            ticker (str): Symbol, e.g. 'BTCUSDT'.
+            interval (str): Candle interval, e.g. '1m'.
+            start (int): Start in milliseconds.
+            end (int): End in milliseconds (excluded).
+        """
+        start = int(start)
+        end = min(int(end), int(time.time() * 1000) - INTERVAL_DURATION[interval])
+        ranges = self.get_ranges(ticker, interval)
+        gaps = get_missing_ranges(ranges, start, end)
+        if not gaps:
+            return
+        new_candles = [self.fetch(ticker, interval, gap_start, gap_end) for gap_start, gap_end in gaps]
+        candles = pd.concat([self.read(ticker, interval)] + new_candles)
+        candles = candles.astype({column: 'int64' if column in TIME_COLUMNS else 'float64' for column in STORE_COLUMNS})
+        candles = candles.drop_duplicates(subset=['open_time'], keep='last').sort_values('open_time')
+        self.write(ticker, interval, candles, merge_ranges(ranges + gaps))
+
+    def get_candles(self, ticker, interval, start, end):
+        """
+        Returns the candles with open_time in [start, end), fetching only the missing gaps.
+
+        Args:
+            ticker (str): Symbol, e.g. 'BTCUSDT'.
+            interval (str): Candle interval, e.g. '1m'.
+            start (int): Start in milliseconds.
+            end (int): End in milliseconds (excluded).
+
+        Returns:
+            pandas.DataFrame: Candles sorted by open_time.
+        """
+        self.update(ticker, interval, start, end)
+        return self.read(ticker, interval, start, end)
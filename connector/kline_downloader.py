@@ -0,0 +1,142 @@
+import asyncio
+import time
+from email.utils import parsedate_to_datetime
+
+import aiohttp
+import numpy as np
+import pandas as pd
+
+KLINE_COLUMNS = ['open_time', 'open', 'high', 'low', 'close', 'volume', 'close_time', 'qav', 'num_trades',
+                 'taker_base_vol', 'taker_quote_vol']
+TIME_COLUMNS = ['open_time', 'close_time']
+RETRY_STATUS = {418, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Token bucket that limits the request weight spent per minute. Tokens refill continuously up to the budget.
+    """
+    def __init__(self, weight_per_minute):
+        self.capacity = weight_per_minute
+        self.tokens = weight_per_minute
+        self.refill_rate = weight_per_minute / 60
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, weight):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_rate)
+                self.updated_at = now
+                if self.tokens >= weight:
+                    self.tokens -= weight
+                    return
+                await asyncio.sleep((weight - self.tokens) / self.refill_rate)
+
+
+def get_retry_delay_(retry_after):
+    # Retry-After is either a number of seconds or an HTTP date, None falls back to the exponential backoff
+    if not retry_after:
+        return None
+    try:
+        return max(float(retry_after), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+async def fetch_page_(session, url, params, bucket, request_weight, max_retries, backoff):
+    for attempt in range(max_retries + 1):
+        await bucket.acquire(request_weight)
+        try:
+            async with session.get(url, params=params) as response:
+                if response.status not in RETRY_STATUS:
+                    response.raise_for_status()
+                    return await response.json()
+                retry_after = response.headers.get('Retry-After')
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            retry_after = None
+            if attempt == max_retries:
+                raise
+        if attempt == max_retries:
+            raise aiohttp.ClientError(f'Klines request failed after {max_retries} retries: {params}')
+        delay = get_retry_delay_(retry_after)
+        await asyncio.sleep(delay if delay is not None else backoff * 2 ** attempt)
+
+
+async def download_klines_async(ticker,
+                                interval,
+                                start,
+                                end,
+                                interval_duration,
+                                base_url,
+                                limit=1000,
+                                max_concurrency=8,
+                                weight_per_minute=1200,
+                                request_weight=2,
+                                max_retries=5,
+                                backoff=0.5,
+                                progress=None):
+    """
+    Downloads the klines with open_time in [start, end) concurrently, one request per window of `limit` candles.
+
+    Args:
+        ticker (str): Symbol, e.g. 'BTCUSDT'.
+        interval (str): Candle interval, e.g. '1m'.
+        start (int): Start in milliseconds.
+        end (int): End in milliseconds (excluded).
+        interval_duration (int): Interval duration in milliseconds.
+        base_url (str): Klines endpoint.
+        limit (int): Candles per request (default is 1000).
+        max_concurrency (int): Maximum number of requests in flight (default is 8).
+        weight_per_minute (int): Request weight budget per minute (default is 1200).
+        request_weight (int): Weight of each klines request (default is 2).
+        max_retries (int): Retries per request on connection errors, 429/418 and 5xx (default is 5).
+        backoff (float): First retry delay in seconds, doubled on each retry, unless the server sends Retry-After.
+        progress (Callable[[int, int], None]): Called with (finished windows, total windows).
+
+    Returns:
+        pandas.DataFrame: Klines sorted by open_time.
+    """
+    window = limit * interval_duration
+    window_starts = list(range(int(start), int(end), window))
+    # Each window has its own slot of `limit` rows, so pages are written in place as they arrive
+    values = np.full((len(window_starts) * limit, len(KLINE_COLUMNS)), np.nan)
+    bucket = TokenBucket(weight_per_minute)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    finished = 0
+
+    async def fetch_window(position, window_start):
+        nonlocal finished
+        params = {'symbol': ticker,
+                  'interval': interval,
+                  'limit': limit,
+                  'startTime': window_start,
+                  'endTime': min(window_start + window, int(end)) - 1}
+        async with semaphore:
+            page = await fetch_page_(session, base_url, params, bucket, request_weight, max_retries, backoff)
+        if page:
+            rows = np.asarray([row[:len(KLINE_COLUMNS)] for row in page[:limit]], dtype=float)
+            values[position * limit:position * limit + len(rows)] = rows
+        finished += 1
+        if progress is not None:
+            progress(finished, len(window_starts))
+
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30)) as session:
+        await asyncio.gather(*[fetch_window(position, window_start)
+                               for position, window_start in enumerate(window_starts)])
+
+    candles = pd.DataFrame(values[~np.isnan(values[:, 0])], columns=KLINE_COLUMNS)
+    candles = candles.astype({column: 'int64' for column in TIME_COLUMNS})
+    return candles.drop_duplicates(subset=['open_time']).sort_values('open_time', ignore_index=True)
+
+
+def download_klines(*args, **kwargs):
+    """
+    Runs download_klines_async on a new event loop. See download_klines_async for the arguments.
+    """
+    return asyncio.run(download_klines_async(*args, **kwargs))
@@ -0,0 +1,162 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from connector.candle_store import INTERVAL_DURATION, STORE_COLUMNS, get_missing_ranges
+
+BASE_INTERVAL = '1m'
+# Binance weeks start on Monday, the epoch was a Thursday
+WEEK_OFFSET = 4 * INTERVAL_DURATION['1d']
+SUM_COLUMNS = ['volume', 'qav', 'num_trades', 'taker_base_vol', 'taker_quote_vol']
+
+
+def get_bucket_bounds(open_time, interval):
+    """
+    Finds the candle of `interval` that contains each open time, aligned like the Binance klines: weeks start on
+    Monday, months on the first day of the month and every other interval on a multiple of its duration.
+
+    Args:
+        open_time (numpy.ndarray): Open times in milliseconds.
+        interval (str): Target interval, e.g. '1h'.
+
+    Returns:
+        Tuple[numpy.ndarray, numpy.ndarray]: Open time and end (excluded) of the bucket of each open time.
+    """
+    open_time = np.asarray(open_time, dtype=np.int64)
+    if interval == '1M':
+        month = open_time.astype('datetime64[ms]').astype('datetime64[M]')
+        return (month.astype('datetime64[ms]').astype(np.int64),
+                (month + 1).astype('datetime64[ms]').astype(np.int64))
+    duration = INTERVAL_DURATION[interval]
+    offset = WEEK_OFFSET if interval == '1w' else 0
+    start = (open_time - offset) // duration * duration + offset
+    return start, start + duration
+
+
+def resample_candles(candles: pd.DataFrame, interval, ranges=None):
+    """
+    Aggregates sorted candles into a coarser interval: first open, highest high, lowest low, last close and summed
+    volumes and trade counts.
+
+    Args:
+        candles (pandas.DataFrame): Candles sorted by open_time, with the columns of the candle store.
+        interval (str): Target interval, e.g. '1h'.
+        ranges (List[List[int]]): Time ranges held by the candles (see CandleStore.get_ranges). When given, only
+            buckets fully inside a range are kept, so a still open or partially downloaded candle is left out.
+
+    Returns:
+        pandas.DataFrame: Aggregated candles with the columns of the candle store.
+    """
+    if len(candles) == 0:
+        return pd.DataFrame(columns=STORE_COLUMNS)
+    bucket_start, bucket_end = get_bucket_bounds(candles['open_time'].to_numpy(), interval)
+    starts = np.flatnonzero(np.diff(bucket_start, prepend=bucket_start[0] - 1))
+    ends = np.append(starts[1:], len(candles)) - 1
+    resampled = {'open_time': bucket_start[starts],
+                 'open': candles['open'].to_numpy(dtype=float)[starts],
+                 'high': np.fmax.reduceat(candles['high'].to_numpy(dtype=float), starts),
+                 'low': np.fmin.reduceat(candles['low'].to_numpy(dtype=float), starts),
+                 'close': candles['close'].to_numpy(dtype=float)[ends],
+                 'close_time': bucket_end[starts] - 1}
+    for column in SUM_COLUMNS:
+        if column in candles:
+            resampled[column] = np.add.reduceat(candles[column].to_numpy(dtype=float), starts)
+    resampled = pd.DataFrame(resampled)[[column for column in STORE_COLUMNS if column in resampled]]
+    if ranges is None:
+        return resampled
+
+    held = np.asarray(ranges, dtype=np.int64).reshape(-1, 2)
+    # Ranges are sorted and disjoint, so a bucket can only lie inside the last range starting at or before it
+    position = held[:, 0].searchsorted(bucket_start[starts], side='right') - 1
+    complete = (position >= 0) & (held[np.maximum(position, 0), 1] >= bucket_end[starts])
+    return resampled[complete].reset_index(drop=True)
+
+
+class CandleResampler:
+    """
+    Builds any interval from the 1m candles of a candle store. Aggregated series are cached next to the store with
+    the base ranges they were built from: when the base only grew after the cached candles, just the new candles
+    are aggregated and appended, and any other change rebuilds the series.
+    """
+    def __init__(self, store, base_interval=BASE_INTERVAL):
+        """
+        Args:
+            store (connector.candle_store.CandleStore): Store holding the base candles.
+            base_interval (str): Interval of the stored candles to aggregate (default is '1m').
+        """
+        self.store = store
+        self.base_interval = base_interval
+
+    def get_path(self, ticker, interval):
+        return os.path.join(self.store.root, ticker, 'resampled', f'{interval}.parquet')
+
+    def read_cache_(self, ticker, interval):
+        path = self.get_path(ticker, interval)
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=STORE_COLUMNS), None
+        table = pq.read_table(path)
+        return table.to_pandas(), json.loads(table.schema.metadata[b'base_ranges'])
+
+    def write_cache_(self, ticker, interval, candles, base_ranges):
+        path = self.get_path(ticker, interval)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table = pa.Table.from_pandas(candles, preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                               b'base_ranges': json.dumps(base_ranges)})
+        pq.write_table(table, path + '.tmp')
+        os.replace(path + '.tmp', path)
+
+    def update(self, ticker, interval):
+        """
+        Brings the cached series of an interval up to date with the base candles.
+
+        Returns:
+            pandas.DataFrame: Every aggregated candle of the interval.
+        """
+        base_ranges = self.store.get_ranges(ticker, self.base_interval)
+        cached, cached_ranges = self.read_cache_(ticker, interval)
+        if cached_ranges == base_ranges:
+            return cached
+
+        resume_at = None
+        if cached_ranges is not None and len(cached) > 0:
+            resume_at = int(get_bucket_bounds(cached['open_time'].to_numpy()[-1:], interval)[1][0])
+            added = [gap for start, end in base_ranges for gap in get_missing_ranges(cached_ranges, start, end)]
+            # New base candles before the end of the cached series change candles already aggregated
+            if any(start < resume_at for start, _ in added):
+                resume_at = None
+        if resume_at is None:
+            candles = resample_candles(self.store.read(ticker, self.base_interval), interval, base_ranges)
+        else:
+            new_candles = resample_candles(self.store.read(ticker, self.base_interval, start=resume_at), interval,
+                                           base_ranges)
+            candles = pd.concat([cached, new_candles], ignore_index=True) if len(new_candles) > 0 else cached
+        self.write_cache_(ticker, interval, candles, base_ranges)
+        return candles
+
+    def read(self, ticker, interval, start=None, end=None):
+        """
+        Reads the candles of an interval with open_time in [start, end), aggregated from the base candles.
+
+        Args:
+            ticker (str): Symbol, e.g. 'BTCUSDT'.
+            interval (str): Candle interval, e.g. '4h'.
+            start (int): Start in milliseconds (default is the first candle).
+            end (int): End in milliseconds, excluded (default is the last candle).
+
+        Returns:
+            pandas.DataFrame: Candles sorted by open_time.
+        """
+        if interval == self.base_interval:
+            return self.store.read(ticker, interval, start, end)
+        candles = self.update(ticker, interval)
+        keep = np.ones(len(candles), dtype=bool)
+        if start is not None:
+            keep &= candles['open_time'].to_numpy() >= int(start)
+        if end is not None:
+            keep &= candles['open_time'].to_numpy() < int(end)
+        return candles[keep].reset_index(drop=True)
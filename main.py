@@ -1,14 +1,52 @@
 import streamlit as st
+import asyncio
 import datetime
+import hashlib
 import importlib
+import inspect
 import os
-from connector.binance_candles import get_binance_candles, get_all_binance_perpetuals
+from connector.binance_candles import get_binance_candles, get_all_binance_perpetuals, get_binance_candle_store, \
+    get_stored_candles, get_resampled_candles, download_binance_candles
+from connector.resampling import BASE_INTERVAL
+from connector.binance_stream import iter_closed_klines
+from connector.candle_loader import load_candles
+from connector.candle_store import INTERVAL_DURATION
 from charts.backtesting_charts import BacktestingCharts
+from charts.sweep_charts import plot_successive_halving, plot_sweep_heatmap, plot_walk_forward_pnl
+from optimization.parameter_sweep import run_parameter_sweep, SWEEP_PARAMS
+from optimization.successive_halving import run_successive_halving
+from optimization.walk_forward import run_walk_forward
+from optimization.results_store import ResultsStore, get_run_id
+from optimization.batch_backtest import iter_batch_backtest, get_leaderboard
+from preprocessing.stage_cache import StageCache, get_fingerprint
+from preprocessing.profiling import profiler
+from preprocessing.live_labeling import LiveLabeling
+from preprocessing.intrabar import IntrabarResolver
+import numpy as np
 import pandas as pd
 
 st.set_page_config(layout='wide')
 st.title('Backtesting lab')
 
+
+@st.cache_resource
+def get_stage_cache():
+    # One cache for every session of the server, so users loading the same candles or running the same backtest
+    # share the work and the memory
+    return StageCache(max_bytes=2 * 2 ** 30)
+
+
+@st.cache_resource
+def get_intrabar_resolver(candles_source):
+    # Kept across reruns, so the 1m candles already read stay cached
+    if candles_source is None:
+        return IntrabarResolver()
+    return IntrabarResolver(get_binance_candle_store(), *candles_source)
+
+
+stage_cache = get_stage_cache()
+results_store = ResultsStore()
+
 # -------------------------------------------------------------------------------------------------------------------
 # -------------------------------------------- PARAMS CONFIGURATION -------------------------------------------------
 # -------------------------------------------------------------------------------------------------------------------
@@ -17,6 +55,7 @@ col1, col2, col3, col4 = st.columns(4)
 with col1:
     portfolio_initial_value = st.number_input('Portfolio initial value', min_value=10.0, value=150.0)
     tl = st.number_input('TL', min_value=1, value=500)
+    max_positions = st.number_input('Max open positions', min_value=1, value=1)
 with col2:
     initial_amount_usd = st.number_input('Initial amount USD', min_value=5.0, value=15.0)
     std_span = st.number_input('Std span', min_value=1, value=100)
@@ -28,32 +67,138 @@ with col4:
     trade_cost = st.number_input('Trade cost (%)', min_value=0.01, value=0.06, step=0.01)
     trade_cost = trade_cost / 100
     sl = st.number_input('SL std %', min_value=0.0, value=0.75)
+    resize_orders = st.checkbox('Resize orders to free margin', value=False)
+    intrabar_exits = st.checkbox('Intrabar exits', value=False,
+                                 help='Barriers are touched by high and low prices. Candles crossing both barriers '
+                                      'are settled with the 1m candles of the store, or as stop losses without them.')
 
 # -------------------------------------------------------------------------------------------------------------------
 # -------------------------------------------- SIDEBAR CONFIGURATION ------------------------------------------------
 # -------------------------------------------------------------------------------------------------------------------
 
+st.sidebar.subheader('Profiling')
+profile_stages = st.sidebar.checkbox('Profile stages', value=False)
+trace_memory = st.sidebar.checkbox('Trace peak memory (slower)', value=False, disabled=not profile_stages)
+if profile_stages:
+    profiler.start(trace_memory=trace_memory)
+else:
+    # A run cut short by an error, st.stop() or a rerun does not reach the stop at the end. Its profile is stopped
+    # here by the next run, or released with its thread's state when the session's thread ends
+    profiler.stop()
+
+st.sidebar.subheader('Shared cache')
+# Filled at the end of the run, so the counters include this run
+cache_stats_placeholder = st.sidebar.empty()
+
 st.sidebar.subheader('Strategy')
 strategy = [f for f in os.listdir('strategies/') if f.endswith(".py")]
 selected_strategy = st.sidebar.selectbox("Select a strategy", strategy)
 module_name = selected_strategy[:-3]
 module = importlib.import_module(f"strategies.{module_name}")
 
+st.sidebar.subheader('Parameter sweep')
+run_sweep = st.sidebar.checkbox('Run parameter sweep', value=False)
+if run_sweep:
+    sweep_values = {}
+    for param, default in [('std_span', f'{std_span}'), ('tp', '1.0, 1.5, 2.0'), ('sl', '0.5, 0.75, 1.0'),
+                           ('tl', f'{tl}'), ('leverage', f'{leverage}'), ('trade_cost', f'{trade_cost}')]:
+        values = st.sidebar.text_input(f'{param} values', value=default)
+        cast = int if param in ['std_span', 'tl'] else float
+        sweep_values[param] = [cast(value) for value in values.split(',') if value.strip()]
+    sweep_x = st.sidebar.selectbox('Heatmap X axis', SWEEP_PARAMS, index=1)
+    sweep_y = st.sidebar.selectbox('Heatmap Y axis', SWEEP_PARAMS, index=2)
+    sweep_metric = st.sidebar.selectbox('Heatmap metric', ['global_pnl', 'accuracy', 'execution_accuracy', 'max_margin'])
+
+st.sidebar.subheader('Walk-forward')
+run_walk_forward_opt = st.sidebar.checkbox('Run walk-forward optimization', value=False)
+if run_walk_forward_opt:
+    # Labeling parameters are optimized over the sweep values when the sweep is on
+    walk_forward_train_size = st.sidebar.number_input('Train candles', min_value=100, value=20000, step=1000)
+    walk_forward_test_size = st.sidebar.number_input('Test candles', min_value=100, value=5000, step=1000)
+    walk_forward_anchored = st.sidebar.checkbox('Anchored train windows', value=False)
+    walk_forward_metric = st.sidebar.selectbox('Optimized metric', ['global_pnl', 'accuracy', 'execution_accuracy'])
+
+st.sidebar.subheader('Successive halving')
+run_halving = st.sidebar.checkbox('Run successive halving search', value=False)
+if run_halving:
+    # Searches the sweep values when the sweep is on, and the strategy_batch variants when the strategy has them
+    halving_eta = st.sidebar.number_input('Kept fraction 1 / eta', min_value=2, value=3, step=1)
+    halving_min_candles = st.sidebar.number_input('First rung candles (0 for automatic)', min_value=0, value=0,
+                                                  step=1000)
+    halving_metric = st.sidebar.selectbox('Searched metric', ['global_pnl', 'accuracy', 'execution_accuracy'])
+
+st.sidebar.subheader('Batch backtest')
+run_batch = st.sidebar.checkbox('Run on many symbols', value=False)
+if run_batch:
+    stored_datasets = get_binance_candle_store().list_datasets()
+    batch_intervals = sorted({interval for _, interval in stored_datasets})
+    batch_interval = st.sidebar.selectbox('Batch interval', batch_intervals)
+    batch_symbols = [ticker for ticker, interval in stored_datasets if interval == batch_interval]
+    batch_tickers = st.sidebar.multiselect('Batch symbols', batch_symbols, default=batch_symbols)
+    batch_button = st.sidebar.button('Run batch')
+
+st.sidebar.subheader('Paper trading')
+run_paper = st.sidebar.checkbox('Run live paper trading', value=False, disabled=not hasattr(module, 'LiveStrategy'))
+if run_paper:
+    paper_ticker = st.sidebar.text_input('Live ticker', value='BTCUSDT')
+    paper_interval = st.sidebar.selectbox('Live interval', list(INTERVAL_DURATION), index=0)
+    paper_button = st.sidebar.button('Start paper trading')
+
+st.sidebar.subheader('Results store')
+save_runs = st.sidebar.checkbox('Save and reopen runs', value=False)
+show_saved_runs = st.sidebar.checkbox('Show saved runs', value=False)
+if show_saved_runs:
+    saved_runs_sort = st.sidebar.selectbox('Sort saved runs by', ['global_pnl', 'accuracy', 'execution_accuracy',
+                                                                  'portfolio_final_equity', 'created_at'])
+    saved_runs_same_candles = st.sidebar.checkbox('Only runs on the loaded candles', value=True)
+
 st.sidebar.subheader('Candles')
 candles = pd.DataFrame()
+# Ticker and interval of candles coming from the candle store, needed to drill down into their 1m candles
+candles_source = None
 run_local = st.sidebar.checkbox('Run locally', value=True)
 if run_local:
     candles_files = [f for f in os.listdir('candles/') if f.endswith(".csv")]
-    selected_candles = st.sidebar.selectbox("Select a candles file", candles_files)
+    stored_candles = {f'{ticker} {interval} (store)': (ticker, interval)
+                      for ticker, interval in get_binance_candle_store().list_datasets()}
+    selected_candles = st.sidebar.selectbox("Select a candles file", candles_files + list(stored_candles))
+    selected_timeframe = None
+    if stored_candles.get(selected_candles, (None, None))[1] == BASE_INTERVAL:
+        # Coarser intervals are aggregated from the stored 1m candles, offline
+        selected_timeframe = st.sidebar.selectbox('Timeframe', list(INTERVAL_DURATION))
     start_button = st.sidebar.button('Get candles')
     if start_button:
-        candles = pd.read_csv('candles/' + selected_candles)
+        # Candles are shared by every session through the stage cache, keyed by what their content depends on
+        store = get_binance_candle_store()
+        if selected_timeframe is not None:
+            ticker = stored_candles[selected_candles][0]
+            candles_key = (ticker, selected_timeframe, str(store.get_ranges(ticker, BASE_INTERVAL)))
+            with profiler.stage('load_candles'):
+                candles = stage_cache.run('resampled_candles', candles_key,
+                                          lambda: get_resampled_candles(ticker, selected_timeframe, store))
+            candles_source = (ticker, selected_timeframe)
+        elif selected_candles in stored_candles:
+            ticker, interval = stored_candles[selected_candles]
+            candles_key = (ticker, interval, str(store.get_ranges(ticker, interval)),
+                           str(store.get_ranges(ticker, BASE_INTERVAL)))
+            with profiler.stage('load_candles'):
+                candles = stage_cache.run('stored_candles', candles_key,
+                                          lambda: get_stored_candles(ticker, interval, store))
+            candles_source = stored_candles[selected_candles]
+        else:
+            candles_path = 'candles/' + selected_candles
+            candles_stat = os.stat(candles_path)
+            candles_key = (os.path.abspath(candles_path), candles_stat.st_mtime_ns, candles_stat.st_size)
+            with profiler.stage('load_candles'):
+                candles = stage_cache.run('csv_candles', candles_key, lambda: load_candles(candles_path))
 else:
     st.sidebar.subheader('Get candles')
     # ticker = st.sidebar.selectbox('Ticker', ['DODO-BUSD', 'APE-BUSD'])
     ticker = st.sidebar.selectbox('Ticker', get_all_binance_perpetuals())
     intervals = ['1m', '3m', '5m', '15m', '30m', '1h', '2h', '4h', '6h', '12h', '1d', '1w', '1M']
     interval = st.sidebar.selectbox('Interval', intervals, index=1)
+    from_base = st.sidebar.checkbox('Aggregate from 1m candles', value=True, disabled=interval == BASE_INTERVAL,
+                                    help='Downloads 1m candles once and builds every interval from them.')
 
     start_date_input = st.sidebar.date_input('Start date', value=datetime.date(2023, 2, 14))
     start_time_input = st.sidebar.time_input('Start time', value=datetime.time(12, 33))
@@ -67,21 +212,137 @@ else:
 
     start_button = st.sidebar.button('Get candles')
     if start_button:
-        candles = get_binance_candles(startdate=start_timestamp,
-                                      enddate=end_timestamp,
-                                      ticker=ticker,
-                                      interval=interval)
+        progress_bar = st.sidebar.progress(0.0)
+        # Sessions asking for the same klines wait for a single download
+        candles_key = (ticker, interval, start_timestamp, end_timestamp, from_base)
+        with profiler.stage('load_candles'):
+            candles = stage_cache.run('binance_candles', candles_key,
+                                      lambda: get_binance_candles(startdate=start_timestamp,
+                                                                  enddate=end_timestamp,
+                                                                  ticker=ticker,
+                                                                  interval=interval,
+                                                                  progress=lambda done, total:
+                                                                  progress_bar.progress(done / total),
+                                                                  from_base=from_base))
+        candles_source = (ticker.replace('-', ''), interval)
 
+# Keep the last loaded candles, so that changing a parameter reruns the backtest without loading them again
 if len(candles) > 0:
-    bt = BacktestingCharts(module.strategy(candles),
-                           std_span=std_span,
-                           tp_std_pct=tp,
-                           sl_std_pct=sl,
-                           tl=tl,
-                           portfolio_initial_value=portfolio_initial_value,
-                           initial_amount_usd=initial_amount_usd,
-                           leverage=leverage,
-                           trade_cost=trade_cost)
+    st.session_state['candles'] = candles
+    st.session_state['candles_source'] = candles_source
+candles = st.session_state.get('candles', candles)
+candles_source = st.session_state.get('candles_source', candles_source)
+
+if len(candles) > 0:
+    candles_fingerprint = get_fingerprint(candles)
+    strategy_hash = hashlib.sha1(inspect.getsource(module).encode()).hexdigest()
+    strategy_key = (candles_fingerprint, module_name, strategy_hash)
+
+    def get_strategy_candles():
+        # Only computed when needed: a stored run does not need the strategy to be applied again
+        with profiler.stage('strategy', rows=len(candles)):
+            return stage_cache.run('strategy', strategy_key, lambda: module.strategy(candles))
+
+    if run_sweep:
+        strategy_candles = get_strategy_candles()
+        sweep_key = strategy_key + (tuple(map(tuple, sweep_values.values())), initial_amount_usd)
+        sweep_results = stage_cache.run('sweep', sweep_key,
+                                        lambda: run_parameter_sweep(strategy_candles,
+                                                                    initial_amount_usd=initial_amount_usd,
+                                                                    **sweep_values))
+    if run_walk_forward_opt:
+        walk_forward_grid = sweep_values if run_sweep else {'std_span': std_span, 'tp': tp, 'sl': sl, 'tl': tl,
+                                                            'leverage': leverage, 'trade_cost': trade_cost}
+        walk_forward_key = strategy_key + (tuple(map(str, walk_forward_grid.values())), initial_amount_usd,
+                                           walk_forward_train_size, walk_forward_test_size, walk_forward_anchored,
+                                           walk_forward_metric)
+
+        def compute_walk_forward():
+            strategy_candles = get_strategy_candles()
+            # Strategies with a batched interface are optimized over their parameter grid too
+            if hasattr(module, 'strategy_batch'):
+                variants = module.get_batch_params()
+                signals = module.strategy_batch(strategy_candles, variants)
+            else:
+                variants = None
+                signals = strategy_candles['strat_signal'].to_numpy()
+            return run_walk_forward(strategy_candles,
+                                    signals,
+                                    initial_amount_usd=initial_amount_usd,
+                                    train_size=walk_forward_train_size,
+                                    test_size=walk_forward_test_size,
+                                    anchored=walk_forward_anchored,
+                                    metric=walk_forward_metric,
+                                    variants=variants,
+                                    **walk_forward_grid)
+
+        walk_forward_stats, walk_forward_pnl = stage_cache.run('walk_forward', walk_forward_key, compute_walk_forward)
+    if run_halving:
+        halving_grid = sweep_values if run_sweep else {'std_span': std_span, 'tp': tp, 'sl': sl, 'tl': tl,
+                                                       'leverage': leverage, 'trade_cost': trade_cost}
+        halving_key = strategy_key + (tuple(map(str, halving_grid.values())), initial_amount_usd, halving_eta,
+                                      halving_min_candles, halving_metric)
+
+        def compute_halving():
+            strategy_candles = get_strategy_candles()
+            if hasattr(module, 'strategy_batch'):
+                variants = module.get_batch_params()
+                signals = module.strategy_batch(strategy_candles, variants)
+            else:
+                variants = None
+                signals = strategy_candles['strat_signal'].to_numpy()
+            return run_successive_halving(strategy_candles,
+                                          signals,
+                                          initial_amount_usd=initial_amount_usd,
+                                          metric=halving_metric,
+                                          eta=int(halving_eta),
+                                          min_candles=int(halving_min_candles) or None,
+                                          variants=variants,
+                                          **halving_grid)
+
+        halving_history, halving_summary = stage_cache.run('successive_halving', halving_key, compute_halving)
+
+    run_params = {'std_span': int(std_span),
+                  'tp': float(tp),
+                  'sl': float(sl),
+                  'tl': int(tl),
+                  'initial_amount_usd': float(initial_amount_usd),
+                  'leverage': float(leverage),
+                  'trade_cost': float(trade_cost),
+                  'portfolio_initial_value': float(portfolio_initial_value),
+                  'max_positions': int(max_positions),
+                  'resize_orders': bool(resize_orders),
+                  'intrabar_exits': bool(intrabar_exits)}
+    run_id = get_run_id(candles_fingerprint, module_name, strategy_hash, run_params)
+    bt_args = {'std_span': std_span,
+               'tp_std_pct': tp,
+               'sl_std_pct': sl,
+               'tl': tl,
+               'portfolio_initial_value': portfolio_initial_value,
+               'initial_amount_usd': initial_amount_usd,
+               'leverage': leverage,
+               'trade_cost': trade_cost,
+               'max_positions': max_positions,
+               'resize_orders': resize_orders,
+               'intrabar': get_intrabar_resolver(candles_source) if intrabar_exits else None}
+    if save_runs and results_store.has_run(run_id):
+        with profiler.stage('load_run'):
+            run_tables = results_store.read_run(run_id, tables=['candles', 'trades'])
+            bt = BacktestingCharts(run_tables['candles'], trades=run_tables['trades'], **bt_args)
+        st.info(f'Opened stored run {run_id[:12]}')
+    else:
+        bt = BacktestingCharts(get_strategy_candles(), cache=stage_cache, **bt_args)
+        if save_runs:
+            with profiler.stage('save_run'):
+                results_store.write_run(run_id,
+                                        key={'candles_fingerprint': candles_fingerprint,
+                                             'strategy': module_name,
+                                             'strategy_hash': strategy_hash},
+                                        params=run_params,
+                                        metrics=bt.get_metrics(),
+                                        candles=bt.candles,
+                                        trades=bt.get_trade_table(),
+                                        equity=bt.equity)
 
     st.markdown('<hr>', unsafe_allow_html=True)
 
@@ -107,6 +368,36 @@ if len(candles) > 0:
 
     st.plotly_chart(bt.plot_pnl(), use_container_width=True)
 
+    col1, col2, col3 = st.columns([1, 1, 4])
+    with col1:
+        monte_carlo_paths = st.number_input('Bootstrap paths', min_value=100, value=10000, step=1000)
+    with col2:
+        monte_carlo_block_size = st.number_input('Block size (trades)', min_value=1, value=1)
+    monte_carlo = bt.run_monte_carlo(n_paths=monte_carlo_paths, block_size=monte_carlo_block_size)
+    with col3:
+        st.metric('5th percentile final PnL', f"$ {np.percentile(monte_carlo['final_pnl'], 5):.4f}")
+    st.plotly_chart(bt.plot_pnl_distribution(monte_carlo), use_container_width=True)
+
+    st.markdown('<hr>', unsafe_allow_html=True)
+
+    # -------------------------------------------------------------------------------------------------------------------
+    # ------------------------------------------------- PORTFOLIO -------------------------------------------------------
+    # -------------------------------------------------------------------------------------------------------------------
+    st.subheader('Portfolio')
+    portfolio_summary = bt.get_portfolio_summary()
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric('Final equity', f"$ {portfolio_summary['final_equity']:.4f}")
+    with col2:
+        st.metric('Max margin used', f"$ {portfolio_summary['max_margin_used']:.4f}")
+    with col3:
+        st.metric('Orders filled', portfolio_summary['filled'] + portfolio_summary['resized'])
+        st.metric('Orders resized', portfolio_summary['resized'])
+    with col4:
+        st.metric('Rejected: no free executor', portfolio_summary['rejected_positions'])
+        st.metric('Rejected: no free margin', portfolio_summary['rejected_margin'])
+    st.plotly_chart(bt.plot_portfolio(), use_container_width=True)
+
     st.markdown('<hr>', unsafe_allow_html=True)
 
     # -------------------------------------------------------------------------------------------------------------------
@@ -146,6 +437,166 @@ if len(candles) > 0:
     # -------------------------------------------- CANDLESTICK ANALYSIS -------------------------------------------------
     # -------------------------------------------------------------------------------------------------------------------
     st.subheader('Candlestick Analysis')
-    st.plotly_chart(bt.get_candlestick_chart(), use_container_width=True)
+    max_chart_points = st.number_input('Max points per trace', min_value=100, value=5000, step=500)
+    st.plotly_chart(bt.get_candlestick_chart(max_points=max_chart_points), use_container_width=True)
 
     st.markdown('<hr>', unsafe_allow_html=True)
+
+    # -------------------------------------------------------------------------------------------------------------------
+    # ---------------------------------------------- PARAMETER SWEEP ----------------------------------------------------
+    # -------------------------------------------------------------------------------------------------------------------
+    if run_sweep:
+        st.subheader('Parameter sweep')
+        st.plotly_chart(plot_sweep_heatmap(sweep_results, x=sweep_x, y=sweep_y, metric=sweep_metric),
+                        use_container_width=True)
+        st.dataframe(sweep_results.sort_values('global_pnl', ascending=False))
+
+        st.markdown('<hr>', unsafe_allow_html=True)
+
+    # -------------------------------------------------------------------------------------------------------------------
+    # ------------------------------------------------ WALK-FORWARD -----------------------------------------------------
+    # -------------------------------------------------------------------------------------------------------------------
+    if run_walk_forward_opt:
+        st.subheader('Walk-forward')
+        if len(walk_forward_stats) == 0:
+            st.warning('Not enough candles for a train and a test window.')
+        else:
+            st.plotly_chart(plot_walk_forward_pnl(walk_forward_pnl, walk_forward_stats), use_container_width=True)
+            st.dataframe(walk_forward_stats, use_container_width=True)
+
+        st.markdown('<hr>', unsafe_allow_html=True)
+
+    # -------------------------------------------------------------------------------------------------------------------
+    # --------------------------------------------- SUCCESSIVE HALVING --------------------------------------------------
+    # -------------------------------------------------------------------------------------------------------------------
+    if run_halving:
+        st.subheader('Successive halving')
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric('Candidates', halving_summary['candidates'])
+        with col2:
+            st.metric('Rungs', halving_summary['rungs'])
+        with col3:
+            st.metric(f'Best {halving_metric}', f"{halving_summary['metrics'][halving_metric]:.4f}")
+        with col4:
+            st.metric('Compute saved vs full grid', f"{halving_summary['compute_saved']:.1%}")
+        st.write('Chosen parameters')
+        st.json(halving_summary['params'])
+        st.plotly_chart(plot_successive_halving(halving_history, metric=halving_metric), use_container_width=True)
+        st.dataframe(halving_history, use_container_width=True)
+
+        st.markdown('<hr>', unsafe_allow_html=True)
+
+# -------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------ SAVED RUNS -------------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------
+if show_saved_runs:
+    st.subheader('Saved runs')
+    saved_runs_filters = None
+    if saved_runs_same_candles and len(candles) > 0:
+        saved_runs_filters = [('candles_fingerprint', '=', candles_fingerprint)]
+    saved_runs = results_store.read_index(filters=saved_runs_filters, sort_by=saved_runs_sort)
+    if len(saved_runs) == 0:
+        st.info('No saved runs yet.')
+    else:
+        st.dataframe(saved_runs.drop(columns=['candles_fingerprint', 'strategy_hash', 'candles_id'], errors='ignore'),
+                     use_container_width=True)
+
+    st.markdown('<hr>', unsafe_allow_html=True)
+
+# -------------------------------------------------------------------------------------------------------------------
+# ---------------------------------------------- BATCH BACKTEST -----------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------
+if run_batch and batch_button:
+    st.subheader('Batch backtest')
+    batch_progress = st.progress(0.0)
+    leaderboard_placeholder = st.empty()
+    batch_results = []
+    for result in iter_batch_backtest(batch_tickers,
+                                      interval=batch_interval,
+                                      strategy_module=f"strategies.{module_name}",
+                                      std_span=std_span,
+                                      tp=tp,
+                                      sl=sl,
+                                      tl=tl,
+                                      initial_amount_usd=initial_amount_usd,
+                                      leverage=leverage,
+                                      trade_cost=trade_cost):
+        batch_results.append(result)
+        batch_progress.progress(len(batch_results) / len(batch_tickers))
+        leaderboard_placeholder.dataframe(get_leaderboard(batch_results), use_container_width=True)
+
+    st.markdown('<hr>', unsafe_allow_html=True)
+
+# -------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------ SHARED CACHE -----------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------
+cache_stats = stage_cache.get_stats()
+cache_stats_placeholder.markdown(f"{cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+                                 f"{cache_stats['waits']} shared, {cache_stats['evictions']} evictions  \n"
+                                 f"{cache_stats['entries']} entries, {cache_stats['nbytes'] / 2 ** 20:.0f} of "
+                                 f"{cache_stats['max_bytes'] / 2 ** 20:.0f} MB")
+
+# -------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------ PAPER TRADING ----------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------
+if run_paper and paper_button:
+    st.subheader('Paper trading')
+    live_strategy = module.LiveStrategy()
+    live_labeling = LiveLabeling(std_span=std_span,
+                                 tp=tp,
+                                 sl=sl,
+                                 tl=tl,
+                                 initial_amount_usd=initial_amount_usd,
+                                 leverage=leverage,
+                                 trade_cost=trade_cost)
+
+    # Warm the indicators, the rolling std and any open position up on the last closed candles
+    now = int(datetime.datetime.now().timestamp() * 1000)
+    warm_up = download_binance_candles(paper_ticker.replace('-', ''), paper_interval,
+                                       start=now - 1000 * INTERVAL_DURATION[paper_interval], end=now)
+    warm_up = warm_up[warm_up['close_time'] < now]
+    for candle in warm_up[['open_time', 'close']].to_dict('records'):
+        live_labeling.update(candle['open_time'], candle['close'], live_strategy.update(candle))
+    last_open_time = int(warm_up['open_time'].iloc[-1]) if len(warm_up) > 0 else None
+
+    col1, col2, col3, col4 = st.columns(4)
+    last_close_placeholder = col1.empty()
+    signal_placeholder = col2.empty()
+    position_placeholder = col3.empty()
+    pnl_placeholder = col4.empty()
+    trades_placeholder = st.empty()
+    live_trades = []
+
+    async def run_paper_trading():
+        async for candle in iter_closed_klines(paper_ticker, paper_interval, after=last_open_time):
+            signal = live_strategy.update(candle)
+            live_trades.extend(event for event in live_labeling.update(candle['open_time'], candle['close'], signal)
+                               if event['event'] == 'exit')
+            position = live_labeling.position
+            last_close_placeholder.metric(f"Close {candle['datetime']}", f"{candle['close']}")
+            signal_placeholder.metric('Signal', signal)
+            position_placeholder.metric('Position', 'none' if position is None or not position.active else
+                                        f"{'long' if position.side > 0 else 'short'} @ {position.entry_price}")
+            pnl_placeholder.metric('Realized PnL', f'$ {live_labeling.cum_pnl:.4f}')
+            if live_trades:
+                trades_placeholder.dataframe(pd.DataFrame(live_trades).iloc[::-1], use_container_width=True)
+
+    # Runs until the page is rerun or closed
+    asyncio.run(run_paper_trading())
+
+# -------------------------------------------------------------------------------------------------------------------
+# ------------------------------------------------ STAGE TIMINGS ----------------------------------------------------
+# -------------------------------------------------------------------------------------------------------------------
+if profile_stages:
+    profiler.stop()
+    with st.expander('Stage timings', expanded=False):
+        timings = pd.DataFrame(profiler.get_records())
+        if len(timings) > 0:
+            timings['stage'] = timings['depth'].apply(lambda depth: '    ' * depth) + timings['name']
+            st.dataframe(timings[['stage', 'wall_time', 'cpu_time', 'peak_memory', 'rows']], use_container_width=True)
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button('Download JSON', profiler.to_json(), file_name='stage_timings.json')
+        with col2:
+            st.download_button('Download Chrome trace', profiler.to_chrome_trace(), file_name='stage_trace.json')
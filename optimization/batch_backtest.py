@@ -0,0 +1,87 @@
+import importlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from connector.candle_store import CandleStore
+from optimization.parameter_sweep import summarize_labeling
+from preprocessing.labeling import Labeling
+
+
+def run_symbol_backtest_(ticker, interval, store_root, strategy_module, params):
+    result = {'ticker': ticker, 'candles': 0, 'error': None}
+    try:
+        # Offline store: candles are only read from disk, never fetched
+        candles = CandleStore(fetch=None, root=store_root).read(ticker, interval)
+        result['candles'] = len(candles)
+        module = importlib.import_module(strategy_module)
+        trades = Labeling().label_trades(module.strategy(candles), **params)
+        result.update(summarize_labeling(trades))
+    except Exception as error:
+        result['error'] = f'{type(error).__name__}: {error}'
+    return result
+
+
+def iter_batch_backtest(tickers,
+                        interval,
+                        strategy_module,
+                        std_span,
+                        tp,
+                        sl,
+                        tl,
+                        initial_amount_usd,
+                        leverage,
+                        trade_cost,
+                        store_root='candles/store',
+                        max_workers=None):
+    """
+    Backtests one strategy with the same labeling parameters on many symbols in parallel worker processes, reading
+    every symbol's candles from the local candle store.
+
+    Args:
+        tickers (List[str]): Symbols to backtest, e.g. ['BTCUSDT', 'ETHUSDT'].
+        interval (str): Candle interval, e.g. '1m'.
+        strategy_module (str): Importable strategy module, e.g. 'strategies.demo_strategy'.
+        std_span (int): Window size for calculating the standard deviation.
+        tp (float): Take-profit threshold value.
+        sl (float): Stop-loss threshold value.
+        tl (int): Time limit for holding a position (in minutes).
+        initial_amount_usd (float): Starting amount for pnl calculation.
+        leverage (float): Leverage value.
+        trade_cost (float): The proportional cost of trading.
+        store_root (str): Directory of the candle store (default is 'candles/store').
+        max_workers (int): Number of worker processes (default is the number of CPUs).
+
+    Yields:
+        dict: Summary metrics of each symbol as soon as it finishes. Symbols that fail carry the error message.
+    """
+    params = {'std_span': std_span,
+              'tp': tp,
+              'sl': sl,
+              'tl': tl,
+              'initial_amount_usd': initial_amount_usd,
+              'leverage': leverage,
+              'trade_cost': trade_cost}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(run_symbol_backtest_, ticker, interval, store_root, strategy_module, params)
+                   for ticker in tickers]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def get_leaderboard(results, sort_by='global_pnl'):
+    """
+    Ranks batch backtest results, best first. Symbols that failed go last.
+
+    Args:
+        results (List[dict]): Results yielded by iter_batch_backtest.
+        sort_by (str): Metric to rank by (default is 'global_pnl').
+
+    Returns:
+        pandas.DataFrame: Leaderboard indexed by rank.
+    """
+    leaderboard = pd.DataFrame(results)
+    if sort_by in leaderboard:
+        leaderboard = leaderboard.sort_values(sort_by, ascending=False, na_position='last')
+    leaderboard.index = pd.RangeIndex(1, len(leaderboard) + 1, name='rank')
+    return leaderboard
@@ -0,0 +1,171 @@
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from preprocessing.labeling import Labeling
+
+SWEEP_PARAMS = ['std_span', 'tp', 'sl', 'tl', 'leverage', 'trade_cost']
+SHARED_COLUMNS = ['open_time', 'close', 'strat_signal']
+
+# Candles attached by each worker process in init_worker_
+_worker_candles = None
+_worker_blocks = []
+
+
+class SharedCandles:
+    """
+    Copies the candle columns needed by the labeling step into shared memory blocks, so that worker processes can
+    attach to them instead of receiving a pickled DataFrame per task. `candles` can also be a dict of arrays of any
+    shape, e.g. a strat_signal matrix.
+    """
+    def __init__(self, candles: pd.DataFrame, columns=None):
+        self.blocks = []
+        self.spec = []
+        for column in columns or SHARED_COLUMNS:
+            values = np.ascontiguousarray(np.asarray(candles[column]))
+            block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+            np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[:] = values
+            self.blocks.append(block)
+            self.spec.append((column, block.name, values.shape, values.dtype.str))
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def attach_arrays(spec):
+    """
+    Attaches to the shared memory blocks described by `spec` without copying them.
+
+    Args:
+        spec (List[Tuple]): (column, block name, shape, dtype) for every shared column.
+
+    Returns:
+        Tuple[Dict[str, numpy.ndarray], List[SharedMemory]]: The arrays and the attached blocks, which must stay
+            referenced while the arrays are in use.
+    """
+    blocks = [shared_memory.SharedMemory(name=name) for _, name, _, _ in spec]
+    arrays = {column: np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+              for (column, _, shape, dtype), block in zip(spec, blocks)}
+    return arrays, blocks
+
+
+def attach_candles(spec):
+    """
+    Rebuilds a candles DataFrame from the shared memory blocks described by `spec`.
+
+    Args:
+        spec (List[Tuple]): (column, block name, shape, dtype) for every shared column.
+
+    Returns:
+        Tuple[pandas.DataFrame, List[SharedMemory]]: The candles and the attached blocks, which must stay referenced
+            while the arrays are in use.
+    """
+    arrays, blocks = attach_arrays(spec)
+    return pd.DataFrame(arrays, copy=False), blocks
+
+
+def init_worker_(spec):
+    global _worker_candles, _worker_blocks
+    _worker_candles, _worker_blocks = attach_candles(spec)
+
+
+def summarize_labeling(df: pd.DataFrame):
+    """
+    Computes the summary metrics shown in the PnL Results and Strategy performance sections.
+
+    Args:
+        df (pandas.DataFrame): Output of Labeling.triple_barrier_analyzer or trade table of Labeling.label_trades.
+
+    Returns:
+        dict: Global PnL, accuracy, execution accuracy, max margin and signal counts.
+    """
+    signals = df['strat_signal'] != 0
+    active = df['lab_active_order']
+    profitable = df['lab_ret_sign'] > 0
+    total_signals = int(signals.sum())
+    executed_signals = int(active.sum())
+    return {
+        'global_pnl': df.loc[active, 'lab_cum_pnl'].iloc[-1] if executed_signals else 0.0,
+        'accuracy': (signals & profitable).sum() / total_signals if total_signals else np.nan,
+        'execution_accuracy': (active & profitable).sum() / executed_signals if executed_signals else np.nan,
+        'max_margin': df.loc[active, 'lab_margin'].max() if executed_signals else 0.0,
+        'total_signals': total_signals,
+        'executed_signals': executed_signals,
+    }
+
+
+def run_labeling_(params, initial_amount_usd):
+    # The trade table leaves the shared candles untouched, no copy is needed
+    trades = Labeling().label_trades(_worker_candles,
+                                     std_span=params['std_span'],
+                                     tp=params['tp'],
+                                     sl=params['sl'],
+                                     tl=params['tl'],
+                                     initial_amount_usd=initial_amount_usd,
+                                     leverage=params['leverage'],
+                                     trade_cost=params['trade_cost'])
+    return {**params, **summarize_labeling(trades)}
+
+
+def get_parameter_grid(**params):
+    """
+    Builds every combination of the given parameter values.
+
+    Args:
+        **params: Parameter name to a value or a list of values.
+
+    Returns:
+        List[dict]: One dict per combination.
+    """
+    values = [value if isinstance(value, (list, tuple, np.ndarray)) else [value] for value in params.values()]
+    return [dict(zip(params.keys(), combination)) for combination in itertools.product(*values)]
+
+
+def run_parameter_sweep(candles: pd.DataFrame,
+                        std_span,
+                        tp,
+                        sl,
+                        tl,
+                        leverage,
+                        trade_cost,
+                        initial_amount_usd: float,
+                        max_workers: int = None):
+    """
+    Runs Labeling.label_trades over a grid of labeling parameters on a process pool.
+
+    The strategy must already have been applied, so candles carry the `strat_signal` column. Every parameter accepts
+    a single value or a list of values.
+
+    Args:
+        candles (pandas.DataFrame): Candles with `open_time`, `close` and `strat_signal` columns.
+        std_span (int | List[int]): Window size for calculating the standard deviation.
+        tp (float | List[float]): Take-profit threshold value.
+        sl (float | List[float]): Stop-loss threshold value.
+        tl (int | List[int]): Time limit for holding a position (in minutes).
+        leverage (float | List[float]): Leverage value.
+        trade_cost (float | List[float]): The proportional cost of trading.
+        initial_amount_usd (float): Starting amount for pnl calculation.
+        max_workers (int): Number of worker processes (default is the number of CPUs).
+
+    Returns:
+        pandas.DataFrame: One row per parameter set with its summary metrics.
+    """
+    grid = get_parameter_grid(std_span=std_span, tp=tp, sl=sl, tl=tl, leverage=leverage, trade_cost=trade_cost)
+    with SharedCandles(candles) as shared:
+        with ProcessPoolExecutor(max_workers=max_workers,
+                                 initializer=init_worker_,
+                                 initargs=(shared.spec,)) as executor:
+            results = list(executor.map(run_labeling_, grid, itertools.repeat(initial_amount_usd)))
+    return pd.DataFrame(results)
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+RUN_TABLES = ['trades', 'equity']
+# Serializes the read-modify-write of the run index between the sessions of the app
+_index_lock = threading.Lock()
+
+
+def get_run_id(candles_fingerprint, strategy, strategy_hash, params):
+    """
+    Identifies a run by everything its results depend on.
+
+    Args:
+        candles_fingerprint (str): Fingerprint of the raw candles (see preprocessing.stage_cache.get_fingerprint).
+        strategy (str): Strategy module name.
+        strategy_hash (str): Hash of the strategy source.
+        params (dict): Labeling and portfolio parameters.
+
+    Returns:
+        str: Hex digest of the run key.
+    """
+    key = json.dumps([candles_fingerprint, strategy, strategy_hash, sorted(params.items())], default=str)
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def get_candles_id(candles_fingerprint, strategy, strategy_hash):
+    """
+    Identifies the candles with strategy columns shared by every run of a strategy on the same candles.
+
+    Returns:
+        str: Hex digest of the candles key.
+    """
+    key = json.dumps([candles_fingerprint, strategy, strategy_hash])
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def write_parquet_(df, path, preserve_index=True):
+    # Every writer gets its own temporary file, so concurrent writes of the same path cannot mix
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix='.tmp', delete=False) as file:
+        temp_path = file.name
+    try:
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=preserve_index), temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+class ResultsStore:
+    """
+    Persistent store of backtest runs. Every run keeps its trade table and equity curve as Parquet files in its own
+    directory, and one row in a Parquet index with its key, parameters and summary metrics, so runs can be filtered
+    and sorted without opening them. The candles with strategy columns only depend on the candles and the strategy,
+    so they are stored once and referenced by every run on them.
+    """
+    def __init__(self, root='results/store'):
+        """
+        Args:
+            root (str): Directory of the store.
+        """
+        self.root = root
+        self.index_path = os.path.join(root, 'index.parquet')
+
+    def get_run_dir(self, run_id):
+        return os.path.join(self.root, 'runs', run_id)
+
+    def get_candles_path(self, candles_id):
+        return os.path.join(self.root, 'candles', f'{candles_id}.parquet')
+
+    def read_run_info_(self, run_id):
+        with open(os.path.join(self.get_run_dir(run_id), 'run.json')) as file:
+            return json.load(file)
+
+    def has_run(self, run_id):
+        run_dir = self.get_run_dir(run_id)
+        if not all(os.path.exists(os.path.join(run_dir, name))
+                   for name in ['run.json'] + [f'{table}.parquet' for table in RUN_TABLES]):
+            return False
+        # Runs stored before the candles were shared have no candles_id and are computed again
+        candles_id = self.read_run_info_(run_id).get('candles_id')
+        return candles_id is not None and os.path.exists(self.get_candles_path(candles_id))
+
+    def read_index(self, filters=None, columns=None, sort_by=None, ascending=False):
+        """
+        Reads the run index.
+
+        Args:
+            filters (List[Tuple]): pyarrow filters, e.g. [('strategy', '=', 'demo_strategy'), ('tp', '>', 1)].
+            columns (List[str]): Columns to read (default is all of them).
+            sort_by (str): Column to sort by (optional).
+            ascending (bool): Sort order (default is descending).
+
+        Returns:
+            pandas.DataFrame: One row per run, indexed by run_id.
+        """
+        if not os.path.exists(self.index_path):
+            return pd.DataFrame()
+        if columns is not None and 'run_id' not in columns:
+            columns = ['run_id'] + list(columns)
+        index = pq.read_table(self.index_path, filters=filters, columns=columns).to_pandas().set_index('run_id')
+        if sort_by is not None:
+            index = index.sort_values(sort_by, ascending=ascending, na_position='last')
+        return index
+
+    def write_run(self, run_id, key, params, metrics, candles, trades, equity):
+        """
+        Stores a run. The candles are only written when no run on them was stored before, and the index row is
+        written last, so a run only shows up once all its files exist.
+
+        Args:
+            run_id (str): Output of get_run_id.
+            key (dict): candles_fingerprint, strategy and strategy_hash of the run.
+            params (dict): Labeling and portfolio parameters.
+            metrics (dict): Summary metrics.
+            candles (pandas.DataFrame): Candles with the strategy columns.
+            trades (pandas.DataFrame): Trade table.
+            equity (pandas.DataFrame): Equity curve.
+        """
+        candles_id = get_candles_id(key['candles_fingerprint'], key['strategy'], key['strategy_hash'])
+        candles_path = self.get_candles_path(candles_id)
+        if not os.path.exists(candles_path):
+            os.makedirs(os.path.dirname(candles_path), exist_ok=True)
+            write_parquet_(candles, candles_path)
+
+        run_dir = self.get_run_dir(run_id)
+        os.makedirs(run_dir, exist_ok=True)
+        for name, df in zip(RUN_TABLES, [trades, equity]):
+            write_parquet_(df, os.path.join(run_dir, f'{name}.parquet'))
+        row = {'run_id': run_id, 'created_at': pd.Timestamp.now().floor('s'), **key, 'candles_id': candles_id,
+               **params, **metrics}
+        with open(os.path.join(run_dir, 'run.json'), 'w') as file:
+            json.dump(row, file, default=str)
+
+        with _index_lock:
+            index = self.read_index().reset_index()
+            if len(index) > 0:
+                index = index[index['run_id'] != run_id]
+            index = pd.concat([index, pd.DataFrame([row])], ignore_index=True)
+            write_parquet_(index, self.index_path, preserve_index=False)
+
+    def read_run(self, run_id, tables=None):
+        """
+        Reads the stored tables of a run.
+
+        Args:
+            run_id (str): Run identifier.
+            tables (List[str]): Tables to read among 'candles', 'trades' and 'equity' (default is all of them).
+
+        Returns:
+            Dict[str, pandas.DataFrame]: The requested tables.
+        """
+        run_dir = self.get_run_dir(run_id)
+        paths = {name: os.path.join(run_dir, f'{name}.parquet') for name in RUN_TABLES}
+        paths['candles'] = self.get_candles_path(self.read_run_info_(run_id)['candles_id'])
+        return {name: pq.read_table(paths[name]).to_pandas() for name in tables or ['candles'] + RUN_TABLES}
+
+    def delete_run(self, run_id):
+        """
+        Deletes a run, and its candles when no other run references them.
+        """
+        candles_id = self.read_run_info_(run_id)['candles_id'] if self.has_run(run_id) else None
+        with _index_lock:
+            index = self.read_index().reset_index()
+            if len(index) > 0:
+                index = index[index['run_id'] != run_id]
+                write_parquet_(index, self.index_path, preserve_index=False)
+            if candles_id is not None and candles_id not in set(index.get('candles_id', [])):
+                os.remove(self.get_candles_path(candles_id))
+        shutil.rmtree(self.get_run_dir(run_id), ignore_errors=True)
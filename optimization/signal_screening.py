@@ -0,0 +1,86 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from preprocessing.labeling import Labeling
+
+
+def label_direction_(df, direction, rows, tp, sl, trade_cost):
+    lb = Labeling()
+    df = df.copy()
+    df['strat_signal'] = np.where(rows, direction, 0)
+    results = lb.apply_pt_sl_on_tl(df, ptSl=[tp, sl])
+    df['close_datetime'] = results[['tp_datetime', 'sl_datetime', 'lab_tl']].dropna(how='all').min(axis=1)
+    df = lb.calculate_lab_ret_sign(df, trade_cost)
+    return df['close_datetime'].to_numpy(dtype='datetime64[ns]'), df['lab_ret'].to_numpy(dtype=float)
+
+
+def screen_signal_matrix(candles: pd.DataFrame,
+                         signals,
+                         std_span,
+                         tp,
+                         sl,
+                         tl,
+                         initial_amount_usd,
+                         leverage,
+                         trade_cost=0.0006,
+                         variants=None):
+    """
+    Labels many strat_signal vectors over the same candles in one pass, e.g. the output of a strategy_batch.
+
+    The barriers of a candle only depend on its own price path and on the direction of its signal, so the first
+    touches are searched once for long and once for short entries on every candle that any variant trades. Each
+    variant then only runs the executor on its own signals.
+
+    Args:
+        candles (pandas.DataFrame): Candles with `open_time` and `close` columns.
+        signals (numpy.ndarray): strat_signal matrix with one row per candle and one column per variant.
+        std_span (int): Window size for calculating the standard deviation.
+        tp (float): Take-profit threshold value.
+        sl (float): Stop-loss threshold value.
+        tl (int): Time limit for holding a position (in minutes).
+        initial_amount_usd (float): Starting amount for pnl calculation.
+        leverage (float): Leverage value.
+        trade_cost (float): The proportional cost of trading (default is 0.0006).
+        variants (List[dict]): Parameters of every column, added to the results (optional).
+
+    Returns:
+        pandas.DataFrame: One row per variant with the metrics of optimization.parameter_sweep.summarize_labeling.
+    """
+    signals = np.asarray(signals).reshape(len(candles), -1)
+    df = candles[['open_time', 'close']].copy()
+    df.index = pd.to_datetime(df['open_time'], unit='ms')
+    df['lab_trgt'] = df['close'].rolling(std_span).std() / df['close']
+    valid = df['lab_trgt'].notna().to_numpy()
+    df = df[valid]
+    signals = signals[valid]
+    df['lab_tl'] = df.index + timedelta(minutes=tl)
+
+    close_long, ret_long = label_direction_(df, 1, (signals > 0).any(axis=1), tp, sl, trade_cost)
+    close_short, ret_short = label_direction_(df, -1, (signals < 0).any(axis=1), tp, sl, trade_cost)
+
+    index = df.index.to_numpy(dtype='datetime64[ns]')
+    results = []
+    for column in range(signals.shape[1]):
+        signal_loc = np.flatnonzero(signals[:, column])
+        long = signals[signal_loc, column] > 0
+        close_datetime = np.where(long, close_long[signal_loc], close_short[signal_loc])
+        ret = np.where(long, ret_long[signal_loc], ret_short[signal_loc])
+        active_order, _ = Labeling.run_executor(index, signal_loc, close_datetime)
+        active = active_order[signal_loc]
+        profitable = ret > 0
+        total_signals = len(signal_loc)
+        executed_signals = int(active.sum())
+        results.append({
+            'global_pnl': np.cumsum(initial_amount_usd * ret[active])[-1] if executed_signals else 0.0,
+            'accuracy': profitable.sum() / total_signals if total_signals else np.nan,
+            'execution_accuracy': (active & profitable).sum() / executed_signals if executed_signals else np.nan,
+            'max_margin': initial_amount_usd / leverage if executed_signals else 0.0,
+            'total_signals': total_signals,
+            'executed_signals': executed_signals,
+        })
+    results = pd.DataFrame(results)
+    if variants is not None:
+        results = pd.concat([pd.DataFrame(variants), results], axis=1)
+    return results
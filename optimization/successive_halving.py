@@ -0,0 +1,235 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from optimization.parameter_sweep import SharedCandles, attach_arrays, get_parameter_grid
+from preprocessing.labeling import Labeling
+
+# Candles and signal matrix attached by each worker process in init_worker_
+_worker_arrays = None
+_worker_blocks = []
+
+
+def get_rung_sizes(n, n_candidates, eta=3, min_candles=None):
+    """
+    Prefix lengths of the successive halving rungs. Every prefix is `eta` times longer than the previous one and
+    the last one holds every candle.
+
+    Args:
+        n (int): Number of candles.
+        n_candidates (int): Number of candidates of the first rung.
+        eta (int): Growth of the prefix at every rung, and inverse of the fraction of candidates kept (default is 3).
+        min_candles (int): Prefix of the first rung (default is the one that leaves a single candidate for the last
+            rung).
+
+    Returns:
+        List[int]: Increasing prefix lengths, ending with n.
+    """
+    if min_candles is None:
+        n_rungs = 1
+        while eta ** n_rungs <= n_candidates:
+            n_rungs += 1
+        min_candles = -(-n // eta ** (n_rungs - 1))
+    sizes = []
+    size = max(int(min_candles), 1)
+    while size < n:
+        sizes.append(size)
+        size *= eta
+    return sizes + [n]
+
+
+def init_worker_(spec):
+    global _worker_arrays, _worker_blocks
+    _worker_arrays, _worker_blocks = attach_arrays(spec)
+
+
+def get_totals_(index, signal_loc, close_datetime, ret, busy_until, initial_amount_usd):
+    active_order, busy_until = Labeling.run_executor(index, signal_loc, close_datetime, busy_until)
+    active = active_order[signal_loc]
+    profitable = ret > 0
+    totals = np.array([(initial_amount_usd * ret[active]).sum(),
+                       len(signal_loc),
+                       profitable.sum(),
+                       active.sum(),
+                       (active & profitable).sum()], dtype=float)
+    return totals, busy_until
+
+
+def get_metrics_(totals, initial_amount_usd, leverage):
+    pnl, total_signals, profitable, executed_signals, executed_profitable = totals
+    return {'global_pnl': pnl if executed_signals else 0.0,
+            'accuracy': profitable / total_signals if total_signals else np.nan,
+            'execution_accuracy': executed_profitable / executed_signals if executed_signals else np.nan,
+            'max_margin': initial_amount_usd / leverage if executed_signals else 0.0,
+            'total_signals': int(total_signals),
+            'executed_signals': int(executed_signals)}
+
+
+def run_rung_(params, columns, prefix_end, state, initial_amount_usd):
+    open_time = _worker_arrays['open_time']
+    close = _worker_arrays['close']
+    final_end = state['final_end']
+    span = prefix_end - final_end
+    # Shared as (variants, candles), so every variant is a contiguous row
+    span_signals = _worker_arrays['signals'][columns, final_end:prefix_end]
+
+    # Candles before final_end were labeled for good on a shorter prefix: only the rest is labeled, with rolling std
+    # lookback before it
+    start = max(final_end - (params['std_span'] - 1), 0)
+    last_time = np.datetime64(int(open_time[prefix_end - 1]), 'ms')
+    lb = Labeling()
+    close_datetime, ret = {}, {}
+    commit_end = prefix_end
+    for direction in (1, -1):
+        traded = np.zeros(prefix_end - start, dtype=np.int8)
+        traded[final_end - start:] = np.where((span_signals * direction > 0).any(axis=0), direction, 0)
+        trades = lb.get_trade_barriers(pd.DataFrame({'open_time': open_time[start:prefix_end],
+                                                     'close': close[start:prefix_end],
+                                                     'strat_signal': traded}),
+                                       std_span=params['std_span'],
+                                       tp=params['tp'],
+                                       sl=params['sl'],
+                                       tl=params['tl'])
+        trades = lb.get_trade_returns(trades, params['trade_cost'])
+        loc = trades['candle_loc'].to_numpy() + start - final_end
+        close_datetime[direction] = np.full(span, np.datetime64('NaT'), dtype='datetime64[ns]')
+        close_datetime[direction][loc] = trades['close_datetime'].to_numpy()
+        ret[direction] = np.zeros(span)
+        ret[direction][loc] = trades['lab_ret'].to_numpy()
+        # A label is final once a barrier was touched or its time limit is inside the prefix, longer prefixes keep it
+        final = (trades['lab_exit'] != 'tl').to_numpy() | (trades['lab_tl'].to_numpy() <= last_time)
+        if prefix_end < len(open_time) and not final.all():
+            commit_end = min(commit_end, final_end + loc[~final][0])
+
+    # The executor state and the metrics of the signals before commit_end are carried to the next rung, the ones of
+    # the later signals are recomputed with it
+    index = open_time[final_end:prefix_end].astype('datetime64[ms]').astype('datetime64[ns]')
+    commit = commit_end - final_end
+    variant_states, metrics = {}, []
+    for row, column in enumerate(columns):
+        long = span_signals[row] > 0
+        signal_close = np.where(long, close_datetime[1], close_datetime[-1])
+        signal_loc = np.flatnonzero((span_signals[row] != 0) & ~np.isnat(signal_close))
+        signal_ret = np.where(long, ret[1], ret[-1])[signal_loc]
+        busy_until, totals = state['variants'].get(column, (None, np.zeros(5)))
+        signal_close = signal_close[signal_loc]
+        committed = signal_loc < commit
+        block_totals, busy_until = get_totals_(index[:commit], signal_loc[committed], signal_close[committed],
+                                               signal_ret[committed], busy_until, initial_amount_usd)
+        totals = totals + block_totals
+        variant_states[column] = (busy_until, totals)
+        tail_totals, _ = get_totals_(index[commit:], signal_loc[~committed] - commit,
+                                     signal_close[~committed], signal_ret[~committed], busy_until, initial_amount_usd)
+        metrics.append(get_metrics_(totals + tail_totals, initial_amount_usd, params['leverage']))
+    return {'final_end': commit_end, 'variants': variant_states}, metrics, (prefix_end - start) * len(columns)
+
+
+def run_successive_halving(candles: pd.DataFrame,
+                           signals,
+                           std_span,
+                           tp,
+                           sl,
+                           tl,
+                           leverage,
+                           trade_cost,
+                           initial_amount_usd: float,
+                           metric: str = 'global_pnl',
+                           eta: int = 3,
+                           min_candles: int = None,
+                           variants=None,
+                           max_workers: int = None):
+    """
+    Successive halving search over strategy variants and labeling parameters: every candidate is scored on a short
+    prefix of the candles, the best 1 / `eta` of them are promoted to a prefix `eta` times longer, and so on until the
+    survivors are scored on every candle. Each rung runs one task per labeling parameter set on a process pool that
+    shares the candles and the signal matrix, like run_walk_forward.
+
+    Labels are reused across rungs: a signal whose barrier was touched or whose time limit ended inside a prefix keeps
+    its label on longer ones, so every rung only labels the candles after the last final label of the previous one,
+    and resumes the executor and the metrics of each variant from there.
+
+    Every labeling parameter accepts a single value or a list of values.
+
+    Args:
+        candles (pandas.DataFrame): Candles with `open_time` and `close` columns.
+        signals (numpy.ndarray): strat_signal vector, or matrix with one column per strategy variant (e.g. from a
+            strategy_batch). Indicators must only look back, so computing them once over all candles is safe.
+        std_span (int | List[int]): Window size for calculating the standard deviation.
+        tp (float | List[float]): Take-profit threshold value.
+        sl (float | List[float]): Stop-loss threshold value.
+        tl (int | List[int]): Time limit for holding a position (in minutes).
+        leverage (float | List[float]): Leverage value.
+        trade_cost (float | List[float]): The proportional cost of trading.
+        initial_amount_usd (float): Starting amount for pnl calculation.
+        metric (str): Metric to maximize (default is 'global_pnl').
+        eta (int): Prefix growth and inverse of the fraction of candidates kept at every rung (default is 3).
+        min_candles (int): Prefix of the first rung (see get_rung_sizes).
+        variants (List[dict]): Parameters of every signal column, added to the results (optional).
+        max_workers (int): Number of worker processes (default is the number of CPUs).
+
+    Returns:
+        Tuple[pandas.DataFrame, dict]: Metrics of every candidate at every rung with the prefix it was scored on and
+            whether it was promoted, and a summary with the chosen parameters, their metrics on every candle and the
+            candle evaluations against those of a full grid.
+    """
+    signals = np.asarray(signals).reshape(len(candles), -1)
+    grid = get_parameter_grid(std_span=std_span, tp=tp, sl=sl, tl=tl, leverage=leverage, trade_cost=trade_cost)
+    candidates = [(group, column) for group in range(len(grid)) for column in range(signals.shape[1])]
+    sizes = get_rung_sizes(len(candles), len(candidates), eta, min_candles)
+    states = [{'final_end': 0, 'variants': {}} for _ in grid]
+
+    rungs = []
+    candle_evaluations = 0
+    arrays = {'open_time': candles['open_time'].to_numpy(dtype=np.int64),
+              'close': candles['close'].to_numpy(dtype=float),
+              'signals': signals.T}
+    with SharedCandles(arrays, columns=list(arrays)) as shared:
+        with ProcessPoolExecutor(max_workers=max_workers,
+                                 initializer=init_worker_,
+                                 initargs=(shared.spec,)) as executor:
+            for rung, prefix_end in enumerate(sizes):
+                groups = {}
+                for group, column in candidates:
+                    groups.setdefault(group, []).append(column)
+                futures = {group: executor.submit(run_rung_, grid[group], columns, prefix_end, states[group],
+                                                  initial_amount_usd)
+                           for group, columns in groups.items()}
+                scored, rows = [], []
+                for group, future in futures.items():
+                    states[group], metrics, evaluations = future.result()
+                    candle_evaluations += evaluations
+                    for column, column_metrics in zip(groups[group], metrics):
+                        scored.append((group, column))
+                        rows.append({'rung': rung, 'candles': prefix_end, **grid[group], 'variant': column,
+                                     **column_metrics})
+
+                results = pd.DataFrame(rows)
+                ranking = np.argsort(-results[metric].fillna(-np.inf).to_numpy(), kind='stable')
+                n_promoted = 1 if rung == len(sizes) - 1 else -(-len(scored) // eta)
+                results['promoted'] = False
+                results.loc[ranking[:n_promoted], 'promoted'] = True
+                candidates = [scored[position] for position in ranking[:n_promoted]]
+                # Variants of a labeling parameter set that are out no longer need their executor state
+                for group, state in enumerate(states):
+                    kept = {column for candidate_group, column in candidates if candidate_group == group}
+                    state['variants'] = {column: value for column, value in state['variants'].items() if column in kept}
+                rungs.append(results)
+
+    history = pd.concat(rungs, ignore_index=True)
+    if variants is not None:
+        variant_params = pd.DataFrame(variants).iloc[history['variant']].reset_index(drop=True)
+        history = pd.concat([history, variant_params], axis=1)
+    best = history[history['promoted']].iloc[-1]
+    grid_candle_evaluations = len(grid) * signals.shape[1] * len(candles)
+    summary = {'params': {**grid[candidates[0][0]],
+                          'variant': int(best['variant']),
+                          **(variants[int(best['variant'])] if variants is not None else {})},
+               'metrics': {key: best[key] for key in ['global_pnl', 'accuracy', 'execution_accuracy', 'max_margin',
+                                                      'total_signals', 'executed_signals']},
+               'rungs': len(sizes),
+               'candidates': len(grid) * signals.shape[1],
+               'candle_evaluations': candle_evaluations,
+               'grid_candle_evaluations': grid_candle_evaluations,
+               'compute_saved': 1 - candle_evaluations / grid_candle_evaluations if grid_candle_evaluations else 0.0}
+    return history, summary
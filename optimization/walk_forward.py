@@ -0,0 +1,179 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from optimization.parameter_sweep import SharedCandles, attach_arrays, get_parameter_grid, summarize_labeling
+from optimization.signal_screening import screen_signal_matrix
+from preprocessing.labeling import Labeling
+
+# Candles and signal matrix attached by each worker process in init_worker_
+_worker_arrays = None
+_worker_blocks = []
+
+
+def get_walk_forward_folds(n, train_size, test_size, anchored=False):
+    """
+    Splits candles into consecutive train and test windows. Every test window starts right after its train window
+    and the test windows do not overlap.
+
+    Args:
+        n (int): Number of candles.
+        train_size (int): Candles in each train window (in the first one when anchored).
+        test_size (int): Candles in each test window. The last one can be shorter.
+        anchored (bool): Whether every train window starts at the first candle instead of rolling forward.
+
+    Returns:
+        List[Tuple[slice, slice]]: Train and test rows of every fold.
+    """
+    folds = []
+    for test_start in range(train_size, n, test_size):
+        train_start = 0 if anchored else test_start - train_size
+        folds.append((slice(train_start, test_start), slice(test_start, min(test_start + test_size, n))))
+    return folds
+
+
+def init_worker_(spec):
+    global _worker_arrays, _worker_blocks
+    _worker_arrays, _worker_blocks = attach_arrays(spec)
+
+
+def get_candles_(rows, variant=None):
+    df = pd.DataFrame({'open_time': _worker_arrays['open_time'][rows], 'close': _worker_arrays['close'][rows]})
+    if variant is not None:
+        df['strat_signal'] = _worker_arrays['signals'][variant, rows]
+    return df
+
+
+def run_fold_(fold, train, test, grid, initial_amount_usd, metric):
+    open_time = _worker_arrays['open_time']
+    # Shared as (variants, candles), so every variant is a contiguous row
+    signals = _worker_arrays['signals'].T
+
+    # In-sample: screen every strategy variant with every labeling parameter set
+    train_candles = get_candles_(train)
+    best_params, best = None, None
+    for params in grid:
+        screened = screen_signal_matrix(train_candles, signals[train], initial_amount_usd=initial_amount_usd, **params)
+        variant = screened[metric].fillna(-np.inf).idxmax()
+        if best is None or screened.loc[variant, metric] > best[metric]:
+            best_params, best = {**params, 'variant': variant}, screened.loc[variant].to_dict()
+
+    # Out-of-sample: label the test window with rolling std lookback before it and tl lookahead after it
+    start = max(test.start - (best_params['std_span'] - 1), 0)
+    end = open_time.searchsorted(open_time[test.stop - 1] + best_params['tl'] * 60 * 10 ** 3, side='right')
+    trades = Labeling().label_trades(get_candles_(slice(start, end), best_params['variant']),
+                                     std_span=best_params['std_span'],
+                                     tp=best_params['tp'],
+                                     sl=best_params['sl'],
+                                     tl=best_params['tl'],
+                                     initial_amount_usd=initial_amount_usd,
+                                     leverage=best_params['leverage'],
+                                     trade_cost=best_params['trade_cost'])
+    entry_time = trades.index.to_numpy(dtype='datetime64[ms]').astype(np.int64)
+    trades = trades[(entry_time >= open_time[test.start]) & (entry_time <= open_time[test.stop - 1])]
+
+    stats = {'fold': fold,
+             'train_start': pd.to_datetime(open_time[train.start], unit='ms'),
+             'train_end': pd.to_datetime(open_time[train.stop - 1], unit='ms'),
+             'test_start': pd.to_datetime(open_time[test.start], unit='ms'),
+             'test_end': pd.to_datetime(open_time[test.stop - 1], unit='ms'),
+             **best_params,
+             **{f'train_{key}': value for key, value in best.items()}}
+    return stats, trades
+
+
+def run_walk_forward(candles: pd.DataFrame,
+                     signals,
+                     std_span,
+                     tp,
+                     sl,
+                     tl,
+                     leverage,
+                     trade_cost,
+                     initial_amount_usd: float,
+                     train_size: int,
+                     test_size: int,
+                     anchored: bool = False,
+                     metric: str = 'global_pnl',
+                     variants=None,
+                     max_workers: int = None):
+    """
+    Walk-forward optimization: on every train window picks the strategy variant and labeling parameters with the
+    best metric, then labels the following test window with them. Folds run concurrently on a process pool that
+    shares the candles and the precomputed signal matrix instead of recomputing indicators per fold.
+
+    The out-of-sample signals of all folds go through one executor, so a trade still open at the end of a test
+    window keeps the next fold from opening a position until it closes.
+
+    Every labeling parameter accepts a single value or a list of values.
+
+    Args:
+        candles (pandas.DataFrame): Candles with `open_time` and `close` columns.
+        signals (numpy.ndarray): strat_signal vector, or matrix with one column per strategy variant (e.g. from a
+            strategy_batch). Indicators must only look back, so computing them once over all candles is safe.
+        std_span (int | List[int]): Window size for calculating the standard deviation.
+        tp (float | List[float]): Take-profit threshold value.
+        sl (float | List[float]): Stop-loss threshold value.
+        tl (int | List[int]): Time limit for holding a position (in minutes).
+        leverage (float | List[float]): Leverage value.
+        trade_cost (float | List[float]): The proportional cost of trading.
+        initial_amount_usd (float): Starting amount for pnl calculation.
+        train_size (int): Candles in each train window.
+        test_size (int): Candles in each test window.
+        anchored (bool): Whether train windows grow from the first candle instead of rolling (default is False).
+        metric (str): Train metric to maximize (default is 'global_pnl').
+        variants (List[dict]): Parameters of every signal column, added to the fold statistics (optional).
+        max_workers (int): Number of worker processes (default is the number of CPUs).
+
+    Returns:
+        Tuple[pandas.DataFrame, pandas.DataFrame]: Statistics of every fold (window bounds, chosen parameters, train
+            and test metrics), and the stitched out-of-sample PnL of the executed trades indexed by exit datetime.
+    """
+    signals = np.asarray(signals).reshape(len(candles), -1)
+    grid = get_parameter_grid(std_span=std_span, tp=tp, sl=sl, tl=tl, leverage=leverage, trade_cost=trade_cost)
+    folds = get_walk_forward_folds(len(candles), train_size, test_size, anchored)
+    arrays = {'open_time': candles['open_time'].to_numpy(dtype=np.int64),
+              'close': candles['close'].to_numpy(dtype=float),
+              'signals': signals.T}
+    with SharedCandles(arrays, columns=list(arrays)) as shared:
+        with ProcessPoolExecutor(max_workers=max_workers,
+                                 initializer=init_worker_,
+                                 initargs=(shared.spec,)) as executor:
+            futures = [executor.submit(run_fold_, fold, train, test, grid, initial_amount_usd, metric)
+                       for fold, (train, test) in enumerate(folds)]
+            results = [future.result() for future in futures]
+
+    # The executor runs over the folds in order, carrying the position left open by each test window
+    busy_until = None
+    fold_stats, curves = [], []
+    offset = 0.0
+    for fold, ((stats, trades), (_, test)) in enumerate(zip(results, folds)):
+        trades = trades.copy()
+        index = arrays['open_time'][test].astype('datetime64[ms]').astype('datetime64[ns]')
+        signal_loc = index.searchsorted(trades.index.to_numpy(dtype='datetime64[ns]'))
+        close_datetime = trades['close_datetime'].to_numpy(dtype='datetime64[ns]')
+        active_order, busy_until = Labeling.run_executor(index, signal_loc, close_datetime, busy_until)
+        trades['lab_active_order'] = active_order[signal_loc]
+        trades = Labeling.calculate_pnl(trades, initial_amount_usd, stats['leverage'])
+        fold_stats.append({**stats, **{f'test_{key}': value for key, value in summarize_labeling(trades).items()}})
+
+        active = trades['lab_active_order'].to_numpy()
+        # PnL is realized when the trade closes
+        curve = pd.DataFrame({'entry_datetime': trades.index[active],
+                              'lab_ret_usd': trades['lab_ret_usd'].to_numpy()[active],
+                              'lab_cum_pnl': trades['lab_cum_pnl'].to_numpy()[active],
+                              'fold': fold},
+                             index=pd.DatetimeIndex(close_datetime[active], name='close_datetime'))
+        curve['oos_cum_pnl'] = curve['lab_cum_pnl'] + offset
+        if len(curve) > 0:
+            offset = curve['oos_cum_pnl'].iloc[-1]
+        curves.append(curve)
+
+    stats = pd.DataFrame(fold_stats)
+    if variants is not None and len(stats) > 0:
+        variant_params = pd.DataFrame(variants).iloc[stats['variant']].reset_index(drop=True)
+        stats = pd.concat([stats, variant_params], axis=1)
+    oos_pnl = pd.concat(curves) if curves else pd.DataFrame(columns=['entry_datetime', 'lab_ret_usd', 'lab_cum_pnl',
+                                                                        'fold', 'oos_cum_pnl'])
+    return stats, oos_pnl
@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+
+
+def rolling_mean_std(values, lengths, ddof=0):
+    """
+    Rolling mean and standard deviation of one series for many window lengths. All lengths share a single cumulative
+    sum of the values and of their squares.
+
+    Args:
+        values (array-like): 1-D series, e.g. close prices.
+        lengths (List[int]): Window lengths.
+        ddof (int): Delta degrees of freedom of the standard deviation (default is 0, as pandas_ta bbands).
+
+    Returns:
+        Tuple[numpy.ndarray, numpy.ndarray]: Mean and standard deviation with one column per length, NaN until each
+            window is full.
+    """
+    values = np.asarray(values, dtype=float)
+    # Centering keeps the cumulative sum of squares small, so the differences do not lose precision
+    center = values.mean() if len(values) else 0.0
+    centered = values - center
+    cumsum = np.concatenate([[0.0], np.cumsum(centered)])
+    cumsum_sq = np.concatenate([[0.0], np.cumsum(centered ** 2)])
+
+    mean = np.full((len(values), len(lengths)), np.nan)
+    std = np.full((len(values), len(lengths)), np.nan)
+    for column, length in enumerate(lengths):
+        if length > len(values):
+            continue
+        window_sum = cumsum[length:] - cumsum[:-length]
+        window_sum_sq = cumsum_sq[length:] - cumsum_sq[:-length]
+        window_mean = window_sum / length
+        sum_sq_dev = np.maximum(window_sum_sq - window_sum * window_mean, 0.0)
+        mean[length - 1:, column] = window_mean + center
+        std[length - 1:, column] = np.sqrt(sum_sq_dev / (length - ddof))
+    return mean, std
+
+
+def ema(values, span, start=0):
+    """
+    Exponential moving average of several columns with the same span in one pass. Like pandas_ta ema, every column is
+    seeded with the simple average of its first `span` values.
+
+    Args:
+        values (numpy.ndarray): 2-D array with one series per column.
+        span (int): EMA span.
+        start (int | numpy.ndarray): Row of the first valid value of each column (default is 0).
+
+    Returns:
+        numpy.ndarray: EMA of every column, NaN before its seed.
+    """
+    values = np.array(values, dtype=float)
+    start = np.broadcast_to(start, values.shape[1])
+    for column, first in enumerate(start):
+        seed = first + span - 1
+        if seed < len(values):
+            values[seed, column] = values[first:seed + 1, column].mean()
+        values[:seed, column] = np.nan
+    return pd.DataFrame(values, copy=False).ewm(span=span, adjust=False).mean().to_numpy()
+
+
+def bbands(close, lengths, std=2.0):
+    """
+    Bollinger bands for many window lengths at once.
+
+    Args:
+        close (array-like): Close prices.
+        lengths (List[int]): Window lengths.
+        std (float): Number of standard deviations of the bands (default is 2.0).
+
+    Returns:
+        Dict[str, numpy.ndarray]: 'lower', 'mid', 'upper' and 'percent' arrays with one column per length.
+    """
+    close = np.asarray(close, dtype=float)
+    mid, deviation = rolling_mean_std(close, lengths)
+    lower = mid - std * deviation
+    upper = mid + std * deviation
+    band_range = upper - lower
+    band_range[band_range == 0] = np.finfo(float).eps
+    return {'lower': lower,
+            'mid': mid,
+            'upper': upper,
+            'percent': (close[:, None] - lower) / band_range}
+
+
+def macd(close, params):
+    """
+    MACD for many (fast, slow, signal) sets at once. Each distinct fast or slow span takes one EMA pass over the
+    close prices, and the signal lines of all sets with the same signal span take one pass together.
+
+    Args:
+        close (array-like): Close prices.
+        params (List[Tuple[int, int, int]]): (fast, slow, signal) spans of every set.
+
+    Returns:
+        Dict[str, numpy.ndarray]: 'macd', 'hist' and 'signal' arrays with one column per set.
+    """
+    close = np.asarray(close, dtype=float)[:, None]
+    params = np.asarray(params, dtype=int).reshape(-1, 3)
+    averages = {span: ema(close, span)[:, 0] for span in np.unique(params[:, :2])}
+
+    macd_line = np.empty((len(close), len(params)))
+    for column, (fast, slow, _) in enumerate(params):
+        macd_line[:, column] = averages[fast] - averages[slow]
+
+    signal_line = np.empty_like(macd_line)
+    for span in np.unique(params[:, 2]):
+        columns = np.flatnonzero(params[:, 2] == span)
+        # The signal line starts at the first valid MACD value
+        first = params[columns, :2].max(axis=1) - 1
+        signal_line[:, columns] = ema(macd_line[:, columns], span, start=first)
+    return {'macd': macd_line,
+            'hist': macd_line - signal_line,
+            'signal': signal_line}
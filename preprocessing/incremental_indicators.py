@@ -0,0 +1,124 @@
+import math
+import sys
+from collections import deque
+
+
+class RollingStd:
+    """
+    Rolling mean and standard deviation updated in constant time per value, with Welford's update for the value
+    entering the window and its inverse for the value leaving it.
+    """
+    def __init__(self, length, ddof=1):
+        self.length = length
+        self.ddof = ddof
+        self.window = deque()
+        self.mean = 0.0
+        self.sum_sq_dev = 0.0
+
+    def update(self, value):
+        """
+        Args:
+            value (float): New value.
+
+        Returns:
+            float: Standard deviation of the last `length` values, NaN until the window is full.
+        """
+        self.window.append(value)
+        if len(self.window) > self.length:
+            old = self.window.popleft()
+            delta = value - old
+            new_mean = self.mean + delta / self.length
+            self.sum_sq_dev += delta * (value - new_mean + old - self.mean)
+            self.mean = new_mean
+        else:
+            delta = value - self.mean
+            self.mean += delta / len(self.window)
+            self.sum_sq_dev += delta * (value - self.mean)
+        return self.std
+
+    @property
+    def std(self):
+        if len(self.window) < self.length:
+            return math.nan
+        return math.sqrt(max(self.sum_sq_dev, 0.0) / (self.length - self.ddof))
+
+
+class EMA:
+    """
+    Exponential moving average updated in constant time per value. Like pandas_ta ema, it is seeded with the simple
+    average of the first `span` values.
+    """
+    def __init__(self, span):
+        self.span = span
+        self.alpha = 2 / (span + 1)
+        self.count = 0
+        self.total = 0.0
+        self.value = math.nan
+
+    def update(self, value):
+        """
+        Args:
+            value (float): New value.
+
+        Returns:
+            float: Current average, NaN until `span` values were seen.
+        """
+        self.count += 1
+        if self.count < self.span:
+            self.total += value
+        elif self.count == self.span:
+            self.value = (self.total + value) / self.span
+        else:
+            self.value = (1 - self.alpha) * self.value + self.alpha * value
+        return self.value
+
+
+class MACD:
+    """
+    Moving average convergence divergence updated in constant time per value.
+    """
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast = EMA(fast)
+        self.slow = EMA(slow)
+        self.signal = EMA(signal)
+
+    def update(self, value):
+        """
+        Args:
+            value (float): New close price.
+
+        Returns:
+            Tuple[float, float, float]: MACD line, histogram and signal line (NaN while warming up).
+        """
+        macd_line = self.fast.update(value) - self.slow.update(value)
+        if math.isnan(macd_line):
+            return math.nan, math.nan, math.nan
+        signal_line = self.signal.update(macd_line)
+        return macd_line, macd_line - signal_line, signal_line
+
+
+class BollingerBands:
+    """
+    Bollinger bands updated in constant time per value.
+    """
+    def __init__(self, length=20, std=2.0):
+        self.rolling = RollingStd(length, ddof=0)
+        self.std = std
+
+    def update(self, value):
+        """
+        Args:
+            value (float): New close price.
+
+        Returns:
+            Tuple[float, float, float, float]: Lower band, mid band, upper band and percent position of the value
+                between the bands (NaN while warming up).
+        """
+        deviation = self.rolling.update(value)
+        if math.isnan(deviation):
+            return math.nan, math.nan, math.nan, math.nan
+        mid = self.rolling.mean
+        lower = mid - self.std * deviation
+        upper = mid + self.std * deviation
+        band_range = upper - lower if upper != lower else sys.float_info.epsilon
+        return lower, mid, upper, (value - lower) / band_range
@@ -0,0 +1,121 @@
+import threading
+
+import pandas as pd
+from cachetools import LRUCache
+
+from preprocessing.stage_cache import get_fingerprint
+
+
+def get_nbytes_(arrays):
+    return sum(array.nbytes for array in arrays.values())
+
+
+class IndicatorCache:
+    """
+    Memoizes indicator outputs keyed by the fingerprint of the candle columns they read, the indicator name and its
+    parameters. Entries are evicted least recently used first once their arrays exceed the memory budget.
+    """
+    def __init__(self, max_bytes=256 * 2 ** 20):
+        self.cache = LRUCache(maxsize=max_bytes, getsizeof=get_nbytes_)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def nbytes(self):
+        return self.cache.currsize
+
+    def get(self, df: pd.DataFrame, name, columns, params, compute):
+        """
+        Returns the cached arrays of an indicator or computes and stores them.
+
+        Args:
+            df (pandas.DataFrame): Candles.
+            name (str): Indicator name.
+            columns (List[str]): Candle columns the indicator reads.
+            params (dict): Indicator parameters.
+            compute (Callable[[pandas.DataFrame], Dict[str, numpy.ndarray]]): Function that computes the indicator
+                outputs from the candles.
+
+        Returns:
+            Dict[str, numpy.ndarray]: Read-only output arrays, shared with later callers without copying.
+        """
+        key = (get_fingerprint(df, columns), name, tuple(sorted(params.items())))
+        with self.lock:
+            arrays = self.cache.get(key)
+            if arrays is not None:
+                self.hits += 1
+                return arrays
+            self.misses += 1
+        arrays = compute(df)
+        for array in arrays.values():
+            array.flags.writeable = False
+        with self.lock:
+            try:
+                self.cache[key] = arrays
+            except ValueError:
+                # Larger than the whole budget: returned but not kept
+                pass
+        return arrays
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+
+
+# Process-wide cache shared by all strategies
+indicator_cache = IndicatorCache()
+
+
+def bbands(df: pd.DataFrame, length=20, std=2.0, cache: IndicatorCache = None):
+    """
+    Bollinger bands of the close price.
+
+    Args:
+        df (pandas.DataFrame): Candles with a close column.
+        length (int): Rolling window size.
+        std (float): Number of standard deviations of the bands.
+        cache (IndicatorCache): Cache to use (default is the shared indicator_cache).
+
+    Returns:
+        Dict[str, numpy.ndarray]: Read-only 'lower', 'mid', 'upper', 'bandwidth' and 'percent' arrays.
+    """
+    def compute(candles):
+        # pandas_ta is slow to import, so it is only loaded on a cache miss
+        import pandas_ta as ta
+        result = ta.bbands(candles['close'], length=length, std=std)
+        suffix = f'{length}_{float(std)}'
+        return {'lower': result[f'BBL_{suffix}'].to_numpy(),
+                'mid': result[f'BBM_{suffix}'].to_numpy(),
+                'upper': result[f'BBU_{suffix}'].to_numpy(),
+                'bandwidth': result[f'BBB_{suffix}'].to_numpy(),
+                'percent': result[f'BBP_{suffix}'].to_numpy()}
+
+    cache = indicator_cache if cache is None else cache
+    return cache.get(df, 'bbands', ['close'], {'length': length, 'std': float(std)}, compute)
+
+
+def macd(df: pd.DataFrame, fast=12, slow=26, signal=9, cache: IndicatorCache = None):
+    """
+    Moving average convergence divergence of the close price.
+
+    Args:
+        df (pandas.DataFrame): Candles with a close column.
+        fast (int): Fast EMA length.
+        slow (int): Slow EMA length.
+        signal (int): Signal EMA length.
+        cache (IndicatorCache): Cache to use (default is the shared indicator_cache).
+
+    Returns:
+        Dict[str, numpy.ndarray]: Read-only 'macd', 'hist' and 'signal' arrays.
+    """
+    def compute(candles):
+        import pandas_ta as ta
+        result = ta.macd(candles['close'], fast=fast, slow=slow, signal=signal)
+        suffix = f'{fast}_{slow}_{signal}'
+        return {'macd': result[f'MACD_{suffix}'].to_numpy(),
+                'hist': result[f'MACDh_{suffix}'].to_numpy(),
+                'signal': result[f'MACDs_{suffix}'].to_numpy()}
+
+    cache = indicator_cache if cache is None else cache
+    return cache.get(df, 'macd', ['close'], {'fast': fast, 'slow': slow, 'signal': signal}, compute)
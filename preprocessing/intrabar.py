@@ -0,0 +1,105 @@
+import threading
+
+import numpy as np
+from cachetools import LRUCache
+
+from connector.candle_store import INTERVAL_DURATION, merge_ranges
+from connector.resampling import get_bucket_bounds
+
+
+class IntrabarResolver:
+    """
+    Settles which barrier was touched first inside a candle whose high and low cross both, from the lower timeframe
+    candles of the candle store. Only the candles that need it are read from disk, and the ones whose lower timeframe
+    is complete are kept in an LRU cache.
+
+    When the lower timeframe cannot tell, because its candles are not stored or one of them crosses both barriers
+    too, the stop loss is taken as touched first. Resolving is thread-safe, so one instance can serve every session
+    of the app.
+    """
+    def __init__(self, store=None, ticker=None, interval=None, base_interval='1m', max_cached_bars=10000):
+        """
+        Args:
+            store (connector.candle_store.CandleStore): Store with the lower timeframe candles (default is None, no
+                lower timeframe).
+            ticker (str): Symbol of the backtested candles, e.g. 'BTCUSDT'.
+            interval (str): Interval of the backtested candles, e.g. '4h'.
+            base_interval (str): Lower timeframe read from the store (default is '1m').
+            max_cached_bars (int): Maximum number of candles whose lower timeframe is kept in memory.
+        """
+        self.store = store
+        self.ticker = ticker
+        self.interval = interval
+        self.base_interval = base_interval
+        self.cache = LRUCache(maxsize=max_cached_bars)
+        self.lock = threading.Lock()
+        self.resolved = 0
+        self.unresolved = 0
+
+    def can_drill_down(self):
+        return (self.store is not None and self.interval in INTERVAL_DURATION
+                and INTERVAL_DURATION[self.interval] > INTERVAL_DURATION[self.base_interval])
+
+    def get_key(self):
+        return (self.ticker, self.interval, self.base_interval) if self.can_drill_down() else None
+
+    def get_bars_(self, bar_times):
+        bars = {}
+        missing = []
+        for bar_time in sorted(set(bar_times.tolist())):
+            key = (self.ticker, self.interval, bar_time)
+            if key in self.cache:
+                bars[bar_time] = self.cache[key]
+            else:
+                missing.append(bar_time)
+        if not missing or not self.can_drill_down():
+            return bars
+
+        bar_ends = get_bucket_bounds(missing, self.interval)[1].tolist()
+        candles = self.store.read_ranges(self.ticker, self.base_interval,
+                                         merge_ranges([[start, end] for start, end in zip(missing, bar_ends)]))
+        open_time = candles['open_time'].to_numpy()
+        high = candles['high'].to_numpy(dtype=float)
+        low = candles['low'].to_numpy(dtype=float)
+        first = open_time.searchsorted(missing, side='left')
+        last = open_time.searchsorted(bar_ends, side='left')
+        base_duration = INTERVAL_DURATION[self.base_interval]
+        for bar_time, bar_end, start, end in zip(missing, bar_ends, first, last):
+            bars[bar_time] = (high[start:end], low[start:end])
+            # Bars with lower timeframe candles still missing are read again next time, they may be stored by then
+            if end - start >= (bar_end - bar_time) // base_duration:
+                self.cache[(self.ticker, self.interval, bar_time)] = bars[bar_time]
+        return bars
+
+    def resolve(self, bar_times, side, tp_price, sl_price):
+        """
+        Args:
+            bar_times (numpy.ndarray): Open time in milliseconds of the candle of each position that crossed both
+                barriers.
+            side (numpy.ndarray): 1 for long and -1 for short positions.
+            tp_price (numpy.ndarray): Take profit price of each position.
+            sl_price (numpy.ndarray): Stop loss price of each position.
+
+        Returns:
+            numpy.ndarray: True where the take profit was touched first.
+        """
+        with self.lock:
+            bars = self.get_bars_(np.asarray(bar_times, dtype=np.int64))
+        no_candles = (np.zeros(0), np.zeros(0))
+        tp_first = np.zeros(len(bar_times), dtype=bool)
+        unresolved = 0
+        for position, bar_time in enumerate(np.asarray(bar_times, dtype=np.int64).tolist()):
+            high, low = bars.get(bar_time, no_candles)
+            favourable, adverse = (high, low) if side[position] > 0 else (low, high)
+            tp_touched = np.flatnonzero((favourable - tp_price[position]) * side[position] > 0)
+            sl_touched = np.flatnonzero((adverse - sl_price[position]) * side[position] < 0)
+            tp_at = tp_touched[0] if len(tp_touched) else len(high)
+            sl_at = sl_touched[0] if len(sl_touched) else len(high)
+            if tp_at == sl_at:
+                unresolved += 1
+                continue
+            tp_first[position] = tp_at < sl_at
+        with self.lock:
+            self.resolved += len(bar_times) - unresolved
+            self.unresolved += unresolved
+        return tp_first
@@ -1,12 +1,17 @@
 import pandas as pd
 import numpy as np
 from datetime import timedelta
+from preprocessing.profiling import profiler, profiled
+
+# Categories of lab_exit in the trade table, in the order ties between barriers are resolved
+TRADE_EXITS = ['tp', 'sl', 'tl']
 
 
 class Labeling:
     """
     Class that contains methods for preprocessing financial candles.
     """
+    @profiled('triple_barrier_analyzer')
     def triple_barrier_analyzer(self,
                                 df,
                                 std_span,
@@ -32,58 +37,318 @@ class Labeling:
         Returns:
             pandas.DataFrame: DataFrame with the triple-barrier method applied to the trades.
         """
-        df.index = pd.to_datetime(df['open_time'], unit='ms')
-        df["lab_trgt"] = df["close"].rolling(std_span).std() / df["close"]
-        df.dropna(subset="lab_trgt", inplace=True)
-        df["lab_tl"] = df.index + timedelta(minutes=tl)
+        df = self.apply_barriers(df, std_span, tp, sl, tl)
+        df = self.apply_returns(df, trade_cost)
+        df = self.calculate_pnl(df, initial_amount_usd, leverage)
+        return df
+
+    @profiled('label_trades')
+    def label_trades(self,
+                     df,
+                     std_span,
+                     tp,
+                     sl,
+                     tl,
+                     initial_amount_usd,
+                     leverage,
+                     trade_cost=0.0006,
+                     intrabar=None):
+        """
+        Applies the triple-barrier method like triple_barrier_analyzer, but leaves the candles untouched and returns
+        a trade table with one row per signal instead of adding the labeling columns to every candle.
+
+        Args:
+            df (pandas.DataFrame): DataFrame containing financial candles.
+            std_span (int): Window size for calculating the standard deviation.
+            tp (float): Take-profit threshold value.
+            sl (float): Stop-loss threshold value.
+            tl (int): Time limit for holding a position (in minutes).
+            initial_amount_usd (float): Starting amount for pnl calculation
+            leverage (float): Leverage value
+            trade_cost (float): The proportional cost of trading (default is 0.0006).
+            intrabar (preprocessing.intrabar.IntrabarResolver): Settles barriers on high/low prices, see
+                get_trade_barriers (default is None, close prices only).
+
+        Returns:
+            pandas.DataFrame: Trade table, see get_trade_barriers.
+        """
+        trades = self.get_trade_barriers(df, std_span, tp, sl, tl, intrabar)
+        trades = self.get_trade_returns(trades, trade_cost)
+        return self.calculate_pnl(trades, initial_amount_usd, leverage)
+
+    @profiled('get_trade_barriers')
+    def get_trade_barriers(self, df, std_span, tp, sl, tl, intrabar=None):
+        """
+        Trade table counterpart of apply_barriers. Signals in the rolling std warm-up are left out, like the candles
+        dropped by apply_barriers.
+
+        With `intrabar`, barriers are touched by the high and low of the candles after the entry and tp/sl exits fill
+        at the barrier price. A candle whose range crosses both barriers is settled by `intrabar` from lower
+        timeframe candles, so only those candles cost any extra I/O.
+
+        Args:
+            df (pandas.DataFrame): DataFrame containing financial candles.
+            std_span (int): Window size for calculating the standard deviation.
+            tp (float): Take-profit threshold value.
+            sl (float): Stop-loss threshold value.
+            tl (int): Time limit for holding a position (in minutes).
+            intrabar (preprocessing.intrabar.IntrabarResolver): Settles candles touching both barriers (default is
+                None, barriers are touched by close prices like in apply_barriers).
+
+        Returns:
+            pandas.DataFrame: One row per signal indexed by entry datetime, with the candle positions of the entry and
+                the exit (candle_loc, exit_loc), the exit price, the barrier columns of apply_barriers and a
+                categorical lab_exit.
+        """
+        with profiler.stage('rolling_std', rows=len(df)):
+            trgt = (df['close'].rolling(std_span).std() / df['close']).to_numpy(dtype=float)
+            rows = np.flatnonzero(~np.isnan(trgt))
+            index = pd.to_datetime(df['open_time'].to_numpy()[rows], unit='ms').to_numpy(dtype='datetime64[ns]')
+            close = df['close'].to_numpy(dtype=float)[rows]
+            signal = df['strat_signal'].to_numpy()[rows]
+            trgt = trgt[rows]
+            high = low = None
+            if intrabar is not None:
+                high = df['high'].to_numpy(dtype=float)[rows]
+                low = df['low'].to_numpy(dtype=float)[rows]
+
+        signal_loc = np.flatnonzero(signal != 0)
+        index_ns = index.view(np.int64)
+        lab_tl = index_ns[signal_loc] + pd.Timedelta(minutes=tl).value
+        # Path of each signal goes from its own candle to the last candle at or before lab_tl (both included)
+        path_len = np.maximum(index_ns.searchsorted(lab_tl, side='right') - signal_loc, 0)
+        if len(signal_loc) > 0:
+            tp_loc, sl_loc = self.get_first_touch(close, signal, trgt, signal_loc, path_len, ptSl=[tp, sl],
+                                                  high=high, low=low)
+        else:
+            tp_loc = sl_loc = np.zeros(0, dtype=int)
+        side = signal[signal_loc].astype(np.int8)
+        entry_close = close[signal_loc]
+        entry_trgt = trgt[signal_loc]
+        tp_order = entry_close * (1 + entry_trgt * tp * side)
+        sl_order = entry_close * (1 - entry_trgt * sl * side)
+
+        if intrabar is not None:
+            both = np.flatnonzero((tp_loc >= 0) & (tp_loc == sl_loc))
+            if len(both) > 0:
+                with profiler.stage('intrabar', rows=len(both)):
+                    tp_first = intrabar.resolve(index_ns[signal_loc[both] + tp_loc[both]] // 10 ** 6,
+                                                side[both],
+                                                tp_order[both],
+                                                sl_order[both])
+                # The barrier touched second does not count, the position is already closed
+                sl_loc[both[tp_first]] = -1
+                tp_loc[both[~tp_first]] = -1
+
+        # First barrier reached, ties resolved in TRADE_EXITS order like the idxmin of apply_barriers
+        not_touched = np.iinfo(np.int64).max
+        exit_times = np.column_stack([np.where(tp_loc >= 0, index_ns[signal_loc + np.maximum(tp_loc, 0)], not_touched),
+                                      np.where(sl_loc >= 0, index_ns[signal_loc + np.maximum(sl_loc, 0)], not_touched),
+                                      lab_tl])
+        exit_code = exit_times.argmin(axis=1).astype(np.int8)
+        close_datetime = exit_times[np.arange(len(signal_loc)), exit_code].view('datetime64[ns]')
+        exit_loc = index.searchsorted(close_datetime, side='right') - 1
+        exit_price = close[exit_loc]
+        if intrabar is not None:
+            exit_price = np.choose(exit_code, [tp_order, sl_order, exit_price])
+        active_order, _ = self.run_executor(index, signal_loc, close_datetime)
+
+        trades = pd.DataFrame({'candle_loc': rows[signal_loc],
+                               'exit_loc': rows[exit_loc],
+                               'strat_signal': side,
+                               'close': entry_close,
+                               'exit_price': exit_price,
+                               'lab_trgt': entry_trgt,
+                               'lab_tl': lab_tl.view('datetime64[ns]'),
+                               'close_datetime': close_datetime,
+                               'lab_tp_order': tp_order,
+                               'lab_sl_order': sl_order,
+                               'lab_tp_pct': 1 + entry_trgt * tp * side,
+                               'lab_sl_pct': 1 - entry_trgt * sl * side,
+                               'lab_active_order': active_order[signal_loc],
+                               'lab_exit': pd.Categorical.from_codes(exit_code, TRADE_EXITS)},
+                              index=pd.DatetimeIndex(index[signal_loc], name='open_time'))
+        if 'datetime' in df:
+            trades.insert(2, 'datetime', df['datetime'].to_numpy()[trades['candle_loc'].to_numpy()])
+        return trades
+
+    @profiled('get_trade_returns')
+    def get_trade_returns(self, trades, trade_cost):
+        """
+        Trade table counterpart of apply_returns.
+
+        Args:
+            trades (pandas.DataFrame): Output of get_trade_barriers.
+            trade_cost (float): The proportional cost of trading.
+
+        Returns:
+            pandas.DataFrame: Trade table with return, sign and return over target columns.
+        """
+        trades['lab_ret'] = (trades['exit_price'] / trades['close'] - 1) * trades['strat_signal'] - trade_cost
+        trades['lab_ret_sign'] = np.sign(trades['lab_ret']).astype(np.int8)
+        trades['lab_ret_target'] = trades['lab_ret'] / trades['lab_trgt']
+        return trades
+
+    @profiled('apply_barriers')
+    def apply_barriers(self, df, std_span, tp, sl, tl):
+        """
+        Places the three barriers of every signal, finds which one is touched first and runs the single executor.
+        This stage does not depend on trade cost, leverage or order amount.
+
+        Args:
+            df (pandas.DataFrame): DataFrame containing financial candles.
+            std_span (int): Window size for calculating the standard deviation.
+            tp (float): Take-profit threshold value.
+            sl (float): Stop-loss threshold value.
+            tl (int): Time limit for holding a position (in minutes).
+
+        Returns:
+            pandas.DataFrame: DataFrame with barrier, exit and active order columns.
+        """
+        with profiler.stage('rolling_std', rows=len(df)):
+            df.index = pd.to_datetime(df['open_time'], unit='ms')
+            df["lab_trgt"] = df["close"].rolling(std_span).std() / df["close"]
+            df.dropna(subset="lab_trgt", inplace=True)
+            df["lab_tl"] = df.index + timedelta(minutes=tl)
         results = self.apply_pt_sl_on_tl(df, ptSl=[tp, sl])
         df["close_datetime"] = results[['tp_datetime', 'sl_datetime', 'lab_tl']].dropna(how='all').min(axis=1)
-        df = self.calculate_lab_ret_sign(df, trade_cost)
 
         df['lab_tp_order'] = df['close'] * (1 + df['lab_trgt'] * tp * df["strat_signal"])
         df['lab_sl_order'] = df['close'] * (1 - df['lab_trgt'] * sl * df["strat_signal"])
         df['lab_tp_pct'] = (1 + df['lab_trgt'] * tp * df["strat_signal"])
         df['lab_sl_pct'] = (1 - df['lab_trgt'] * sl * df["strat_signal"])
-        df['lab_ret_target'] = df['lab_ret'] / df['lab_trgt']
         df['lab_active_order'] = False
         df = self.filter_active_positions(df)
-        df['lab_exit'] = results[['tp_datetime', 'sl_datetime', 'lab_tl']].dropna(how='all').idxmin(axis=1)
-        df['lab_exit'].replace({'tp_datetime': 'tp', 'sl_datetime': 'sl', 'lab_tl': 'tl'}, inplace=True)
-        df = self.calculate_pnl(df, initial_amount_usd, leverage)
+        with profiler.stage('lab_exit', rows=len(df)):
+            df['lab_exit'] = results[['tp_datetime', 'sl_datetime', 'lab_tl']].dropna(how='all').idxmin(axis=1)
+            df['lab_exit'].replace({'tp_datetime': 'tp', 'sl_datetime': 'sl', 'lab_tl': 'tl'}, inplace=True)
+        return df
+
+    @profiled('apply_returns')
+    def apply_returns(self, df, trade_cost):
+        """
+        Calculates the return of every trade once its barriers are known.
+
+        Args:
+            df (pandas.DataFrame): Output of apply_barriers.
+            trade_cost (float): The proportional cost of trading.
+
+        Returns:
+            pandas.DataFrame: DataFrame with return, sign and return over target columns.
+        """
+        df = self.calculate_lab_ret_sign(df, trade_cost)
+        df['lab_ret_target'] = df['lab_ret'] / df['lab_trgt']
         return df
 
     @staticmethod
-    def apply_pt_sl_on_tl(df, ptSl):
+    @profiled('apply_pt_sl_on_tl')
+    def apply_pt_sl_on_tl(df, ptSl, max_batch_size=2 ** 22):
         """
         Applies a profit-taking and stop-loss strategy to the trades based on the triple-barrier method.
 
+        Only rows with a non-zero signal can touch a barrier, so the first-touch search runs on those rows alone,
+        in batches of price paths stacked into a 2-D array.
+
         Args:
             df (pandas.DataFrame): DataFrame containing financial candles.
             ptSl (List[float, float]): List containing the profit-taking and stop-loss values.
+            max_batch_size (int): Maximum number of path prices evaluated at once (default is 2 ** 22).
 
         Returns:
             pandas.DataFrame: DataFrame with the profit-taking and stop-loss values applied to the trades.
         """
         out = df[['close', 'lab_tl', 'strat_signal']].copy(deep=True)
-        if ptSl[0] > 0:
-            pt = ptSl[0] * df['lab_trgt']
-        else:
-            pt = pd.Series(index=df.index)  # NaNs
-        if ptSl[1] > 0:
-            sl = -ptSl[1] * df['lab_trgt']
-        else:
-            sl = pd.Series(index=df.index)  # NaNs
-
-        for loc, tl in df['lab_tl'].fillna(df['close'].index[-1]).iteritems():
-            signal = df.at[loc, 'strat_signal']
-            df0 = df.close[loc:tl]  # path prices
-            df0 = (df0 / df.close[loc] - 1) * signal
-            out.loc[loc, 'strat_signal'] = signal
-            out.loc[loc, 'sl_datetime'] = df0[df0 < sl[loc]].index.min()  # earliest stop loss.
-            out.loc[loc, 'tp_datetime'] = df0[df0 > pt[loc]].index.min()
+        out['sl_datetime'] = pd.NaT
+        out['tp_datetime'] = pd.NaT
+
+        close = df['close'].to_numpy(dtype=float)
+        signal = df['strat_signal'].to_numpy()
+        trgt = df['lab_trgt'].to_numpy(dtype=float)
+        signal_loc = np.flatnonzero(signal != 0)
+        if len(signal_loc) == 0:
+            return out
+
+        # Path of each signal goes from its own candle to the last candle at or before lab_tl (both included)
+        tl = df['lab_tl'].fillna(df['close'].index[-1]).to_numpy(dtype='datetime64[ns]')
+        end_loc = df.index.to_numpy(dtype='datetime64[ns]').searchsorted(tl[signal_loc], side='right')
+        path_len = np.maximum(end_loc - signal_loc, 0)
+        tp_loc, sl_loc = Labeling.get_first_touch(close, signal, trgt, signal_loc, path_len, ptSl, max_batch_size)
+
+        index = df.index.to_numpy(dtype='datetime64[ns]')
+        for column, offset in (('sl_datetime', sl_loc), ('tp_datetime', tp_loc)):
+            touched = offset >= 0
+            values = np.full(len(df), np.datetime64('NaT'), dtype='datetime64[ns]')
+            values[signal_loc[touched]] = index[signal_loc[touched] + offset[touched]]
+            out[column] = values
         return out
 
     @staticmethod
+    def get_first_touch(close, signal, trgt, signal_loc, path_len, ptSl, max_batch_size=2 ** 22, high=None, low=None):
+        """
+        Finds the first candle of each signal path whose return crosses the profit-taking or the stop-loss barrier.
+        With high and low prices, the favourable and adverse extremes of every candle after the entry are checked
+        instead of the close.
+
+        Args:
+            close (numpy.ndarray): Close prices.
+            signal (numpy.ndarray): Signal of every candle.
+            trgt (numpy.ndarray): Target volatility of every candle.
+            signal_loc (numpy.ndarray): Positions of the signals.
+            path_len (numpy.ndarray): Number of candles in the path of each signal, its own candle included.
+            ptSl (List[float, float]): List containing the profit-taking and stop-loss values.
+            max_batch_size (int): Maximum number of path prices evaluated at once (default is 2 ** 22).
+            high (numpy.ndarray): High prices (optional, together with low).
+            low (numpy.ndarray): Low prices (optional, together with high).
+
+        Returns:
+            Tuple[numpy.ndarray, numpy.ndarray]: Offset from the signal candle of the first profit-taking and stop-loss
+                touch of each signal, or -1 when the barrier is not touched.
+        """
+        pt = ptSl[0] * trgt[signal_loc] if ptSl[0] > 0 else np.full(len(signal_loc), np.nan)
+        sl = -ptSl[1] * trgt[signal_loc] if ptSl[1] > 0 else np.full(len(signal_loc), np.nan)
+
+        sl_loc = np.full(len(signal_loc), -1)
+        tp_loc = np.full(len(signal_loc), -1)
+        width = max(int(path_len.max()), 1)
+        padding = np.full(width, np.nan)
+        paths = np.lib.stride_tricks.sliding_window_view(np.concatenate([close, padding]), width)
+        if high is not None:
+            high_paths = np.lib.stride_tricks.sliding_window_view(np.concatenate([high, padding]), width)
+            low_paths = np.lib.stride_tricks.sliding_window_view(np.concatenate([low, padding]), width)
+        step = max(max_batch_size // width, 1)
+        for start in range(0, len(signal_loc), step):
+            batch = slice(start, start + step)
+            loc = signal_loc[batch]
+            in_path = np.arange(width) < path_len[batch, None]
+            if high is None:
+                favourable = adverse = (paths[loc] / close[loc, None] - 1) * signal[loc, None]
+            else:
+                # The range of the entry candle happened before the entry
+                in_path[:, 0] = False
+                long = signal[loc, None] > 0
+                high_returns = (high_paths[loc] / close[loc, None] - 1) * signal[loc, None]
+                low_returns = (low_paths[loc] / close[loc, None] - 1) * signal[loc, None]
+                favourable = np.where(long, high_returns, low_returns)
+                adverse = np.where(long, low_returns, high_returns)
+            sl_loc[batch] = Labeling.first_true(in_path & (adverse < sl[batch, None]))
+            tp_loc[batch] = Labeling.first_true(in_path & (favourable > pt[batch, None]))
+        return tp_loc, sl_loc
+
+    @staticmethod
+    def first_true(mask):
+        """
+        Finds the position of the first True value in each row of a boolean matrix.
+
+        Args:
+            mask (numpy.ndarray): 2-D boolean array.
+
+        Returns:
+            numpy.ndarray: Column of the first True value per row, or -1 when the row has none.
+        """
+        return np.where(mask.any(axis=1), mask.argmax(axis=1), -1)
+
+    @staticmethod
+    @profiled('calculate_lab_ret_sign')
     def calculate_lab_ret_sign(df, trade_cost):
         """
         Calculates the return on each trade and labels each return as positive or negative. lab_ret contains trade cost.
@@ -102,54 +367,64 @@ class Labeling:
         return df
 
     @staticmethod
+    @profiled('filter_active_positions')
     def filter_active_positions(df):
         """
         Filters out any active positions that have ended and ensures that only one position is active at a time.
 
+        Rather than re-checking the barriers candle by candle, the executor jumps from each accepted entry to the
+        candle where its close_datetime is reached and looks up the next signal from there.
+
         Args:
             df (pandas.DataFrame): DataFrame containing financial candles.
 
         Returns:
             pandas.DataFrame: DataFrame with filtered active positions.
         """
-        n_exec = 0
-        tp = 0
-        sl = 0
-        tl = 0
-        side = 0
-        # df = df[df['signal'] != 0]
-        for index, row in df.iterrows():
-            signal = row['strat_signal']
-            if n_exec == 0:
-                if signal != 0:
-                    n_exec = 1
-                    df.loc[df.index == index, 'lab_active_order'] = True
-                    tp = row['lab_tp_order']
-                    sl = row['lab_sl_order']
-                    tl = row['lab_tl']
-                    side = row['strat_signal']
-                else:
-                    row['lab_active_order'] = False
-            elif n_exec == 1:
-                end_tl = index >= tl
-                end_short = (side < 0) & ((row['close'] < tp) | (row['close'] > sl))
-                end_long = (side > 0) & ((row['close'] > tp) | (row['close'] < sl))
-                if end_short | end_long | end_tl:
-                    n_exec = 0
-                    if signal != 0:
-                        n_exec = 1
-                        row['lab_active_order'] = True
-                        tp = row['lab_tp_order']
-                        sl = row['lab_sl_order']
-                        tl = row['lab_tl']
-                        side = row['strat_signal']
-                    else:
-                        row['lab_active_order'] = False
-
+        index = df.index.to_numpy(dtype='datetime64[ns]')
+        signal_loc = np.flatnonzero(df['strat_signal'].to_numpy() != 0)
+        close_datetime = df['close_datetime'].to_numpy(dtype='datetime64[ns]')[signal_loc]
+        df['lab_active_order'], _ = Labeling.run_executor(index, signal_loc, close_datetime)
         return df
 
-    # TODO: include margin limit in for loop
     @staticmethod
+    def run_executor(index, signal_loc, close_datetime, busy_until=None):
+        """
+        Runs the single executor over the signals of a block of candles.
+
+        Args:
+            index (numpy.ndarray): Sorted candle datetimes.
+            signal_loc (numpy.ndarray): Sorted positions of the candles with a non-zero signal.
+            close_datetime (numpy.ndarray): Close datetime of each signal.
+            busy_until (numpy.datetime64): Close datetime of a position still open from a previous block, if any.
+
+        Returns:
+            Tuple[numpy.ndarray, numpy.datetime64]: Active order flag of every candle, and the close datetime of the
+                position still open at the end of the block (None when the executor is free).
+        """
+        # A position holds the executor at least until the candle after its entry, even when it closes on the entry
+        # candle (tl=0 or a barrier touched on it), like the candle by candle executor
+        exit_loc = np.maximum(index.searchsorted(close_datetime, side='left'), signal_loc + 1)
+        active_order = np.zeros(len(index), dtype=bool)
+        loc = -1 if busy_until is None else index.searchsorted(busy_until, side='left')
+        next_signal = signal_loc.searchsorted(loc, side='left')
+        while True:
+            # A signal on the exit candle takes over the executor without being flagged as an active order
+            while next_signal < len(signal_loc) and signal_loc[next_signal] == loc:
+                busy_until = close_datetime[next_signal]
+                loc = exit_loc[next_signal]
+                next_signal = signal_loc.searchsorted(loc, side='left')
+            if next_signal == len(signal_loc):
+                break
+            active_order[signal_loc[next_signal]] = True
+            busy_until = close_datetime[next_signal]
+            loc = exit_loc[next_signal]
+            next_signal = signal_loc.searchsorted(loc, side='left')
+        return active_order, busy_until if loc >= len(index) else None
+
+    # Margin limits and concurrent positions are simulated by preprocessing.portfolio.simulate_portfolio
+    @staticmethod
+    @profiled('calculate_pnl')
     def calculate_pnl(df, initial_amount_usd, leverage):
         """
         Calculates the profit and loss (P&L) of a trading strategy based on the given dataframe of trades.
@@ -164,8 +439,10 @@ class Labeling:
         Returns:
             pd.DataFrame: A Pandas dataframe with the same columns as the input `df`, updated with the calculated P&L.
         """
-        df.loc[df['lab_active_order'], 'lab_amount'] = initial_amount_usd
-        df.loc[df['lab_active_order'], 'lab_margin'] = df['lab_amount'] / leverage
-        df.loc[df['lab_active_order'], 'lab_ret_usd'] = df['lab_amount'] * df['lab_ret']
-        df.loc[df['lab_active_order'], 'lab_cum_pnl'] = df['lab_ret_usd'].cumsum().ffill()
+        # Works on candles and on trade tables alike, an empty trade table included
+        active = df['lab_active_order'].to_numpy(dtype=bool)
+        df['lab_amount'] = np.where(active, initial_amount_usd, np.nan)
+        df['lab_margin'] = df['lab_amount'] / leverage
+        df['lab_ret_usd'] = df['lab_amount'] * df['lab_ret']
+        df['lab_cum_pnl'] = df['lab_ret_usd'].cumsum().where(active)
         return df
@@ -0,0 +1,119 @@
+import math
+
+import pandas as pd
+
+from preprocessing.incremental_indicators import RollingStd
+
+
+class LivePosition:
+    __slots__ = ['entry_time', 'entry_price', 'side', 'tp_ret', 'sl_ret', 'time_limit', 'active']
+
+    def __init__(self, entry_time, entry_price, side, tp_ret, sl_ret, time_limit, active):
+        self.entry_time = entry_time
+        self.entry_price = entry_price
+        self.side = side
+        self.tp_ret = tp_ret
+        self.sl_ret = sl_ret
+        self.time_limit = time_limit
+        self.active = active
+
+
+class LiveLabeling:
+    """
+    Applies the triple-barrier method and the single executor one closed candle at a time, for paper trading. The
+    rolling std behind the barriers and the open position are kept as state, so every candle costs constant time.
+    Entries, exits and returns match Labeling.triple_barrier_analyzer on the same candles.
+    """
+    def __init__(self,
+                 std_span,
+                 tp,
+                 sl,
+                 tl,
+                 initial_amount_usd,
+                 leverage,
+                 trade_cost=0.0006):
+        self.tp = tp
+        self.sl = sl
+        self.tl = pd.Timedelta(minutes=tl)
+        self.initial_amount_usd = initial_amount_usd
+        self.leverage = leverage
+        self.trade_cost = trade_cost
+
+        self.rolling_std = RollingStd(std_span)
+        self.position = None
+        self.last_close = None
+        self.cum_pnl = 0.0
+
+    def update(self, open_time, close, signal):
+        """
+        Processes one closed candle.
+
+        Args:
+            open_time (int): Candle open time in milliseconds.
+            close (float): Close price.
+            signal (int): strat_signal of the candle.
+
+        Returns:
+            List[dict]: Entry and exit events of this candle, in order.
+        """
+        timestamp = pd.Timestamp(open_time, unit='ms')
+        events = []
+        position = self.position
+        if position is not None:
+            exit_type, exit_price, exit_time = None, close, timestamp
+            if timestamp <= position.time_limit:
+                ret = (close / position.entry_price - 1) * position.side
+                if ret > position.tp_ret:
+                    exit_type = 'tp'
+                elif ret < position.sl_ret:
+                    exit_type = 'sl'
+            if exit_type is None and timestamp >= position.time_limit:
+                # Without a candle at the time limit, the position closes at the last price before it. Like
+                # Labeling.label_trades, the exit is dated at the time limit
+                exit_type, exit_time = 'tl', position.time_limit
+                exit_price = close if timestamp == position.time_limit else self.last_close
+            if exit_type is not None:
+                self.position = None
+                if position.active:
+                    events.append(self.close_position_(position, exit_time, exit_type, exit_price))
+
+        trgt = self.rolling_std.update(close) / close
+        self.last_close = close
+        if signal != 0 and not math.isnan(trgt):
+            if self.position is None:
+                # Like the backtest executor, a signal on the exit candle takes over the executor without trading
+                active = position is None
+                self.open_position_(timestamp, close, signal, trgt, active)
+                if active:
+                    events.append({'event': 'entry',
+                                   'datetime': timestamp,
+                                   'side': signal,
+                                   'price': close,
+                                   'tp_order': close * (1 + trgt * self.tp * signal),
+                                   'sl_order': close * (1 - trgt * self.sl * signal),
+                                   'time_limit': self.position.time_limit})
+        return events
+
+    def open_position_(self, timestamp, close, signal, trgt, active):
+        self.position = LivePosition(entry_time=timestamp,
+                                     entry_price=close,
+                                     side=signal,
+                                     tp_ret=self.tp * trgt if self.tp > 0 else math.inf,
+                                     sl_ret=-self.sl * trgt if self.sl > 0 else -math.inf,
+                                     time_limit=timestamp + self.tl,
+                                     active=active)
+
+    def close_position_(self, position, timestamp, exit_type, exit_price):
+        ret = (exit_price / position.entry_price - 1) * position.side - self.trade_cost
+        ret_usd = self.initial_amount_usd * ret
+        self.cum_pnl += ret_usd
+        return {'event': 'exit',
+                'datetime': timestamp,
+                'side': position.side,
+                'price': exit_price,
+                'entry_datetime': position.entry_time,
+                'exit': exit_type,
+                'ret': ret,
+                'ret_usd': ret_usd,
+                'margin': self.initial_amount_usd / self.leverage,
+                'cum_pnl': self.cum_pnl}
@@ -0,0 +1,98 @@
+import numpy as np
+
+
+def get_bootstrap_indexes(n_trades, n_paths, block_size=1, rng=None):
+    """
+    Draws trade indexes for bootstrap paths. With `block_size` > 1 it is a circular block bootstrap: paths are built
+    from runs of consecutive trades, which keeps streaks of wins and losses.
+
+    Args:
+        n_trades (int): Number of trades to resample.
+        n_paths (int): Number of paths.
+        block_size (int): Consecutive trades per block (default is 1, a plain bootstrap).
+        rng (numpy.random.Generator): Random generator (default is a new unseeded one).
+
+    Returns:
+        numpy.ndarray: (n_paths, n_trades) matrix of trade indexes.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    block_size = max(min(block_size, n_trades), 1)
+    if block_size == 1:
+        return rng.integers(0, n_trades, size=(n_paths, n_trades))
+    n_blocks = -(-n_trades // block_size)
+    starts = rng.integers(0, n_trades, size=(n_paths, n_blocks, 1))
+    indexes = (starts + np.arange(block_size)) % n_trades
+    return indexes.reshape(n_paths, -1)[:, :n_trades]
+
+
+def get_path_metrics_(pnl, margin):
+    required_margin = margin + np.maximum(-pnl.min(axis=-1), 0.0)
+    drawdown = np.maximum.accumulate(pnl, axis=-1)
+    np.maximum(drawdown, 0.0, out=drawdown)
+    np.subtract(drawdown, pnl, out=drawdown)
+    return {'final_pnl': pnl[..., -1],
+            'max_drawdown': drawdown.max(axis=-1),
+            'required_margin': required_margin}
+
+
+def measure_pnl(returns, initial_amount_usd, leverage):
+    """
+    Measures the realized trade sequence with the same metrics as bootstrap_pnl.
+
+    Args:
+        returns (array-like): lab_ret of the executed trades, in order.
+        initial_amount_usd (float): Amount of every order in USD.
+        leverage (float): Leverage value.
+
+    Returns:
+        Dict[str, float]: 'final_pnl', 'max_drawdown' and 'required_margin'.
+    """
+    returns = np.asarray(returns, dtype=float)
+    if len(returns) == 0:
+        return {'final_pnl': 0.0, 'max_drawdown': 0.0, 'required_margin': 0.0}
+    metrics = get_path_metrics_(np.cumsum(initial_amount_usd * returns), initial_amount_usd / leverage)
+    return {key: float(value) for key, value in metrics.items()}
+
+
+def bootstrap_pnl(returns,
+                  initial_amount_usd,
+                  leverage,
+                  n_paths=10000,
+                  block_size=1,
+                  seed=None,
+                  max_batch_size=2 ** 22):
+    """
+    Resamples the returns of the executed trades into many alternative trade sequences and measures each one. All
+    paths of a batch are a single matrix, so the whole run is a handful of NumPy operations.
+
+    Args:
+        returns (array-like): lab_ret of the executed trades, in order.
+        initial_amount_usd (float): Amount of every order in USD.
+        leverage (float): Leverage value.
+        n_paths (int): Number of bootstrap paths (default is 10000).
+        block_size (int): Consecutive trades per block, 1 for a plain bootstrap (default is 1).
+        seed (int): Random seed, for reproducible results.
+        max_batch_size (int): Maximum number of path trades evaluated at once (default is 2 ** 22).
+
+    Returns:
+        Dict[str, numpy.ndarray]: Per path 'final_pnl', 'max_drawdown' (from the running PnL peak, in USD) and
+            'required_margin' (order margin plus the deepest PnL below zero, i.e. the portfolio value needed to never
+            run out of margin).
+    """
+    returns = np.asarray(returns, dtype=float)
+    results = {'final_pnl': np.zeros(n_paths),
+               'max_drawdown': np.zeros(n_paths),
+               'required_margin': np.zeros(n_paths)}
+    if len(returns) == 0:
+        return results
+
+    rng = np.random.default_rng(seed)
+    ret_usd = initial_amount_usd * returns
+    step = max(max_batch_size // len(returns), 1)
+    for start in range(0, n_paths, step):
+        batch = slice(start, min(start + step, n_paths))
+        pnl = ret_usd[get_bootstrap_indexes(len(returns), batch.stop - batch.start, block_size, rng)]
+        np.cumsum(pnl, axis=1, out=pnl)
+        for key, values in get_path_metrics_(pnl, initial_amount_usd / leverage).items():
+            results[key][batch] = values
+    return results
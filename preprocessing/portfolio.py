@@ -0,0 +1,144 @@
+import heapq
+
+import numpy as np
+import pandas as pd
+
+TRADE_STATUS = ['filled', 'resized', 'rejected_positions', 'rejected_margin']
+
+
+def simulate_portfolio(df: pd.DataFrame,
+                       portfolio_initial_value,
+                       initial_amount_usd,
+                       leverage,
+                       max_positions=1,
+                       resize_orders=False):
+    """
+    Event-driven portfolio with up to `max_positions` concurrent positions. Open positions are kept in a heap ordered
+    by the candle that releases them, so each signal only releases the positions closed before it: O(signals * log K)
+    overall.
+
+    An order needs `initial_amount_usd / leverage` of margin out of the free equity (portfolio value plus realized
+    PnL minus the margin of the open positions). When it does not fit, it is rejected, or resized to the free margin
+    with `resize_orders`.
+
+    Executors are handed over like in Labeling.run_executor, so with one position and enough margin the filled
+    signals are the `lab_active_order` ones: a position holds its executor at least until the candle after its entry,
+    and a signal that finds every executor busy, one of them closing on its candle, takes that executor over without
+    an order (it is rejected, and keeps the executor until its own close).
+
+    Args:
+        df (pandas.DataFrame): Trade table of Labeling.label_trades, or candles labeled by Labeling.apply_returns
+            (only the trade table matches the executor on positions that close on their entry candle).
+        portfolio_initial_value (float): Starting equity in USD.
+        initial_amount_usd (float): Amount of every order in USD.
+        leverage (float): Leverage value.
+        max_positions (int): Maximum number of positions open at the same time (default is 1).
+        resize_orders (bool): Whether to shrink orders to the free margin instead of rejecting them (default is False).
+
+    Returns:
+        Tuple[pandas.DataFrame, pandas.DataFrame]: Every signal indexed by entry datetime with its status, amount,
+            margin and USD return, and the equity curve with margin used and open positions after every entry and exit.
+    """
+    signal_loc = np.flatnonzero(df['strat_signal'].to_numpy() != 0)
+    entry_times = df.index.to_numpy(dtype='datetime64[ns]')[signal_loc].astype(np.int64)
+    close_times = df['close_datetime'].to_numpy(dtype='datetime64[ns]')[signal_loc].astype(np.int64)
+    returns = df['lab_ret'].to_numpy(dtype=float)[signal_loc]
+    if 'exit_loc' in df:
+        # Trade table: candle positions of the entries and exits
+        entry_locs = df['candle_loc'].to_numpy()[signal_loc]
+        exit_locs = df['exit_loc'].to_numpy()[signal_loc]
+    else:
+        # Candles or signal rows: times stand for the candles, so a position closing on its entry candle is only held
+        # until its entry
+        entry_locs = entry_times
+        exit_locs = close_times
+    release_locs = np.maximum(exit_locs, entry_locs + 1)
+
+    status = np.zeros(len(signal_loc), dtype=np.int8)
+    amounts = np.zeros(len(signal_loc))
+    event_times, event_equity, event_margin, event_positions = [], [], [], []
+    # Executors in use, as (release candle, close time, signal, margin, USD return, whether it holds an order)
+    executors = []
+    open_orders = 0
+    realized = 0.0
+    margin_used = 0.0
+
+    def record_event(time):
+        event_times.append(time)
+        event_equity.append(portfolio_initial_value + realized)
+        event_margin.append(margin_used)
+        event_positions.append(open_orders)
+
+    def release_executor(executor):
+        nonlocal realized, margin_used, open_orders
+        _, close_time, _, margin, ret_usd, is_order = executor
+        if is_order:
+            realized += ret_usd
+            margin_used -= margin
+            open_orders -= 1
+            record_event(close_time)
+
+    for signal, (entry_loc, release_loc, entry_time, close_time, ret) in enumerate(zip(entry_locs.tolist(),
+                                                                                       release_locs.tolist(),
+                                                                                       entry_times.tolist(),
+                                                                                       close_times.tolist(),
+                                                                                       returns.tolist())):
+        while executors and executors[0][0] < entry_loc:
+            release_executor(heapq.heappop(executors))
+        take_over = len(executors) >= max_positions
+        if take_over and executors[0][0] > entry_loc:
+            status[signal] = 2
+            continue
+        # Positions closing on this candle free their executor and margin for the signal
+        while executors and executors[0][0] == entry_loc:
+            release_executor(heapq.heappop(executors))
+        if take_over:
+            status[signal] = 2
+            heapq.heappush(executors, (release_loc, close_time, signal, 0.0, 0.0, False))
+            continue
+        amount = initial_amount_usd
+        free_margin = portfolio_initial_value + realized - margin_used
+        if amount / leverage > free_margin:
+            # Rounding can leave a few ulps of free margin, which should not open a dust position
+            if not resize_orders or free_margin <= 1e-9 * portfolio_initial_value:
+                status[signal] = 3
+                continue
+            amount = free_margin * leverage
+            status[signal] = 1
+        amounts[signal] = amount
+        margin_used += amount / leverage
+        open_orders += 1
+        heapq.heappush(executors, (release_loc, close_time, signal, amount / leverage, amount * ret, True))
+        record_event(entry_time)
+    while executors:
+        release_executor(heapq.heappop(executors))
+
+    executed = status < 2
+    trades = pd.DataFrame({'side': df['strat_signal'].to_numpy()[signal_loc],
+                           'status': pd.Categorical.from_codes(status, TRADE_STATUS),
+                           'amount': np.where(executed, amounts, np.nan),
+                           'margin': np.where(executed, amounts / leverage, np.nan),
+                           'ret_usd': np.where(executed, amounts * returns, np.nan),
+                           'close_datetime': pd.to_datetime(close_times)},
+                          index=df.index[signal_loc])
+    equity = pd.DataFrame({'equity': event_equity,
+                           'margin_used': event_margin,
+                           'open_positions': event_positions},
+                          index=pd.to_datetime(np.asarray(event_times, dtype=np.int64)))
+    return trades, equity
+
+
+def summarize_portfolio(trades: pd.DataFrame, equity: pd.DataFrame, portfolio_initial_value):
+    """
+    Args:
+        trades (pandas.DataFrame): Trades returned by simulate_portfolio.
+        equity (pandas.DataFrame): Equity curve returned by simulate_portfolio.
+        portfolio_initial_value (float): Starting equity in USD.
+
+    Returns:
+        dict: Final equity, maximum margin used, maximum open positions and the number of signals per status.
+    """
+    return {'final_equity': equity['equity'].iloc[-1] if len(equity) else portfolio_initial_value,
+            'max_margin_used': equity['margin_used'].max() if len(equity) else 0.0,
+            'max_open_positions': int(equity['open_positions'].max()) if len(equity) else 0,
+            **trades['status'].value_counts().reindex(TRADE_STATUS, fill_value=0).astype(int).to_dict()}
@@ -0,0 +1,253 @@
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+# tracemalloc is process-wide: it runs while any thread profiles memory. The lock is reentrant, since a lease can be
+# released by the garbage collector while the lock is held
+_tracing_lock = threading.RLock()
+_tracing_users = 0
+
+
+def start_tracing_():
+    global _tracing_users
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracing_users += 1
+
+
+def stop_tracing_():
+    global _tracing_users
+    with _tracing_lock:
+        _tracing_users = max(_tracing_users - 1, 0)
+        if _tracing_users == 0:
+            tracemalloc.stop()
+
+
+class TracingLease:
+    """
+    One thread's use of tracemalloc. It is released once, by stop() or, for a profile that was never stopped, when
+    the state of its finished thread is freed.
+    """
+    def __init__(self):
+        start_tracing_()
+        self.active = True
+
+    def release(self):
+        if self.active:
+            self.active = False
+            stop_tracing_()
+
+    def __del__(self):
+        self.release()
+
+
+class StageRecord:
+    __slots__ = ['name', 'depth', 'start', 'wall_time', 'cpu_time', 'peak_memory', 'rows', 'start_memory',
+                 'peak_before', 'child_peak']
+
+    def __init__(self, name, depth):
+        self.name = name
+        self.depth = depth
+        self.start = None
+        self.wall_time = None
+        self.cpu_time = None
+        self.peak_memory = None
+        self.rows = None
+
+    def to_dict(self):
+        return {'name': self.name,
+                'depth': self.depth,
+                'start': self.start,
+                'wall_time': self.wall_time,
+                'cpu_time': self.cpu_time,
+                'peak_memory': self.peak_memory,
+                'rows': self.rows}
+
+
+class NullStage:
+    """
+    Context returned while profiling is off: entering it and setting rows on it does nothing.
+    """
+    __slots__ = ['rows']
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_STAGE = NullStage()
+
+
+class ProfiledStage:
+    def __init__(self, profiler, name, rows):
+        self.profiler = profiler
+        self.record = StageRecord(name, len(profiler.stack))
+        self.record.rows = rows
+
+    def __enter__(self):
+        record = self.record
+        if self.profiler.trace_memory:
+            record.start_memory, record.peak_before = tracemalloc.get_traced_memory()
+            record.child_peak = 0
+            tracemalloc.reset_peak()
+        self.profiler.stack.append(record)
+        record.start = time.perf_counter() - self.profiler.origin
+        self.cpu_start = time.process_time()
+        return record
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        record = self.record
+        record.wall_time = time.perf_counter() - self.profiler.origin - record.start
+        record.cpu_time = time.process_time() - self.cpu_start
+        self.profiler.stack.pop()
+        if self.profiler.trace_memory:
+            peak = max(tracemalloc.get_traced_memory()[1], record.child_peak)
+            record.peak_memory = peak - record.start_memory
+            # Nested stages reset the peak, so their parent keeps the highest one seen
+            if self.profiler.stack:
+                parent = self.profiler.stack[-1]
+                parent.child_peak = max(parent.child_peak, peak, record.peak_before)
+        self.profiler.records.append(record)
+        return False
+
+
+class ProfilerState(threading.local):
+    def __init__(self):
+        self.enabled = False
+        self.trace_memory = False
+        self.tracing = None
+        self.records = []
+        self.stack = []
+        self.origin = time.perf_counter()
+
+
+class Profiler:
+    """
+    Records wall time, CPU time, peak traced memory and row count of named pipeline stages. While disabled, stage()
+    returns a shared no-op context, so instrumented code pays one attribute check per stage.
+
+    Its state is kept per thread, so the sessions of the app, which run their scripts on their own threads, profile
+    independently. Peak memory is measured by the process-wide tracemalloc, so it includes the allocations of other
+    threads profiling at the same time.
+    """
+    def __init__(self):
+        self.state = ProfilerState()
+
+    @property
+    def enabled(self):
+        return self.state.enabled
+
+    @property
+    def trace_memory(self):
+        return self.state.trace_memory
+
+    @property
+    def records(self):
+        return self.state.records
+
+    @property
+    def stack(self):
+        return self.state.stack
+
+    @property
+    def origin(self):
+        return self.state.origin
+
+    def start(self, trace_memory=True):
+        """
+        Clears the previous records and starts profiling.
+
+        Args:
+            trace_memory (bool): Whether to measure peak memory with tracemalloc, which slows allocations down.
+        """
+        state = self.state
+        if state.enabled:
+            self.stop()
+        state.records = []
+        state.stack = []
+        state.origin = time.perf_counter()
+        state.trace_memory = trace_memory
+        if trace_memory:
+            state.tracing = TracingLease()
+        state.enabled = True
+
+    def stop(self):
+        """
+        Stops profiling and keeps the records. Safe to call when profiling is off.
+        """
+        state = self.state
+        state.enabled = False
+        if state.tracing is not None:
+            state.tracing.release()
+            state.tracing = None
+        state.trace_memory = False
+
+    def stage(self, name, rows=None):
+        """
+        Context manager that profiles the enclosed block. Rows can also be set on the returned record.
+
+        Args:
+            name (str): Stage name.
+            rows (int): Number of rows processed, if known up front.
+        """
+        if not self.enabled:
+            return NULL_STAGE
+        return ProfiledStage(self, name, rows)
+
+    def get_records(self):
+        """
+        Returns:
+            List[dict]: Finished stages in start order.
+        """
+        return [record.to_dict() for record in sorted(self.records, key=lambda record: record.start)]
+
+    def to_json(self):
+        return json.dumps(self.get_records(), indent=2)
+
+    def to_chrome_trace(self):
+        """
+        Returns:
+            str: The records in Chrome trace event format, to open in chrome://tracing or Perfetto.
+        """
+        events = [{'name': record['name'],
+                   'ph': 'X',
+                   'ts': record['start'] * 10 ** 6,
+                   'dur': record['wall_time'] * 10 ** 6,
+                   'pid': os.getpid(),
+                   'tid': 0,
+                   'args': {'cpu_time': record['cpu_time'],
+                            'peak_memory': record['peak_memory'],
+                            'rows': record['rows']}}
+                  for record in self.get_records()]
+        return json.dumps({'traceEvents': events, 'displayTimeUnit': 'ms'})
+
+
+def profiled(name):
+    """
+    Decorator that profiles every call of a function as a stage. The row count is the length of the result when it
+    has one.
+
+    Args:
+        name (str): Stage name.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return func(*args, **kwargs)
+            with profiler.stage(name) as record:
+                result = func(*args, **kwargs)
+                record.rows = len(result) if hasattr(result, '__len__') else None
+            return result
+        return wrapper
+    return decorator
+
+
+# Profiler used by the instrumented pipeline stages, with separate state on every thread
+profiler = Profiler()
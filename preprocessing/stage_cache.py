@@ -0,0 +1,153 @@
+import hashlib
+import sys
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+from cachetools import LRUCache
+
+
+def get_fingerprint(df: pd.DataFrame, columns=None):
+    """
+    Hashes the content of a DataFrame, so that equal candles give equal keys regardless of object identity.
+
+    Args:
+        df (pandas.DataFrame): DataFrame to hash.
+        columns (List[str]): Columns to include (default is all of them).
+
+    Returns:
+        str: Hex digest of the selected columns, their names and the index.
+    """
+    df = df if columns is None else df[columns]
+    digest = hashlib.sha1(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    digest.update(','.join(map(str, df.columns)).encode())
+    return digest.hexdigest()
+
+
+def get_nbytes(value):
+    """
+    Estimates the memory held by a cached value: DataFrames, Series and arrays by their buffers, containers by the sum
+    of their items.
+
+    Args:
+        value (Any): Cached value.
+
+    Returns:
+        int: Size in bytes.
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(np.sum(value.memory_usage(index=True, deep=True)))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(get_nbytes(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(get_nbytes(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class CountingLRUCache(LRUCache):
+    """
+    LRUCache that counts the entries it evicts to make room for new ones.
+    """
+    def __init__(self, maxsize, getsizeof=None):
+        super().__init__(maxsize=maxsize, getsizeof=getsizeof)
+        self.evictions = 0
+
+    def popitem(self):
+        item = super().popitem()
+        self.evictions += 1
+        return item
+
+
+class StageCache:
+    """
+    Keeps the output of each pipeline stage keyed by the stage name and the inputs it depends on, so that a rerun
+    only recomputes the stages whose inputs changed.
+
+    A single instance can be shared by every session of the app: it is thread-safe, concurrent callers of a stage
+    that is being computed wait for that computation instead of running it again, and entries are evicted least
+    recently used first once they exceed the memory budget.
+    """
+    def __init__(self, max_bytes=2 ** 30):
+        self.cache = CountingLRUCache(maxsize=max_bytes, getsizeof=get_nbytes)
+        self.lock = threading.Lock()
+        # Computations in progress, by cache key
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+
+    @property
+    def nbytes(self):
+        return self.cache.currsize
+
+    @property
+    def max_bytes(self):
+        return self.cache.maxsize
+
+    @property
+    def evictions(self):
+        return self.cache.evictions
+
+    def get_stats(self):
+        with self.lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'waits': self.waits,
+                    'evictions': self.evictions,
+                    'entries': len(self.cache),
+                    'nbytes': self.nbytes,
+                    'max_bytes': self.max_bytes}
+
+    def run(self, stage, key, compute):
+        """
+        Returns the cached output of a stage or computes and stores it. While it is computed, other callers with the
+        same stage and key wait for it. If the computation fails, they run it themselves.
+
+        Args:
+            stage (str): Stage name.
+            key (tuple): Hashable inputs of the stage.
+            compute (Callable[[], Any]): Function that computes the stage output.
+
+        Returns:
+            Any: The stage output. It is shared with later callers, so it must not be modified in place.
+        """
+        cache_key = (stage, key)
+        while True:
+            with self.lock:
+                if cache_key in self.cache:
+                    self.hits += 1
+                    return self.cache[cache_key]
+                pending = self.pending.get(cache_key)
+                if pending is None:
+                    self.misses += 1
+                    pending = self.pending[cache_key] = Future()
+                    break
+                self.waits += 1
+            try:
+                return pending.result()
+            except BaseException:
+                continue
+
+        try:
+            value = compute()
+        except BaseException as error:
+            with self.lock:
+                del self.pending[cache_key]
+            pending.set_exception(error)
+            raise
+        with self.lock:
+            try:
+                self.cache[cache_key] = value
+            except ValueError:
+                # Larger than the whole budget: returned but not kept
+                pass
+            del self.pending[cache_key]
+        pending.set_result(value)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
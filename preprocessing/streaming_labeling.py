@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+
+from preprocessing.labeling import Labeling
+
+
+def iter_strategy_chunks(chunks, strategy, lookback):
+    """
+    Applies a strategy to a stream of candle chunks. Each chunk is run together with the last `lookback` candles of
+    the previous ones, so its indicators are warmed up like on the whole history, and only the chunk's rows are
+    yielded.
+
+    Args:
+        chunks (Iterable[pandas.DataFrame]): Time-ordered candles.
+        strategy (Callable[[pandas.DataFrame], pandas.DataFrame]): Adds a `strat_signal` column to candles.
+        lookback (int): Candles carried from one chunk to the next, at least the longest indicator window.
+
+    Yields:
+        pandas.DataFrame: Candles of every chunk with the strategy columns.
+    """
+    tail = None
+    for chunk in chunks:
+        window = chunk if tail is None else pd.concat([tail, chunk], ignore_index=True)
+        df = strategy(window)
+        yield df.iloc[len(window) - len(chunk):].reset_index(drop=True)
+        tail = window.iloc[-lookback:] if lookback > 0 else window.iloc[:0]
+
+
+class StreamingLabeling:
+    """
+    Applies the triple-barrier method to candles that arrive in time-ordered chunks, so the whole history never has
+    to be in memory. Each block of candles is labeled together with `std_span - 1` rows of lookback for the rolling
+    std and every candle up to `tl` minutes ahead for the barriers. The executor and the cumulative PnL are carried
+    from one block to the next.
+    """
+    def __init__(self,
+                 std_span,
+                 tp,
+                 sl,
+                 tl,
+                 initial_amount_usd,
+                 leverage,
+                 trade_cost=0.0006):
+        self.std_span = std_span
+        self.tp = tp
+        self.sl = sl
+        self.tl = tl
+        self.initial_amount_usd = initial_amount_usd
+        self.leverage = leverage
+        self.trade_cost = trade_cost
+
+        self.lb = Labeling()
+        self.lookback = None
+        self.pending = None
+        self.busy_until = None
+        self.cum_pnl = 0.0
+
+    def iter_labeled_chunks(self, chunks):
+        """
+        Labels a stream of candle chunks.
+
+        Args:
+            chunks (Iterable[pandas.DataFrame]): Time-ordered candles with `open_time` (ms), `close` and
+                `strat_signal` columns. Chunk sizes do not need to match `std_span` or `tl`.
+
+        Yields:
+            pandas.DataFrame: Labeled candles, with the same columns as Labeling.triple_barrier_analyzer. Candles are
+                yielded once their `tl` lookahead is complete, so the last ones come out when the stream ends.
+        """
+        for chunk in chunks:
+            self.pending = chunk if self.pending is None else pd.concat([self.pending, chunk])
+            if len(self.pending) == 0:
+                continue
+            # Candles whose time limit is already covered by the pending candles can be labeled
+            ready = (self.pending['open_time'] + self.tl * 60 * 10 ** 3 <= self.pending['open_time'].iloc[-1]).sum()
+            if ready > 0:
+                yield from self.label_block_(ready)
+        if self.pending is not None and len(self.pending) > 0:
+            yield from self.label_block_(len(self.pending))
+
+    def label_block_(self, size):
+        core = self.pending.iloc[:size]
+        window = self.pending if self.lookback is None else pd.concat([self.lookback, self.pending])
+        seen = core if self.lookback is None else pd.concat([self.lookback, core])
+        self.lookback = seen.iloc[-(self.std_span - 1):] if self.std_span > 1 else seen.iloc[:0]
+        self.pending = self.pending.iloc[size:]
+
+        df = self.lb.apply_barriers(window.copy(), std_span=self.std_span, tp=self.tp, sl=self.sl, tl=self.tl)
+        df = self.lb.apply_returns(df, trade_cost=self.trade_cost)
+        df = df[(df['open_time'] >= core['open_time'].iloc[0]) & (df['open_time'] <= core['open_time'].iloc[-1])]
+        if len(df) == 0:
+            # Every candle of the block was still inside the first rolling std window
+            return
+
+        # The executor ran on the whole window inside apply_barriers, rerun it on this block with the carried state
+        signal_loc = np.flatnonzero(df['strat_signal'].to_numpy() != 0)
+        close_datetime = df['close_datetime'].to_numpy(dtype='datetime64[ns]')[signal_loc]
+        active_order, self.busy_until = self.lb.run_executor(df.index.to_numpy(dtype='datetime64[ns]'),
+                                                             signal_loc,
+                                                             close_datetime,
+                                                             self.busy_until)
+        df = df.copy()
+        df['lab_active_order'] = active_order
+        df = self.lb.calculate_pnl(df, self.initial_amount_usd, self.leverage)
+        if active_order.any():
+            df.loc[df['lab_active_order'], 'lab_cum_pnl'] += self.cum_pnl
+            self.cum_pnl = df.loc[df['lab_active_order'], 'lab_cum_pnl'].iloc[-1]
+        yield df
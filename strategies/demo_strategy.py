@@ -1,7 +1,38 @@
+import itertools
+
 import pandas as pd
-import pandas_ta as ta  # noqa: F401
 import numpy as np
 
+from preprocessing import batch_indicators
+from preprocessing.incremental_indicators import BollingerBands, MACD
+from preprocessing.indicator_cache import bbands, macd
+
+# Parameter grid evaluated through strategy_batch by the walk-forward optimization
+BATCH_PARAMS = {'bb_lenght': [50, 100, 200],
+                'macd_fast': [12, 45],
+                'macd_slow': [26, 90],
+                'macd_signal': [9]}
+
+
+def get_batch_params():
+    """
+    Parameter sets of BATCH_PARAMS for strategy_batch, leaving out the MACD spans whose fast EMA is not shorter than
+    the slow one.
+
+    Returns:
+        List[dict]: One dict per combination.
+    """
+    grid = [dict(zip(BATCH_PARAMS.keys(), values)) for values in itertools.product(*BATCH_PARAMS.values())]
+    return [p for p in grid if p['macd_fast'] < p['macd_slow']]
+
+
+def get_bb_conditions(bbp):
+    return (0 < bbp) & (bbp < 0.2), (1 > bbp) & (bbp > 0.8)
+
+
+def get_macd_conditions(macd_line, macd_hist):
+    return (macd_hist > 0) & (macd_line < 0), (macd_hist < 0) & (macd_line > 0)
+
 
 def strategy(df: pd.DataFrame):
     bb_lenght = 100
@@ -9,18 +40,69 @@ def strategy(df: pd.DataFrame):
     macd_slow = 90
     macd_signal = 9
     df = df.reset_index(drop=True)
-    df.ta.bbands(length=bb_lenght, append=True)
-    df.ta.macd(fast=macd_fast, slow=macd_slow, signal=macd_signal, append=True)
-    df['macd'] = df[f"MACD_{macd_fast}_{macd_slow}_{macd_signal}"]
-    df['macd_hist'] = df[f"MACDh_{macd_fast}_{macd_slow}_{macd_signal}"]
-    df['macd_signal'] = df[f"MACDs_{macd_fast}_{macd_slow}_{macd_signal}"]
-    df['bbl'] = df[f'BBL_{bb_lenght}_2.0']
-    df['bbu'] = df[f'BBU_{bb_lenght}_2.0']
-    df['bbp'] = df[f"BBP_{bb_lenght}_2.0"]
-    df['bbm'] = df[f"BBM_{bb_lenght}_2.0"]
-    df['strat_signal'] = np.where((0 < df['bbp']) & (df['bbp'] < 0.2) & (df['macd_hist'] > 0) & (df['macd'] < 0),
-                                  1,
-                                  np.where((1 > df['bbp']) & (df['bbp'] > 0.8) & (df['macd_hist'] < 0) & (df['macd'] > 0),
-                                           -1,
-                                           0))
+    bb = bbands(df, length=bb_lenght, std=2.0)
+    macd_result = macd(df, fast=macd_fast, slow=macd_slow, signal=macd_signal)
+    df['macd'] = macd_result['macd']
+    df['macd_hist'] = macd_result['hist']
+    df['macd_signal'] = macd_result['signal']
+    df['bbl'] = bb['lower']
+    df['bbu'] = bb['upper']
+    df['bbp'] = bb['percent']
+    df['bbm'] = bb['mid']
+    bb_long, bb_short = get_bb_conditions(df['bbp'])
+    macd_long, macd_short = get_macd_conditions(df['macd'], df['macd_hist'])
+    df['strat_signal'] = np.where(bb_long & macd_long, 1, np.where(bb_short & macd_short, -1, 0))
     return df
+
+
+def strategy_batch(df: pd.DataFrame, params):
+    """
+    Evaluates many parameter sets of the strategy at once. Indicators are computed once per distinct Bollinger length
+    and MACD spans, as 2-D arrays.
+
+    Args:
+        df (pandas.DataFrame): Candles with a close column.
+        params (List[dict]): Parameter sets with bb_lenght, macd_fast, macd_slow and macd_signal keys.
+
+    Returns:
+        numpy.ndarray: int8 strat_signal matrix with one row per candle and one column per parameter set.
+    """
+    close = df['close'].to_numpy(dtype=float)
+    bb_lenghts = sorted({p['bb_lenght'] for p in params})
+    macd_spans = sorted({(p['macd_fast'], p['macd_slow'], p['macd_signal']) for p in params})
+    bb = batch_indicators.bbands(close, bb_lenghts, std=2.0)
+    macd_result = batch_indicators.macd(close, macd_spans)
+    bb_conditions = {length: get_bb_conditions(bb['percent'][:, column])
+                     for column, length in enumerate(bb_lenghts)}
+    macd_conditions = {spans: get_macd_conditions(macd_result['macd'][:, column], macd_result['hist'][:, column])
+                       for column, spans in enumerate(macd_spans)}
+
+    signals = np.zeros((len(df), len(params)), dtype=np.int8, order='F')
+    for column, p in enumerate(params):
+        bb_long, bb_short = bb_conditions[p['bb_lenght']]
+        macd_long, macd_short = macd_conditions[(p['macd_fast'], p['macd_slow'], p['macd_signal'])]
+        signals[:, column] = np.where(bb_long & macd_long, 1, np.where(bb_short & macd_short, -1, 0))
+    return signals
+
+
+class LiveStrategy:
+    """
+    Same signal as strategy, updated one closed candle at a time in constant time.
+    """
+    def __init__(self, bb_lenght=100, macd_fast=45, macd_slow=90, macd_signal=9):
+        self.bb = BollingerBands(length=bb_lenght, std=2.0)
+        self.macd = MACD(fast=macd_fast, slow=macd_slow, signal=macd_signal)
+
+    def update(self, candle):
+        """
+        Args:
+            candle (dict): Closed candle with a close price.
+
+        Returns:
+            int: strat_signal of the candle.
+        """
+        _, _, _, bbp = self.bb.update(candle['close'])
+        macd_line, macd_hist, _ = self.macd.update(candle['close'])
+        bb_long, bb_short = get_bb_conditions(bbp)
+        macd_long, macd_short = get_macd_conditions(macd_line, macd_hist)
+        return 1 if bb_long and macd_long else -1 if bb_short and macd_short else 0
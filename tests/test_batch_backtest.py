@@ -0,0 +1,63 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic_candles import generate_candles
+from connector.candle_store import STORE_COLUMNS, CandleStore
+from optimization.batch_backtest import get_leaderboard, iter_batch_backtest
+from optimization.parameter_sweep import summarize_labeling
+from preprocessing.labeling import Labeling
+
+PARAMS = {'std_span': 50, 'tp': 1.0, 'sl': 0.75, 'tl': 120, 'initial_amount_usd': 15.0, 'leverage': 20.0,
+          'trade_cost': 0.0006}
+
+
+def strategy(candles):
+    # Worker processes import this module by name: a crossing of a rolling mean, with no pandas_ta needed
+    df = candles.copy()
+    side = np.sign(df['close'] - df['close'].rolling(20).mean()).fillna(0)
+    df['strat_signal'] = side.where(side != side.shift(), 0)
+    return df
+
+
+def store_candles_(root, ticker, seed):
+    candles = generate_candles(2000, seed=seed)
+    candles['close_time'] = candles['open_time'] + 60 * 10 ** 3 - 1
+    for column in STORE_COLUMNS:
+        if column not in candles:
+            candles[column] = 0.0
+    store = CandleStore(fetch=None, root=root)
+    store.write(ticker, '1m', candles[STORE_COLUMNS],
+                [[int(candles['open_time'].iloc[0]), int(candles['close_time'].iloc[-1]) + 1]])
+    return store.read(ticker, '1m')
+
+
+def test_batch_matches_label_trades(tmp_path):
+    root = str(tmp_path)
+    # A symbol whose file is unreadable
+    path = CandleStore(fetch=None, root=root).get_path('XRPUSDT', '1m')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as file:
+        file.write('not a parquet file')
+    expected = {ticker: summarize_labeling(Labeling().label_trades(strategy(store_candles_(root, ticker, seed)),
+                                                                   **PARAMS))
+                for seed, ticker in enumerate(['BTCUSDT', 'ETHUSDT'])}
+
+    results = list(iter_batch_backtest(['BTCUSDT', 'ETHUSDT', 'XRPUSDT'], '1m', 'tests.test_batch_backtest',
+                                       store_root=root, max_workers=2, **PARAMS))
+    by_ticker = {result['ticker']: result for result in results}
+    assert set(by_ticker) == {'BTCUSDT', 'ETHUSDT', 'XRPUSDT'}
+    for ticker, summary in expected.items():
+        assert by_ticker[ticker]['error'] is None
+        assert by_ticker[ticker]['candles'] == 2000
+        for key, value in summary.items():
+            np.testing.assert_allclose(float(by_ticker[ticker][key]), float(value), rtol=1e-12, err_msg=key)
+    # The broken symbol fails on its own without stopping the batch
+    assert by_ticker['XRPUSDT']['error'] is not None
+
+    leaderboard = get_leaderboard(results)
+    assert leaderboard.index.tolist() == [1, 2, 3]
+    assert leaderboard['ticker'].iloc[-1] == 'XRPUSDT'
+    assert leaderboard['global_pnl'].iloc[0] == max(summary['global_pnl'] for summary in expected.values())
+    assert pd.isna(leaderboard['global_pnl'].iloc[-1])
@@ -0,0 +1,40 @@
+import json
+
+from benchmarks.run_benchmarks import find_regressions, main
+
+
+def record_(stage, seconds, size=1000):
+    return {'size': size, 'stage': stage, 'seconds': seconds}
+
+
+def test_find_regressions():
+    baseline = [record_('get_trade_barriers', 1.0), record_('calculate_pnl', 0.01), record_('charts', 2.0)]
+    records = [record_('get_trade_barriers', 1.3),  # 30 % slower
+               record_('calculate_pnl', 0.02),  # twice as slow, but only by 10 ms
+               record_('charts', None),  # skipped
+               record_('strategy', 5.0),  # not in the baseline
+               record_('get_trade_barriers', 9.0, size=10000)]  # no baseline for this size
+    assert find_regressions(records, baseline, tolerance=0.25, min_seconds=0.05) == [
+        'get_trade_barriers at 1000 candles: 1.300s (baseline 1.000s)']
+    assert find_regressions(records, baseline, tolerance=0.5, min_seconds=0.05) == []
+    assert len(find_regressions(records, baseline, tolerance=0.25, min_seconds=0.0)) == 2
+
+
+def test_main_fails_on_regression(tmp_path):
+    output, baseline = str(tmp_path / 'results.json'), str(tmp_path / 'baseline.json')
+    args = ['--sizes', '500', '--repeat', '1', '--no-memory', '--output', output, '--baseline', baseline]
+    # Nothing to compare against yet
+    assert main(args) == 0
+    assert main(args + ['--update-baseline']) == 0
+    with open(baseline) as file:
+        report = json.load(file)
+    assert {record['stage'] for record in report['records']} >= {'get_trade_barriers', 'calculate_pnl'}
+
+    # A baseline much faster than this machine makes the run fail
+    for record in report['records']:
+        if record['seconds'] is not None:
+            record['seconds'] = 0.0
+    with open(baseline, 'w') as file:
+        json.dump(report, file)
+    assert main(args + ['--tolerance', '0', '--min-seconds', '0']) == 1
+    assert main(args + ['--min-seconds', '1000']) == 0
@@ -0,0 +1,83 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+import websockets
+
+from connector import binance_stream
+from connector.binance_stream import iter_closed_klines
+
+MINUTE = 60 * 10 ** 3
+START = 1678158000000
+
+
+def get_message_(open_time, closed=True):
+    return json.dumps({'e': 'kline', 'k': {'t': open_time, 'o': '100', 'h': '101', 'l': '99', 'c': '100.5',
+                                           'v': '10', 'x': closed}})
+
+
+class StreamServer:
+    """
+    Local kline stream. `sessions` holds the open times sent on every connection, which is closed after them.
+    """
+    def __init__(self, sessions, close_code=1000):
+        self.sessions = sessions
+        self.close_code = close_code
+        self.connections = 0
+
+    async def handle(self, websocket, path):
+        session = self.sessions[min(self.connections, len(self.sessions) - 1)]
+        self.connections += 1
+        for open_time in session:
+            await websocket.send(get_message_(open_time))
+        await websocket.close(self.close_code)
+
+    def collect(self, n_candles=None, **kwargs):
+        async def run():
+            candles = []
+            async with websockets.serve(self.handle, '127.0.0.1', 0) as server:
+                port = server.sockets[0].getsockname()[1]
+                async for candle in iter_closed_klines('BTCUSDT', '1m', base_url=f'ws://127.0.0.1:{port}', **kwargs):
+                    candles.append(candle['open_time'])
+                    if len(candles) == n_candles:
+                        break
+            return candles
+        return asyncio.run(run())
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    # Only the reconnection waits of binance_stream are recorded and skipped, websockets keeps the real sleep
+    delays = []
+
+    async def record_sleep(delay):
+        delays.append(delay)
+        await asyncio.sleep(0)
+    monkeypatch.setattr(binance_stream, 'asyncio', SimpleNamespace(sleep=record_sleep,
+                                                                   TimeoutError=asyncio.TimeoutError))
+    return delays
+
+
+def test_reconnects_without_repeating_candles(delays):
+    minutes = [START + minute * MINUTE for minute in range(6)]
+    server = StreamServer([minutes[:3], minutes[1:4], minutes[2:]])
+    assert server.collect(6) == minutes
+    # Every connection delivered messages, so the backoff starts over after each drop
+    assert delays == [0.5, 0.5]
+
+
+@pytest.mark.parametrize('close_code', [1000, 1011])
+def test_gives_up_after_max_retries_whatever_the_close(delays, close_code):
+    server = StreamServer([[]], close_code=close_code)
+    with pytest.raises((ConnectionError, websockets.ConnectionClosed)):
+        server.collect(max_retries=3)
+    assert server.connections == 4
+    assert delays == [0.5, 1.0, 2.0]
+
+
+def test_backoff_is_capped(delays):
+    server = StreamServer([[]])
+    with pytest.raises(ConnectionError):
+        server.collect(max_retries=6, backoff=1.0, max_backoff=5.0)
+    assert delays == [1.0, 2.0, 4.0, 5.0, 5.0, 5.0]
@@ -0,0 +1,49 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from benchmarks.synthetic_candles import generate_candles
+from connector.candle_loader import load_candles
+
+
+def write_csv_(path, n, seed):
+    candles = generate_candles(n, seed=seed)
+    candles[['open_time', 'open', 'high', 'low', 'close', 'volume']].to_csv(path, index=False)
+    return candles
+
+
+def reload_after_change_(tmp_path):
+    path = os.path.join(tmp_path, 'a.csv')
+    cache_dir = os.path.join(tmp_path, 'cache')
+    old = write_csv_(path, 5000, seed=0)
+    first = load_candles(path, cache_dir)
+
+    # Shorter file, so rewriting the mapped column files in place would truncate them
+    new = write_csv_(path, 1000, seed=1)
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 10 ** 9))
+    second = load_candles(path, cache_dir)
+
+    np.testing.assert_allclose(second['close'], new['close'])
+    np.testing.assert_allclose(first['close'], old['close'])
+    assert len(first) == 5000 and len(second) == 1000
+
+
+def test_reload_after_change_keeps_old_frames_readable(tmp_path):
+    # Reading a truncated mapping kills the process with a bus error, so the reload runs in a child process
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = f'from tests.test_candle_loader import reload_after_change_; reload_after_change_({str(tmp_path)!r})'
+    result = subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+
+def test_layouts_are_keyed_by_absolute_path(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    os.makedirs(tmp_path / 'x')
+    os.makedirs(tmp_path / 'y')
+    x = write_csv_(tmp_path / 'x' / 'candles.csv', 300, seed=0)
+    y = write_csv_(tmp_path / 'y' / 'candles.csv', 300, seed=1)
+    np.testing.assert_allclose(load_candles(str(tmp_path / 'x' / 'candles.csv'), cache_dir)['close'], x['close'])
+    np.testing.assert_allclose(load_candles(str(tmp_path / 'y' / 'candles.csv'), cache_dir)['close'], y['close'])
+    assert len(os.listdir(cache_dir)) == 2
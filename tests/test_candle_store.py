@@ -0,0 +1,99 @@
+import asyncio
+import json
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from connector.binance_candles import get_binance_candle_store
+from connector.candle_store import STORE_COLUMNS, CandleStore, get_missing_ranges, merge_ranges
+from tests.test_kline_downloader import MINUTE, START, KlineServer
+
+
+class FakeFetcher:
+    """
+    Returns one candle per minute of the requested range, plus one on each side like a page that overlaps its
+    neighbours. The close of every candle is the number of the fetch that returned it.
+    """
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, ticker, interval, start, end):
+        self.calls.append((start, end))
+        open_time = np.arange(start - MINUTE, end + MINUTE, MINUTE, dtype=np.int64)
+        candles = pd.DataFrame({column: np.ones(len(open_time)) for column in STORE_COLUMNS})
+        candles['open_time'] = open_time
+        candles['close_time'] = open_time + MINUTE - 1
+        candles['close'] = float(len(self.calls))
+        return candles
+
+
+@contextmanager
+def serve_klines_(klines):
+    # The store fetches synchronously through its own event loop, so the server runs on a loop in another thread
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    app = web.Application()
+    app.router.add_get('/klines', klines.handle)
+    server = TestServer(app)
+    asyncio.run_coroutine_threadsafe(server.start_server(), loop).result()
+    try:
+        yield str(server.make_url('/klines'))
+    finally:
+        asyncio.run_coroutine_threadsafe(server.close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+def minutes_(start, end):
+    return [START + start * MINUTE, START + end * MINUTE]
+
+
+def test_missing_ranges():
+    held = [minutes_(0, 10), minutes_(20, 30)]
+    assert get_missing_ranges(held, *minutes_(5, 25)) == [minutes_(10, 20)]
+    assert get_missing_ranges(held, *minutes_(0, 30)) == [minutes_(10, 20)]
+    assert get_missing_ranges(held, *minutes_(25, 40)) == [minutes_(30, 40)]
+    assert get_missing_ranges(held, *minutes_(2, 8)) == []
+    assert merge_ranges([minutes_(20, 30), minutes_(0, 10), minutes_(10, 20)]) == [minutes_(0, 30)]
+
+
+def test_only_gaps_are_fetched_and_merged(tmp_path):
+    klines = KlineServer()
+    with serve_klines_(klines) as base_url:
+        store = get_binance_candle_store(root=str(tmp_path), base_url=base_url)
+        store.update('BTCUSDT', '1m', *minutes_(0, 10))
+        store.update('BTCUSDT', '1m', *minutes_(20, 30))
+        assert store.get_ranges('BTCUSDT', '1m') == [minutes_(0, 10), minutes_(20, 30)]
+
+        candles = store.get_candles('BTCUSDT', '1m', *minutes_(5, 25))
+        # Only the gap between the held ranges went over HTTP
+        assert [start for _, start in klines.requests] == [minutes_(0, 10)[0], minutes_(20, 30)[0],
+                                                           minutes_(10, 20)[0]]
+        assert candles['open_time'].tolist() == list(range(START + 5 * MINUTE, START + 25 * MINUTE, MINUTE))
+        assert candles['close_time'].tolist() == [open_time + MINUTE - 1 for open_time in candles['open_time']]
+        # Ranges are kept merged in the file metadata
+        metadata = pq.read_schema(store.get_path('BTCUSDT', '1m')).metadata
+        assert json.loads(metadata[b'ranges']) == [minutes_(0, 30)]
+
+        # Everything is held now: nothing is requested again
+        store.get_candles('BTCUSDT', '1m', *minutes_(0, 30))
+        assert len(klines.requests) == 3
+
+
+def test_overlapping_fetches_are_deduplicated(tmp_path):
+    store = CandleStore(FakeFetcher(), root=str(tmp_path))
+    store.update('BTCUSDT', '1m', *minutes_(0, 10))
+    store.update('BTCUSDT', '1m', *minutes_(10, 20))
+    candles = store.read('BTCUSDT', '1m')
+    assert candles['open_time'].is_unique and candles['open_time'].is_monotonic_increasing
+    # Candles returned by both fetches keep the newest version
+    close = candles.set_index('open_time')['close']
+    assert close[START + 9 * MINUTE] == 2.0 and close[START + 10 * MINUTE] == 2.0
+    assert close[START + 8 * MINUTE] == 1.0
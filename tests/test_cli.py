@@ -0,0 +1,54 @@
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+
+from connector.candle_loader import load_candles
+from optimization.parameter_sweep import summarize_labeling
+from preprocessing.labeling import Labeling
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEMOCANDLES = os.path.join(ROOT, 'candles', 'democandles.csv')
+
+# strategies/ is a namespace package, so a module in another strategies/ directory on the path is found by --strategy
+STRATEGY = '''import numpy as np
+
+
+def strategy(candles):
+    df = candles.copy()
+    side = np.sign(df['close'] - df['close'].rolling(20).mean()).fillna(0)
+    df['strat_signal'] = side.where(side != side.shift(), 0)
+    return df
+'''
+
+
+def test_cli_run(tmp_path):
+    (tmp_path / 'strategies').mkdir()
+    (tmp_path / 'strategies' / 'crossing_strategy.py').write_text(STRATEGY)
+    metrics_path = str(tmp_path / 'metrics.json')
+    trades_path = str(tmp_path / 'trades.json')
+    env = {**os.environ, 'PYTHONPATH': str(tmp_path)}
+    subprocess.run([sys.executable, 'cli.py', '--candles', DEMOCANDLES, '--strategy', 'crossing_strategy',
+                    '--tp', '2', '--sl', '1', '--tl', '300', '--metrics', metrics_path, '--trades', trades_path],
+                   cwd=ROOT, env=env, check=True, timeout=300)
+
+    namespace = {}
+    exec(STRATEGY, namespace)
+    candles = namespace['strategy'](load_candles(DEMOCANDLES))
+    trades = Labeling().label_trades(candles, std_span=100, tp=2.0, sl=1.0, tl=300, initial_amount_usd=15.0,
+                                     leverage=20.0, trade_cost=0.0006)
+    with open(metrics_path) as file:
+        metrics = json.load(file)
+    assert metrics['tp'] == 2.0 and metrics['tl'] == 300
+    for key, value in summarize_labeling(trades).items():
+        np.testing.assert_allclose(float(metrics[key]), float(value), rtol=1e-12, err_msg=key)
+    assert metrics['portfolio']
+
+    # Only the executed trades are written by default
+    written = pd.read_json(trades_path)
+    executed = trades[trades['lab_active_order']]
+    assert len(written) == len(executed) == metrics['executed_signals']
+    np.testing.assert_allclose(written['lab_cum_pnl'], executed['lab_cum_pnl'])
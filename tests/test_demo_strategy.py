@@ -0,0 +1,35 @@
+import pytest
+
+from benchmarks.synthetic_candles import generate_candles
+from strategies.demo_strategy import BATCH_PARAMS, LiveStrategy, get_batch_params, strategy, strategy_batch
+
+
+def test_batch_params_keep_fast_macd_span_shorter():
+    params = get_batch_params()
+    assert params and all(p['macd_fast'] < p['macd_slow'] for p in params)
+    # Only the crossed spans are left out
+    assert {(p['macd_fast'], p['macd_slow']) for p in params} == {(fast, slow)
+                                                                  for fast in BATCH_PARAMS['macd_fast']
+                                                                  for slow in BATCH_PARAMS['macd_slow'] if fast < slow}
+    assert strategy_batch(generate_candles(500, seed=0), params).shape == (500, len(params))
+
+
+def get_params_():
+    return [{'bb_lenght': bb_lenght, 'macd_fast': fast, 'macd_slow': slow, 'macd_signal': signal}
+            for bb_lenght, fast, slow, signal in [(100, 45, 90, 9), (20, 12, 26, 9), (50, 5, 35, 5)]]
+
+
+def test_batch_matches_live_strategy():
+    candles = generate_candles(1500, seed=1)
+    signals = strategy_batch(candles, get_params_())
+    for column, p in enumerate(get_params_()):
+        live = LiveStrategy(**p)
+        assert [live.update(candle) for candle in candles[['close']].to_dict('records')] == signals[:, column].tolist()
+
+
+def test_batch_matches_strategy():
+    pytest.importorskip('pandas_ta')
+    candles = generate_candles(1500, seed=2)
+    # strategy() runs the default parameters of LiveStrategy
+    signals = strategy_batch(candles, get_params_()[:1])
+    assert strategy(candles)['strat_signal'].tolist() == signals[:, 0].tolist()
@@ -0,0 +1,37 @@
+import numpy as np
+
+from benchmarks.synthetic_candles import generate_candles
+from charts.downsampling import downsample_minmax, downsample_ohlc, get_bucket_starts
+
+
+def test_minmax_keeps_bucket_extrema():
+    rng = np.random.default_rng(0)
+    y = np.cumsum(rng.normal(size=10000))
+    y[1234] = 1000.0
+    y[8765] = -1000.0
+    y[100:110] = np.nan
+    x = np.arange(len(y))
+    kept_x, kept_y = downsample_minmax(x, y, 500)
+    assert len(kept_x) <= 500 and (np.diff(kept_x) > 0).all()
+    assert 1234 in kept_x and 8765 in kept_x and not np.isnan(kept_y).any()
+    np.testing.assert_array_equal(kept_y, y[kept_x])
+
+    # Every bucket keeps its lowest and its highest point
+    valid_x = x[~np.isnan(y)]
+    starts = get_bucket_starts(len(valid_x), 250)
+    for bucket_x in np.split(valid_x, starts[1:]):
+        kept = kept_y[np.isin(kept_x, bucket_x)]
+        assert kept.min() == y[bucket_x].min() and kept.max() == y[bucket_x].max()
+
+
+def test_ohlc_keeps_price_range():
+    candles = generate_candles(10007, seed=0)
+    downsampled = downsample_ohlc(candles, 600)
+    assert len(downsampled) <= 600
+    assert downsampled['high'].max() == candles['high'].max()
+    assert downsampled['low'].min() == candles['low'].min()
+    assert downsampled['open'].iloc[0] == candles['open'].iloc[0]
+    assert downsampled['close'].iloc[-1] == candles['close'].iloc[-1]
+    assert (downsampled['high'] >= downsampled[['open', 'close']].max(axis=1)).all()
+    # Candles that fit are drawn as they are
+    assert len(downsample_ohlc(candles.iloc[:600], 600)) == 600
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from preprocessing.indicator_cache import IndicatorCache
+
+
+def get_mean_(cache, df, length, calls):
+    def compute(candles):
+        calls.append(length)
+        return {'mean': candles['close'].rolling(length).mean().to_numpy()}
+    return cache.get(df, 'mean', ['close'], {'length': length}, compute)
+
+
+def test_lru_stays_within_budget():
+    df = pd.DataFrame({'close': np.arange(100, dtype=float)})
+    # Room for two outputs of 800 bytes
+    cache = IndicatorCache(max_bytes=2000)
+    calls = []
+    get_mean_(cache, df, 2, calls)
+    get_mean_(cache, df, 3, calls)
+    get_mean_(cache, df, 2, calls)
+    # 3 is now the least recently used and is evicted by 4
+    get_mean_(cache, df, 4, calls)
+    assert cache.nbytes <= 2000
+    get_mean_(cache, df, 2, calls)
+    get_mean_(cache, df, 3, calls)
+    assert calls == [2, 3, 4, 3]
+    assert (cache.hits, cache.misses) == (2, 4)
+
+
+def test_outputs_are_shared_and_read_only():
+    df = pd.DataFrame({'close': np.arange(100, dtype=float)})
+    cache = IndicatorCache()
+    calls = []
+    first = get_mean_(cache, df, 5, calls)
+    assert get_mean_(cache, df.copy(), 5, calls)['mean'] is first['mean']
+    with pytest.raises(ValueError):
+        first['mean'][0] = 1.0
+    # Other candles are another key
+    get_mean_(cache, df.assign(close=df['close'] * 2), 5, calls)
+    assert calls == [5, 5]
+
+
+def test_outputs_larger_than_the_budget_are_not_kept():
+    df = pd.DataFrame({'close': np.arange(1000, dtype=float)})
+    cache = IndicatorCache(max_bytes=1000)
+    calls = []
+    assert len(get_mean_(cache, df, 2, calls)['mean']) == 1000
+    get_mean_(cache, df, 2, calls)
+    assert calls == [2, 2] and cache.nbytes == 0
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from connector.candle_store import STORE_COLUMNS, CandleStore
+from preprocessing.intrabar import IntrabarResolver
+
+MINUTE = 60 * 10 ** 3
+BAR = 1678158000000 - 1678158000000 % (60 * MINUTE)
+
+
+def write_minutes_(store, ticker, minutes, high=1.0):
+    open_time = BAR + np.asarray(minutes, dtype=np.int64) * MINUTE
+    candles = pd.DataFrame({column: np.ones(len(open_time)) for column in STORE_COLUMNS})
+    candles['open_time'] = open_time
+    candles['close_time'] = open_time + MINUTE - 1
+    candles['high'] = high
+    store.write(ticker, '1m', candles, [[int(open_time[0]), int(open_time[-1]) + MINUTE]])
+
+
+def test_incomplete_bars_are_not_cached(tmp_path):
+    store = CandleStore(fetch=None, root=str(tmp_path))
+    resolver = IntrabarResolver(store, 'BTCUSDT', '1h')
+    write_minutes_(store, 'BTCUSDT', range(30))
+    high, _ = resolver.get_bars_(np.array([BAR]))[BAR]
+    assert len(high) == 30 and not resolver.cache
+
+    write_minutes_(store, 'BTCUSDT', range(60))
+    high, _ = resolver.get_bars_(np.array([BAR]))[BAR]
+    assert len(high) == 60 and ('BTCUSDT', '1h', BAR) in resolver.cache
+
+
+def test_cache_is_keyed_by_ticker(tmp_path):
+    store = CandleStore(fetch=None, root=str(tmp_path))
+    write_minutes_(store, 'BTCUSDT', range(60), high=1.0)
+    write_minutes_(store, 'ETHUSDT', range(60), high=2.0)
+    resolver = IntrabarResolver(store, 'BTCUSDT', '1h')
+    assert resolver.get_bars_(np.array([BAR]))[BAR][0][0] == 1.0
+    resolver.ticker = 'ETHUSDT'
+    assert resolver.get_bars_(np.array([BAR]))[BAR][0][0] == 2.0
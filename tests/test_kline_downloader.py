@@ -0,0 +1,126 @@
+import asyncio
+import time
+from email.utils import formatdate
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from connector.kline_downloader import download_klines_async
+
+MINUTE = 60 * 10 ** 3
+START = 1678158000000
+
+
+def get_klines_(start, end, limit):
+    first = -(-start // MINUTE) * MINUTE
+    return [[open_time, '100', '101', '99', '100.5', '10', open_time + MINUTE - 1, '1000', 5, '5', '500', '0']
+            for open_time in range(first, end + 1, MINUTE)][:limit]
+
+
+class KlineServer:
+    """
+    Local klines endpoint. `respond` can return a web.Response to send instead of the klines.
+    """
+    def __init__(self, respond=None, delay=None):
+        self.respond = respond
+        self.delay = delay
+        self.requests = []
+
+    async def handle(self, request):
+        params = {key: int(value) for key, value in request.query.items() if key not in ['symbol', 'interval']}
+        self.requests.append((time.monotonic(), params['startTime']))
+        response = self.respond(params) if self.respond is not None else None
+        if response is not None:
+            return response
+        if self.delay is not None:
+            await asyncio.sleep(self.delay(params))
+        return web.json_response(get_klines_(params['startTime'], params['endTime'], params['limit']))
+
+    def download(self, n_candles, **kwargs):
+        async def run():
+            app = web.Application()
+            app.router.add_get('/klines', self.handle)
+            server = TestServer(app)
+            await server.start_server()
+            try:
+                return await download_klines_async('BTCUSDT', '1m', START, START + n_candles * MINUTE, MINUTE,
+                                                   str(server.make_url('/klines')), **kwargs)
+            finally:
+                await server.close()
+        return asyncio.run(run())
+
+    def count_requests(self, window_start):
+        return sum(start == window_start for _, start in self.requests)
+
+
+def test_pages_are_reassembled_in_request_order():
+    # Later windows answer first
+    server = KlineServer(delay=lambda params: 0.2 * (START + 50 * MINUTE - params['startTime']) / (50 * MINUTE))
+    finished = []
+    candles = server.download(50, limit=10, progress=lambda done, total: finished.append((done, total)))
+    assert candles['open_time'].tolist() == list(range(START, START + 50 * MINUTE, MINUTE))
+    assert candles['close_time'].tolist() == [open_time + MINUTE - 1 for open_time in candles['open_time']]
+    assert finished[-1] == (5, 5)
+
+
+def test_429_waits_for_retry_after():
+    def respond(params):
+        if params['startTime'] == START and server.count_requests(START) == 1:
+            return web.Response(status=429, headers={'Retry-After': '0.3'})
+    server = KlineServer(respond)
+    started_at = time.monotonic()
+    # A large backoff would make the test slow if Retry-After were ignored
+    candles = server.download(20, limit=10, backoff=30)
+    assert time.monotonic() - started_at >= 0.3
+    assert time.monotonic() - started_at < 10
+    assert len(candles) == 20
+    assert server.count_requests(START) == 2
+
+
+@pytest.mark.parametrize('retry_after', ['date', 'unreadable'])
+def test_429_with_retry_after_date(retry_after):
+    def respond(params):
+        if params['startTime'] == START and server.count_requests(START) == 1:
+            value = formatdate(time.time() + 2, usegmt=True) if retry_after == 'date' else 'soon'
+            return web.Response(status=429, headers={'Retry-After': value})
+    server = KlineServer(respond)
+    # Unreadable values fall back to the backoff
+    candles = server.download(20, limit=10, backoff=0.01)
+    assert len(candles) == 20
+    first, retry = [requested_at for requested_at, start in server.requests if start == START]
+    # HTTP dates have a resolution of one second, so the wait is between 1 and 2 s
+    assert (1 <= retry - first < 5) if retry_after == 'date' else (retry - first < 1)
+
+
+def test_5xx_is_retried():
+    def respond(params):
+        if server.count_requests(params['startTime']) <= 2:
+            return web.Response(status=503)
+    server = KlineServer(respond)
+    candles = server.download(30, limit=10, backoff=0.01)
+    assert len(candles) == 30
+    assert all(server.count_requests(START + window * 10 * MINUTE) == 3 for window in range(3))
+
+
+def test_gives_up_after_max_retries():
+    server = KlineServer(lambda params: web.Response(status=500))
+    with pytest.raises(aiohttp.ClientError):
+        server.download(10, limit=10, backoff=0.01, max_retries=2)
+    assert server.count_requests(START) == 3
+
+
+def test_requests_stay_under_the_weight_budget():
+    # A burst of 120 requests, then one every 0.5 s
+    weight_per_minute, request_weight = 1200, 10
+    server = KlineServer()
+    candles = server.download(124, limit=1, weight_per_minute=weight_per_minute, request_weight=request_weight)
+    assert len(candles) == 124
+
+    times = sorted(requested_at for requested_at, _ in server.requests)
+    refill_rate = weight_per_minute / 60
+    for count, requested_at in enumerate(times, start=1):
+        # Tokens spent can never exceed the initial budget plus the refill since the first request
+        assert count * request_weight <= weight_per_minute + refill_rate * (requested_at - times[0]) + request_weight
+    assert times[-1] - times[0] >= 1.5
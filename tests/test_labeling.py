@@ -0,0 +1,102 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic_candles import generate_candles
+from preprocessing.labeling import Labeling
+
+DEMOCANDLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'candles', 'democandles.csv')
+
+
+def get_index_(n):
+    return pd.date_range('2023-03-07', periods=n, freq='min').to_numpy(dtype='datetime64[ns]')
+
+
+def test_run_executor_same_candle_exits():
+    index = get_index_(10)
+    signal_loc = np.array([2, 3, 5, 9])
+    # Every position closes on its own entry candle
+    active_order, busy_until = Labeling.run_executor(index, signal_loc, index[signal_loc])
+    # The signal on the candle after an entry takes the executor over without being flagged, like the candle by
+    # candle executor
+    assert np.flatnonzero(active_order).tolist() == [2, 5, 9]
+    # The last position still holds the executor at the end of the block
+    assert busy_until == index[9]
+
+
+def test_run_executor_carries_same_candle_exit_to_next_block():
+    index = get_index_(10)
+    signal_loc = np.array([4, 5, 7])
+    whole, _ = Labeling.run_executor(index, signal_loc, index[signal_loc])
+    first, busy_until = Labeling.run_executor(index[:5], signal_loc[:1], index[signal_loc[:1]])
+    second, _ = Labeling.run_executor(index[5:], signal_loc[1:] - 5, index[signal_loc[1:]], busy_until)
+    assert np.concatenate([first, second]).tolist() == whole.tolist()
+
+
+@pytest.mark.parametrize('tp, sl', [(1.5, 0.75), (0.0, 0.0)])
+def test_label_trades_tl_zero(tp, sl):
+    candles = generate_candles(2000, signal_density=0.3, seed=1)
+    trades = Labeling().label_trades(candles, std_span=50, tp=tp, sl=sl, tl=0, initial_amount_usd=15, leverage=20)
+    assert (trades['lab_exit'] == 'tl').all()
+    assert (trades['close_datetime'] == trades.index).all()
+    # Back to back signals alternate: every second one lands on the candle after an executed entry
+    active = trades['lab_active_order'].to_numpy()
+    consecutive = np.diff(trades['candle_loc'].to_numpy()) == 1
+    assert not (active[1:] & active[:-1] & consecutive).any()
+    assert active.sum() > 0
+
+
+def apply_pt_sl_on_tl_loop_(df, ptSl):
+    # Candle by candle implementation that apply_pt_sl_on_tl replaced, kept as the reference
+    out = df[['close', 'lab_tl', 'strat_signal']].copy(deep=True)
+    if ptSl[0] > 0:
+        pt = ptSl[0] * df['lab_trgt']
+    else:
+        pt = pd.Series(index=df.index, dtype=float)  # NaNs
+    if ptSl[1] > 0:
+        sl = -ptSl[1] * df['lab_trgt']
+    else:
+        sl = pd.Series(index=df.index, dtype=float)  # NaNs
+
+    for loc, tl in df['lab_tl'].fillna(df['close'].index[-1]).items():
+        signal = df.at[loc, 'strat_signal']
+        df0 = df.close[loc:tl]  # path prices
+        df0 = (df0 / df.close[loc] - 1) * signal
+        out.loc[loc, 'strat_signal'] = signal
+        out.loc[loc, 'sl_datetime'] = df0[df0 < sl[loc]].index.min()  # earliest stop loss.
+        out.loc[loc, 'tp_datetime'] = df0[df0 > pt[loc]].index.min()
+    return out
+
+
+def get_democandles_(seed, tl, n=1500):
+    df = pd.read_csv(DEMOCANDLES, nrows=n)
+    rng = np.random.default_rng(seed)
+    df['strat_signal'] = rng.choice([0, 0, 0, 0, 1, -1], len(df))
+    df.index = pd.to_datetime(df['open_time'], unit='ms')
+    df['lab_trgt'] = df['close'].rolling(100).std() / df['close']
+    df = df.dropna(subset='lab_trgt')
+    df['lab_tl'] = df.index + pd.Timedelta(minutes=tl)
+    return df
+
+
+@pytest.mark.parametrize('seed, tl, ptSl, max_batch_size', [
+    (0, 500, [1.5, 0.75], 2 ** 22),
+    (1, 30, [1.5, 0.75], 64),
+    (2, 500, [0, 0.75], 2 ** 22),
+    (3, 90, [2.0, 0], 7),
+    (4, 0, [0.1, 0.1], 2 ** 22),
+    (5, 60, [0, 0], 2 ** 22),
+    # Paths running past the last candle
+    (6, 10 ** 5, [3.0, 3.0], 500),
+])
+def test_apply_pt_sl_on_tl_matches_loop(seed, tl, ptSl, max_batch_size):
+    df = get_democandles_(seed, tl)
+    # Missing time limits run to the last candle
+    df.iloc[::97, df.columns.get_loc('lab_tl')] = pd.NaT
+    expected = apply_pt_sl_on_tl_loop_(df, ptSl)
+    result = Labeling.apply_pt_sl_on_tl(df, ptSl, max_batch_size=max_batch_size)
+    for column in ['sl_datetime', 'tp_datetime']:
+        pd.testing.assert_series_equal(result[column], expected[column].astype('datetime64[ns]'))
+    assert expected['tp_datetime'].notna().any() or ptSl[0] == 0
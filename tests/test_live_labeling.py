@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic_candles import generate_candles
+from preprocessing.incremental_indicators import EMA, MACD, BollingerBands, RollingStd
+from preprocessing.labeling import Labeling
+from preprocessing.live_labeling import LiveLabeling
+
+from tests.test_labeling import DEMOCANDLES
+
+
+def get_close_(n=800, seed=0):
+    return generate_candles(n, seed=seed)['close']
+
+
+def get_ema_(close, span):
+    # Seeded with the simple average of the first `span` values, like pandas_ta ema
+    seeded = close.copy()
+    seeded.iloc[:span - 1] = np.nan
+    seeded.iloc[span - 1] = close.iloc[:span].mean()
+    return seeded.ewm(span=span, adjust=False).mean()
+
+
+@pytest.mark.parametrize('length, ddof', [(20, 1), (100, 0)])
+def test_rolling_std_matches_pandas(length, ddof):
+    close = get_close_()
+    rolling = RollingStd(length, ddof=ddof)
+    np.testing.assert_allclose([rolling.update(value) for value in close], close.rolling(length).std(ddof=ddof),
+                               rtol=1e-7)
+
+
+def test_ema_matches_pandas():
+    close = get_close_()
+    ema = EMA(26)
+    np.testing.assert_allclose([ema.update(value) for value in close], get_ema_(close, 26), rtol=1e-12)
+
+
+def test_macd_matches_pandas():
+    close = get_close_()
+    macd = MACD(12, 26, 9)
+    values = np.array([macd.update(value) for value in close])
+    macd_line = get_ema_(close, 12) - get_ema_(close, 26)
+    signal_line = pd.Series(np.nan, index=close.index)
+    signal_line.iloc[25:] = get_ema_(macd_line.iloc[25:].reset_index(drop=True), 9).to_numpy()
+    np.testing.assert_allclose(values[:, 0], macd_line, rtol=1e-9)
+    np.testing.assert_allclose(values[:, 2], signal_line, rtol=1e-9)
+    np.testing.assert_allclose(values[:, 1], macd_line - signal_line, rtol=1e-6, atol=1e-9)
+
+
+def test_bollinger_bands_match_pandas():
+    close = get_close_()
+    bands = BollingerBands(length=20, std=2.0)
+    values = np.array([bands.update(value) for value in close])
+    mid = close.rolling(20).mean()
+    deviation = close.rolling(20).std(ddof=0)
+    np.testing.assert_allclose(values[:, 0], mid - 2 * deviation, rtol=1e-9)
+    np.testing.assert_allclose(values[:, 1], mid, rtol=1e-9)
+    np.testing.assert_allclose(values[:, 2], mid + 2 * deviation, rtol=1e-9)
+    np.testing.assert_allclose(values[:, 3], (close - (mid - 2 * deviation)) / (4 * deviation), rtol=1e-6)
+
+
+def get_candles_(source, seed):
+    if source == 'demo':
+        candles = pd.read_csv(DEMOCANDLES)
+        candles['open_time'] = candles['open_time'].astype('int64')
+        candles['strat_signal'] = np.random.default_rng(seed).choice([-1, 0, 0, 0, 0, 1], len(candles))
+        return candles
+    return generate_candles(3000, signal_density=0.1, seed=seed)
+
+
+@pytest.mark.parametrize('source, seed, tp, sl, tl', [('demo', 0, 1.5, 0.75, 500),
+                                                      ('demo', 1, 2.0, 1.0, 60),
+                                                      ('synthetic', 2, 1.5, 0.75, 30),
+                                                      ('synthetic', 3, 0.0, 1.0, 120),
+                                                      ('synthetic', 4, 1.0, 0.0, 0)])
+def test_candle_by_candle_matches_label_trades(source, seed, tp, sl, tl):
+    candles = get_candles_(source, seed)
+    params = {'std_span': 100, 'tp': tp, 'sl': sl, 'tl': tl, 'initial_amount_usd': 15.0, 'leverage': 20.0,
+              'trade_cost': 0.0006}
+    live = LiveLabeling(**params)
+    events = [event for candle in candles[['open_time', 'close', 'strat_signal']].itertuples(index=False)
+              for event in live.update(candle.open_time, candle.close, candle.strat_signal)]
+    entries = [event for event in events if event['event'] == 'entry']
+    exits = pd.DataFrame([event for event in events if event['event'] == 'exit'])
+
+    trades = Labeling().label_trades(candles, **params)
+    executed = trades[trades['lab_active_order']]
+    # The last position may still be open at the end of the candles
+    closed = executed[executed['close_datetime'] <= pd.Timestamp(int(candles['open_time'].iloc[-1]), unit='ms')]
+    assert [event['datetime'] for event in entries] == executed.index.tolist()
+    assert exits['entry_datetime'].tolist() == closed.index.tolist()
+    assert exits['datetime'].tolist() == closed['close_datetime'].tolist()
+    assert exits['exit'].tolist() == closed['lab_exit'].astype(str).tolist()
+    np.testing.assert_allclose(exits['ret'], closed['lab_ret'], rtol=1e-9)
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from preprocessing.monte_carlo import bootstrap_pnl, get_bootstrap_indexes, measure_pnl
+
+
+def get_returns_(n=200, seed=0):
+    return np.random.default_rng(seed).normal(0.001, 0.01, n)
+
+
+def test_measure_pnl():
+    metrics = measure_pnl([0.1, -0.2, 0.05], initial_amount_usd=10.0, leverage=20.0)
+    # PnL path 1, -1, -0.5
+    assert metrics == pytest.approx({'final_pnl': -0.5, 'max_drawdown': 2.0, 'required_margin': 1.5})
+
+
+def test_block_indexes_are_circular_runs():
+    indexes = get_bootstrap_indexes(10, 50, block_size=4, rng=np.random.default_rng(0))
+    assert indexes.shape == (50, 10)
+    blocks = indexes[:, :8].reshape(50, 2, 4)
+    assert ((np.diff(blocks, axis=-1) % 10) == 1).all()
+
+
+def test_shapes_and_seeded_quantiles():
+    returns = get_returns_()
+    results = bootstrap_pnl(returns, initial_amount_usd=15.0, leverage=20.0, n_paths=5000, seed=1)
+    assert {key: values.shape for key, values in results.items()} == {key: (5000,) for key in results}
+    again = bootstrap_pnl(returns, initial_amount_usd=15.0, leverage=20.0, n_paths=5000, seed=1)
+    assert all(np.array_equal(results[key], again[key]) for key in results)
+
+    # The final PnL of a plain bootstrap is the sum of n draws: mean n * mean and std sqrt(n) * std
+    ret_usd = 15.0 * returns
+    quantiles = np.quantile(results['final_pnl'], [0.05, 0.5, 0.95])
+    expected = len(returns) * ret_usd.mean() + np.array([-1.645, 0, 1.645]) * np.sqrt(len(returns)) * ret_usd.std()
+    np.testing.assert_allclose(quantiles, expected, atol=0.1 * np.sqrt(len(returns)) * ret_usd.std())
+    assert (results['max_drawdown'] >= 0).all() and (results['required_margin'] >= 15.0 / 20.0).all()
+
+
+def test_whole_sequence_blocks_are_rotations():
+    returns = get_returns_(50)
+    # Every path is a rotation of the trades: same final PnL, batches of a few paths give the same shapes
+    results = bootstrap_pnl(returns, initial_amount_usd=15.0, leverage=20.0, n_paths=100, block_size=50, seed=0,
+                            max_batch_size=120)
+    np.testing.assert_allclose(results['final_pnl'], 15.0 * returns.sum())
+    realized = measure_pnl(returns, initial_amount_usd=15.0, leverage=20.0)
+    assert results['max_drawdown'].min() <= realized['max_drawdown'] <= results['max_drawdown'].max()
+
+
+def test_no_trades():
+    results = bootstrap_pnl([], initial_amount_usd=15.0, leverage=20.0, n_paths=10)
+    assert all((values == 0).all() and values.shape == (10,) for values in results.values())
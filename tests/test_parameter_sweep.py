@@ -0,0 +1,25 @@
+import numpy as np
+
+from benchmarks.synthetic_candles import generate_candles
+from optimization.parameter_sweep import get_parameter_grid, run_parameter_sweep, summarize_labeling
+from preprocessing.labeling import Labeling
+
+
+def test_grid():
+    grid = get_parameter_grid(std_span=[50, 100], tp=1.5, sl=(0.5, 1.0))
+    assert grid == [{'std_span': 50, 'tp': 1.5, 'sl': 0.5}, {'std_span': 50, 'tp': 1.5, 'sl': 1.0},
+                    {'std_span': 100, 'tp': 1.5, 'sl': 0.5}, {'std_span': 100, 'tp': 1.5, 'sl': 1.0}]
+
+
+def test_sweep_matches_label_trades():
+    candles = generate_candles(3000, signal_density=0.1, seed=0)
+    params = {'std_span': [50, 100], 'tp': [1.0, 2.0], 'sl': 0.75, 'tl': [0, 120], 'leverage': 20.0,
+              'trade_cost': 0.0006}
+    results = run_parameter_sweep(candles, initial_amount_usd=15.0, max_workers=2, **params)
+    grid = get_parameter_grid(**params)
+    assert len(results) == len(grid)
+    for (_, row), grid_params in zip(results.iterrows(), grid):
+        assert {key: row[key] for key in grid_params} == grid_params
+        trades = Labeling().label_trades(candles, initial_amount_usd=15.0, **grid_params)
+        for key, value in summarize_labeling(trades).items():
+            np.testing.assert_allclose(float(row[key]), float(value), rtol=1e-12, err_msg=key)
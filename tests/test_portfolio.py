@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic_candles import generate_candles
+from preprocessing.labeling import Labeling
+from preprocessing.portfolio import simulate_portfolio, summarize_portfolio
+
+from tests.test_labeling import DEMOCANDLES
+
+PARAMS = {'std_span': 100, 'tp': 1.5, 'sl': 0.75, 'initial_amount_usd': 15.0, 'leverage': 20.0}
+
+
+def get_democandles_():
+    candles = pd.read_csv(DEMOCANDLES)
+    candles['strat_signal'] = np.random.default_rng(0).choice([-1, 0, 0, 0, 1], len(candles))
+    return candles
+
+
+@pytest.mark.parametrize('candles, tl', [(get_democandles_(), 500),
+                                         (generate_candles(3000, signal_density=0.3, seed=2), 60),
+                                         (generate_candles(3000, signal_density=0.3, seed=2), 0)])
+def test_single_position_fills_the_labeling_executor_orders(candles, tl):
+    trades = Labeling().label_trades(candles, tl=tl, **PARAMS)
+    orders, equity = simulate_portfolio(trades, portfolio_initial_value=10 ** 6,
+                                        initial_amount_usd=PARAMS['initial_amount_usd'], leverage=PARAMS['leverage'])
+    assert (orders['status'] == 'filled').tolist() == trades['lab_active_order'].tolist()
+    assert equity['open_positions'].max() == 1
+    assert equity['equity'].iloc[-1] - 10 ** 6 == pytest.approx(trades['lab_ret_usd'].sum())
+
+
+def test_margin_and_positions_limits():
+    trades = Labeling().label_trades(generate_candles(3000, signal_density=0.3, seed=2), tl=500, **PARAMS)
+    # Room for two orders of margin 0.75
+    orders, equity = simulate_portfolio(trades, portfolio_initial_value=1.6, initial_amount_usd=15.0, leverage=20.0,
+                                        max_positions=5)
+    summary = summarize_portfolio(orders, equity, 1.6)
+    assert summary['max_open_positions'] <= 2 and summary['rejected_margin'] > 0
+    assert (equity['margin_used'] <= 1.6 + 1e-9).all()
+
+
+def test_signal_rows_fill_like_the_trade_table():
+    candles = generate_candles(3000, signal_density=0.3, seed=4)
+    trades = Labeling().label_trades(candles, tl=60, **PARAMS)
+    orders, _ = simulate_portfolio(trades, portfolio_initial_value=10 ** 6, initial_amount_usd=15.0, leverage=20.0)
+    # The candle frame columns, without the candle positions of the trade table
+    signal_rows, _ = simulate_portfolio(trades.drop(columns=['candle_loc', 'exit_loc']),
+                                        portfolio_initial_value=10 ** 6, initial_amount_usd=15.0, leverage=20.0)
+    assert signal_rows['status'].tolist() == orders['status'].tolist()
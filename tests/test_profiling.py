@@ -0,0 +1,70 @@
+import gc
+import threading
+import tracemalloc
+
+from preprocessing.profiling import Profiler
+
+
+def test_threads_profile_independently():
+    profiler = Profiler()
+    barrier = threading.Barrier(2)
+    records = {}
+
+    def run(name):
+        profiler.start(trace_memory=True)
+        try:
+            with profiler.stage(name):
+                barrier.wait()
+                with profiler.stage(f'{name}_child'):
+                    barrier.wait()
+        finally:
+            profiler.stop()
+        records[name] = [(record['name'], record['depth']) for record in profiler.get_records()]
+
+    threads = [threading.Thread(target=run, args=(name,)) for name in ['first', 'second']]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert records == {'first': [('first', 0), ('first_child', 1)], 'second': [('second', 0), ('second_child', 1)]}
+    assert not tracemalloc.is_tracing()
+    # Nothing was started on this thread
+    assert not profiler.enabled and profiler.get_records() == []
+
+
+def test_tracing_runs_while_any_thread_traces():
+    profiler = Profiler()
+    started, release = threading.Event(), threading.Event()
+
+    def run():
+        profiler.start(trace_memory=True)
+        started.set()
+        release.wait()
+        profiler.stop()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    started.wait()
+    profiler.start(trace_memory=True)
+    profiler.stop()
+    # Stopping twice does not release the other thread's tracing
+    profiler.stop()
+    assert tracemalloc.is_tracing()
+    release.set()
+    thread.join()
+    assert not tracemalloc.is_tracing()
+
+
+def test_tracing_is_released_when_an_unstopped_thread_ends():
+    profiler = Profiler()
+
+    def run():
+        # Like an app run cut short before it reaches profiler.stop()
+        profiler.start(trace_memory=True)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    gc.collect()
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from connector.candle_store import STORE_COLUMNS, CandleStore
+from connector.resampling import CandleResampler, get_bucket_bounds, resample_candles
+
+MINUTE = 60 * 10 ** 3
+# Tuesday 2023-02-28 21:17
+START = int(pd.Timestamp('2023-02-28 21:17').value // 10 ** 6)
+PANDAS_RULES = {'15m': {'rule': '15min'},
+                '4h': {'rule': '4h'},
+                '1d': {'rule': '1D'},
+                '1w': {'rule': 'W-MON', 'label': 'left', 'closed': 'left'},
+                '1M': {'rule': 'MS'}}
+
+
+def get_minutes_(n, start=START, seed=0):
+    rng = np.random.default_rng(seed)
+    open_time = start + np.arange(n, dtype=np.int64) * MINUTE
+    close = 20000 * np.exp(np.cumsum(rng.normal(0, 0.001, n)))
+    candles = pd.DataFrame({column: rng.random(n) for column in STORE_COLUMNS})
+    candles['open_time'] = open_time
+    candles['close_time'] = open_time + MINUTE - 1
+    candles['open'] = close * (1 + rng.normal(0, 0.0005, n))
+    candles['high'] = np.maximum(candles['open'], close) * 1.001
+    candles['low'] = np.minimum(candles['open'], close) * 0.999
+    candles['close'] = close
+    return candles
+
+
+def test_bucket_bounds():
+    open_time = np.array([pd.Timestamp(text).value // 10 ** 6 for text in ['2023-03-01 00:00', '2023-03-05 23:59',
+                                                                           '2023-03-06 00:00', '2023-02-28 12:30']])
+    starts, ends = get_bucket_bounds(open_time, '1w')
+    assert pd.to_datetime(starts, unit='ms').day_name().tolist() == ['Monday'] * 4
+    assert pd.to_datetime(starts, unit='ms').strftime('%Y-%m-%d').tolist() == ['2023-02-27', '2023-02-27',
+                                                                               '2023-03-06', '2023-02-27']
+    assert (ends - starts == 7 * 24 * 60 * MINUTE).all()
+    starts, ends = get_bucket_bounds(open_time, '1M')
+    assert pd.to_datetime(starts, unit='ms').strftime('%Y-%m-%d').tolist() == ['2023-03-01', '2023-03-01',
+                                                                               '2023-03-01', '2023-02-01']
+    assert pd.to_datetime(ends, unit='ms').strftime('%Y-%m-%d').tolist() == ['2023-04-01', '2023-04-01',
+                                                                             '2023-04-01', '2023-03-01']
+
+
+@pytest.mark.parametrize('interval', list(PANDAS_RULES))
+def test_resample_matches_pandas(interval):
+    candles = get_minutes_(90 * 24 * 60)
+    # A gap in the candles leaves buckets empty or partial
+    candles = candles[(candles.index < 20000) | (candles.index > 21000)].reset_index(drop=True)
+    resampled = resample_candles(candles, interval)
+
+    expected = (candles.set_index(pd.to_datetime(candles['open_time'], unit='ms'))
+                .resample(**PANDAS_RULES[interval])
+                .agg({'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum',
+                      'num_trades': 'sum', 'open_time': 'count'}))
+    expected = expected[expected['open_time'] > 0]
+    assert pd.to_datetime(resampled['open_time'], unit='ms').tolist() == expected.index.tolist()
+    for column in ['open', 'high', 'low', 'close', 'volume', 'num_trades']:
+        np.testing.assert_allclose(resampled[column], expected[column], err_msg=column)
+
+
+def test_partial_buckets_are_dropped_by_ranges():
+    candles = get_minutes_(10 * 60)
+    end = int(candles['open_time'].iloc[-1]) + MINUTE
+    resampled = resample_candles(candles, '1h', ranges=[[START, end]])
+    # START is at 21:17, so the first and last hours are incomplete
+    assert pd.to_datetime(resampled['open_time'].iloc[0], unit='ms').strftime('%H:%M') == '22:00'
+    assert (resampled['close_time'].to_numpy() < end).all()
+    assert len(resampled) == len(resample_candles(candles, '1h')) - 2
+
+    # A gap from 22:57 to 00:37 drops the 22:00, 23:00 and 00:00 hours
+    gap = [[START, START + 100 * MINUTE], [START + 200 * MINUTE, end]]
+    assert len(resample_candles(candles, '1h', ranges=gap)) == len(resampled) - 3
+
+
+def test_incremental_update_equals_rebuild(tmp_path):
+    candles = get_minutes_(3 * 24 * 60, seed=1)
+    store = CandleStore(fetch=None, root=str(tmp_path / 'incremental'))
+    resampler = CandleResampler(store)
+    for end in [1000, 1500, 1501, 4000, len(candles)]:
+        held = candles.iloc[:end]
+        store.write('BTCUSDT', '1m', held, [[START, int(held['open_time'].iloc[-1]) + MINUTE]])
+        incremental = resampler.update('BTCUSDT', '4h')
+
+        rebuilt_store = CandleStore(fetch=None, root=str(tmp_path / f'rebuilt_{end}'))
+        rebuilt_store.write('BTCUSDT', '1m', held, store.get_ranges('BTCUSDT', '1m'))
+        rebuilt = CandleResampler(rebuilt_store).update('BTCUSDT', '4h')
+        pd.testing.assert_frame_equal(incremental, rebuilt)
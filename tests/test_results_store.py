@@ -0,0 +1,47 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from optimization.results_store import ResultsStore, get_run_id
+
+KEY = {'candles_fingerprint': 'abc', 'strategy': 'demo_strategy', 'strategy_hash': 'def'}
+
+
+def write_run_(store, tp):
+    params = {'tp': tp}
+    run_id = get_run_id(KEY['candles_fingerprint'], KEY['strategy'], KEY['strategy_hash'], params)
+    store.write_run(run_id,
+                    key=KEY,
+                    params=params,
+                    metrics={'global_pnl': tp},
+                    candles=pd.DataFrame({'close': [1.0, 2.0, 3.0]}),
+                    trades=pd.DataFrame({'lab_ret': [tp]}),
+                    equity=pd.DataFrame({'equity': [tp]}))
+    return run_id
+
+
+def test_runs_share_their_candles(tmp_path):
+    store = ResultsStore(str(tmp_path))
+    first, second = write_run_(store, 1.0), write_run_(store, 2.0)
+    assert os.listdir(tmp_path / 'candles') == [f"{store.read_run_info_(first)['candles_id']}.parquet"]
+    assert not os.path.exists(tmp_path / 'runs' / first / 'candles.parquet')
+    assert store.has_run(first) and store.has_run(second)
+    tables = store.read_run(second)
+    assert tables['candles']['close'].tolist() == [1.0, 2.0, 3.0]
+    assert tables['trades']['lab_ret'].tolist() == [2.0]
+
+    # The candles stay while a run references them
+    store.delete_run(first)
+    assert not store.has_run(first) and store.has_run(second)
+    store.delete_run(second)
+    assert os.listdir(tmp_path / 'candles') == []
+    assert len(store.read_index()) == 0
+
+
+def test_concurrent_writes_keep_every_index_row(tmp_path):
+    store = ResultsStore(str(tmp_path))
+    with ThreadPoolExecutor(8) as executor:
+        run_ids = list(executor.map(lambda tp: write_run_(store, tp), [float(tp) for tp in range(32)]))
+    assert sorted(store.read_index().index) == sorted(run_ids)
+    assert not [name for _, _, names in os.walk(tmp_path) for name in names if name.endswith('.tmp')]
@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+
+from benchmarks.synthetic_candles import generate_candles
+from optimization.parameter_sweep import summarize_labeling
+from optimization.signal_screening import screen_signal_matrix
+from preprocessing.labeling import Labeling
+
+
+@pytest.mark.parametrize('seed, tl', [(0, 60), (1, 500), (2, 0)])
+def test_screening_matches_label_trades(seed, tl):
+    candles = generate_candles(2000, seed=seed)
+    signals = np.random.default_rng(seed).choice([-1, 0, 0, 0, 0, 1], size=(len(candles), 5)).astype(np.int8)
+    params = {'std_span': 50, 'tp': 1.5, 'sl': 0.75, 'tl': tl, 'initial_amount_usd': 15.0, 'leverage': 20.0,
+              'trade_cost': 0.0006}
+    screened = screen_signal_matrix(candles, signals, **params)
+    for column in range(signals.shape[1]):
+        trades = Labeling().label_trades(candles.assign(strat_signal=signals[:, column]), **params)
+        expected = summarize_labeling(trades)
+        for key, value in expected.items():
+            np.testing.assert_allclose(float(screened.loc[column, key]), float(value), rtol=1e-9, err_msg=key)
@@ -0,0 +1,66 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from preprocessing.stage_cache import StageCache
+
+
+def test_concurrent_callers_compute_once():
+    cache = StageCache()
+    calls = []
+    started = threading.Event()
+
+    def compute():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return np.arange(10)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        first = executor.submit(cache.run, 'labeling', ('a',), compute)
+        started.wait()
+        others = [executor.submit(cache.run, 'labeling', ('a',), compute) for _ in range(7)]
+        results = [future.result() for future in [first] + others]
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    stats = cache.get_stats()
+    assert (stats['misses'], stats['waits'] + stats['hits']) == (1, 7) and stats['waits'] > 0
+
+
+def test_waiters_retry_after_a_failure():
+    cache = StageCache()
+    started = threading.Event()
+
+    def fail():
+        started.set()
+        time.sleep(0.1)
+        raise RuntimeError('stage failed')
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        failing = executor.submit(cache.run, 'labeling', ('a',), fail)
+        started.wait()
+        waiting = executor.submit(cache.run, 'labeling', ('a',), lambda: 'recomputed')
+        with pytest.raises(RuntimeError):
+            failing.result()
+        assert waiting.result() == 'recomputed'
+    assert cache.run('labeling', ('a',), fail) == 'recomputed'
+
+
+def test_size_budget_evicts_least_recently_used():
+    # Room for two arrays of 8000 bytes
+    cache = StageCache(max_bytes=20000)
+    cache.run('stage', 1, lambda: np.zeros(1000))
+    cache.run('stage', 2, lambda: np.zeros(1000))
+    cache.run('stage', 1, lambda: None)
+    cache.run('stage', 3, lambda: np.zeros(1000))
+    stats = cache.get_stats()
+    assert stats['evictions'] == 1 and stats['entries'] == 2 and stats['nbytes'] <= 20000
+    assert cache.run('stage', 2, lambda: 'evicted') == 'evicted'
+    assert isinstance(cache.run('stage', 3, lambda: 'recomputed'), np.ndarray)
+    # Larger than the whole budget: returned but not kept
+    assert len(cache.run('stage', 4, lambda: np.zeros(10000))) == 10000
+    assert cache.run('stage', 4, lambda: 'recomputed') == 'recomputed'
+    assert (cache.hits, cache.misses) == (2, 6)
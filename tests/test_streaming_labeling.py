@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cli import main
+from connector.candle_store import STORE_COLUMNS, CandleStore
+from optimization.parameter_sweep import summarize_labeling
+from preprocessing.labeling import Labeling
+from preprocessing.streaming_labeling import StreamingLabeling, iter_strategy_chunks
+
+from tests.test_labeling import DEMOCANDLES
+
+PARAMS = {'std_span': 100, 'tp': 1.5, 'sl': 0.75, 'tl': 500, 'initial_amount_usd': 15.0, 'leverage': 20.0,
+          'trade_cost': 0.0006}
+
+
+def rolling_strategy_(df):
+    # Only looks back 50 candles, so a lookback of 50 gives the same signals as the whole history
+    df = df.reset_index(drop=True)
+    mean = df['close'].rolling(50).mean()
+    df['strat_signal'] = np.where(df['close'] < mean * 0.998, 1, np.where(df['close'] > mean * 1.002, -1, 0))
+    return df
+
+
+def get_store_(root):
+    candles = pd.read_csv(DEMOCANDLES)[STORE_COLUMNS]
+    candles['open_time'] = candles['open_time'].astype('int64')
+    candles['close_time'] = candles['close_time'].astype('int64')
+    store = CandleStore(fetch=None, root=str(root))
+    ranges = [[int(candles['open_time'].iloc[0]), int(candles['close_time'].iloc[-1]) + 1]]
+    store.write('BTCUSDT', '3m', candles, ranges)
+    return store, candles
+
+
+@pytest.mark.parametrize('chunk_size', [700, 5000])
+def test_strategy_chunks_match_whole_history(tmp_path, chunk_size):
+    store, candles = get_store_(tmp_path)
+    chunks = iter_strategy_chunks(store.iter_chunks('BTCUSDT', '3m', chunk_size), rolling_strategy_, lookback=50)
+    streamed = pd.concat(chunks, ignore_index=True)
+    pd.testing.assert_series_equal(streamed['strat_signal'], rolling_strategy_(candles)['strat_signal'])
+
+
+def test_streamed_labels_match_label_trades(tmp_path):
+    store, candles = get_store_(tmp_path)
+    chunks = iter_strategy_chunks(store.iter_chunks('BTCUSDT', '3m', 700), rolling_strategy_, lookback=50)
+    labeled = StreamingLabeling(**PARAMS).iter_labeled_chunks(chunks)
+    streamed = pd.concat([df[df['strat_signal'] != 0] for df in labeled])
+    trades = Labeling().label_trades(rolling_strategy_(candles), **PARAMS)
+    assert len(streamed) == len(trades)
+    assert streamed.index.tolist() == trades.index.tolist()
+    assert streamed['lab_active_order'].tolist() == trades['lab_active_order'].tolist()
+    np.testing.assert_allclose(streamed['lab_ret'], trades['lab_ret'])
+    assert summarize_labeling(streamed)['global_pnl'] == pytest.approx(summarize_labeling(trades)['global_pnl'])
+
+
+def test_stream_requires_stored_candles():
+    with pytest.raises(SystemExit):
+        main(['--candles', DEMOCANDLES, '--stream'])
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic_candles import generate_candles
+from optimization.parameter_sweep import get_parameter_grid
+from optimization.signal_screening import screen_signal_matrix
+from optimization.successive_halving import get_rung_sizes, run_successive_halving
+
+METRICS = ['global_pnl', 'accuracy', 'execution_accuracy', 'max_margin', 'total_signals', 'executed_signals']
+
+
+def test_rung_sizes():
+    assert get_rung_sizes(1000, 9, eta=3, min_candles=50) == [50, 150, 450, 1000]
+    # The first rung leaves a single candidate for the last one: 27 candidates need 4 rungs
+    assert get_rung_sizes(2700, 27, eta=3) == [100, 300, 900, 2700]
+    assert get_rung_sizes(100, 1) == [100]
+    assert get_rung_sizes(1000, 9, eta=3, min_candles=2000) == [1000]
+
+
+def assert_metrics_equal_(metrics, screened):
+    for key in METRICS:
+        np.testing.assert_allclose(float(metrics[key]), float(screened[key]), rtol=1e-9, atol=1e-12, err_msg=key)
+
+
+@pytest.mark.parametrize('seed, tl, eta', [(seed, tl, eta) for seed in range(4) for tl, eta in [(30, 3), (300, 2),
+                                                                                               (0, 3)]])
+def test_rungs_match_screening(seed, tl, eta):
+    rng = np.random.default_rng(seed)
+    candles = generate_candles(1500, seed=seed)
+    signals = rng.choice([-1, 0, 0, 0, 0, 0, 1], size=(len(candles), 4)).astype(np.int8)
+    params = {'std_span': [20, 50], 'tp': 1.5, 'sl': [0.75, 0.0], 'tl': tl, 'leverage': 20.0, 'trade_cost': 0.0006}
+    history, summary = run_successive_halving(candles, signals, initial_amount_usd=15.0, eta=eta, min_candles=100,
+                                              max_workers=2, **params)
+
+    # Every candidate of the first rung is scored like a screening of the first candles
+    first = history[history['rung'] == 0]
+    prefix = int(first['candles'].iloc[0])
+    for grid_params in get_parameter_grid(**params):
+        screened = screen_signal_matrix(candles.iloc[:prefix], signals[:prefix], initial_amount_usd=15.0,
+                                        **grid_params)
+        rows = first[np.logical_and.reduce([first[key] == value for key, value in grid_params.items()])]
+        for _, row in rows.iterrows():
+            assert_metrics_equal_(row, screened.loc[row['variant']])
+
+    # The winner's final metrics are those of a screening of every candle
+    chosen = {key: summary['params'][key] for key in ['std_span', 'tp', 'sl', 'tl', 'leverage', 'trade_cost']}
+    screened = screen_signal_matrix(candles, signals, initial_amount_usd=15.0, **chosen)
+    assert_metrics_equal_(summary['metrics'], screened.loc[summary['params']['variant']])
+    assert summary['candle_evaluations'] < summary['grid_candle_evaluations']
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic_candles import generate_candles
+from optimization.walk_forward import get_walk_forward_folds, run_walk_forward
+from preprocessing.labeling import Labeling
+
+PARAMS = {'std_span': 50, 'tp': 3.0, 'sl': 3.0, 'tl': 120, 'leverage': 20.0, 'trade_cost': 0.0006}
+
+
+def test_folds_do_not_overlap():
+    folds = get_walk_forward_folds(1000, 300, 200)
+    assert [(train.start, test.start, test.stop) for train, test in folds] == [(0, 300, 500), (200, 500, 700),
+                                                                               (400, 700, 900), (600, 900, 1000)]
+    assert all(train.start == 0 for train, _ in get_walk_forward_folds(1000, 300, 200, anchored=True))
+
+
+def test_trades_spanning_a_fold_boundary_hold_the_executor():
+    candles = generate_candles(3000, signal_density=0.05, seed=3)
+    stats, oos_pnl = run_walk_forward(candles, candles['strat_signal'].to_numpy(), initial_amount_usd=15.0,
+                                      train_size=500, test_size=250, max_workers=2, **PARAMS)
+
+    # Some executed trade closes after the end of its test window
+    test_end = stats.set_index('fold')['test_end']
+    assert (oos_pnl.index > test_end.loc[oos_pnl['fold']].to_numpy()).any()
+    # One position at a time: every entry comes after the previous exit
+    assert (oos_pnl['entry_datetime'].to_numpy()[1:] > oos_pnl.index.to_numpy()[:-1]).all()
+
+    # Same executed trades as a single executor over every out-of-sample signal labeled on all candles
+    trades = Labeling().label_trades(candles, initial_amount_usd=15.0,
+                                     **{key: PARAMS[key] for key in ['std_span', 'tp', 'sl', 'tl', 'leverage',
+                                                                     'trade_cost']})
+    index = pd.to_datetime(candles['open_time'].iloc[500:], unit='ms').to_numpy(dtype='datetime64[ns]')
+    trades = trades[trades.index >= index[0]]
+    signal_loc = index.searchsorted(trades.index.to_numpy(dtype='datetime64[ns]'))
+    close_datetime = trades['close_datetime'].to_numpy(dtype='datetime64[ns]')
+    active_order, _ = Labeling.run_executor(index, signal_loc, close_datetime)
+    active = active_order[signal_loc]
+    assert oos_pnl['entry_datetime'].tolist() == trades.index[active].tolist()
+    np.testing.assert_allclose(oos_pnl['oos_cum_pnl'], np.cumsum(15.0 * trades['lab_ret'].to_numpy()[active]))
+    assert stats['test_executed_signals'].sum() == active.sum()